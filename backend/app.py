@@ -1,10 +1,7 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
-from apscheduler.schedulers.background import BackgroundScheduler
-import atexit
-from . import db 
-from .stock.stock_repo import update_all_stock_prices 
-from .user.user_repo import update_portfolio_previous_value
+from . import db, invalidation, metrics, scheduler
+from .json_provider import OrjsonProvider
 from .user.user_routes import user_bp
 from .auth.auth_route import auth_bp
 from .stock.stock_route import stock_bp
@@ -13,6 +10,7 @@ from .market_hours.market_holidays_route import market_holidays_bp
 
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 CORS(app, resources={r"/*": {"origins": "*"}})
 
@@ -22,32 +20,15 @@ app.register_blueprint(stock_bp)
 app.register_blueprint(market_hours_bp)
 app.register_blueprint(market_holidays_bp)
 
+metrics.init_app(app)
+invalidation.init_app(app)
+
 
 def start_scheduler():
-    scheduler = BackgroundScheduler()
-    
-    scheduler.add_job(
-        func=update_all_stock_prices, 
-        trigger="interval", 
-        seconds=10,
-        id='stock_price_updater',
-        name='Update stock prices every minute'
-    )
-
-    scheduler.add_job(
-        func=update_portfolio_previous_value, 
-        trigger="interval", 
-        seconds=30,
-        id='portfolio_value_snapshot',
-        name='Snapshot portfolio total value for daily change calculation'
-    )
-    
-    scheduler.start()
-    
-    atexit.register(lambda: scheduler.shutdown())
+    # Development convenience for `python -m backend.app`; deployments run
+    # `python -m backend.scheduler` as a separate process instead.
+    scheduler.start_in_background()
     print("Background scheduler started.")
-    print("Stock price updates scheduled every 60s.")
-    print("Portfolio snapshot scheduled every 300s.")
 
 @app.errorhandler(500)
 def internal_error(error):
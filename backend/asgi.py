@@ -0,0 +1,307 @@
+"""
+ASGI entry point.
+
+Serves the read-heavy, I/O-bound routes directly on the event loop:
+
+- the market snapshot reads under /stocks (all, stock_by_id, stock_id,
+  top_gainers, top_losers), refreshed through the asyncpg pool
+- /stocks/stream, where each open stream is a coroutine instead of a thread
+- /user/<id>/summary, whose one query runs on the asyncpg pool
+
+Every other request is handed to the Flask app through asgiref's WSGI
+adapter, on a pool of WEB_THREADS threads per worker, so behaviour there is
+unchanged. Run with
+
+    uvicorn backend.asgi:app
+    APP_SERVER=asgi gunicorn -c gunicorn.conf.py
+"""
+import asyncio
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from werkzeug.http import parse_etags
+
+from .app import app as flask_app
+from . import async_db, conditional, invalidation
+from .auth.session_tokens import authorize, bearer_token
+from .db import POOL_TIMEOUT
+from .stock import market_snapshot
+from .stock.market_snapshot import MarketSnapshot
+from .stock.price_stream import publisher, HEARTBEAT_SECONDS
+from .user.user_repo import PORTFOLIO_SUMMARY_QUERY, build_portfolio_summary
+from .user.portfolio_snapshots import market_date
+
+# Threads running delegated Flask requests, as gunicorn's threads in WSGI mode.
+WSGI_THREADS = int(os.getenv("WEB_THREADS", "64"))
+_wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+
+
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs every WSGI call on one shared thread (thread_sensitive),
+    # which would serialize the delegated requests of a whole worker.
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__["run_wsgi_app"].func, thread_sensitive=False, executor=_wsgi_executor)
+
+
+class _PooledWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await _PooledWsgiInstance(self.wsgi_application)(scope, receive, send)
+
+
+_wsgi = _PooledWsgiToAsgi(flask_app)
+_snapshot_lock = asyncio.Lock()
+_SUMMARY_PATH = re.compile(r"^/user/(\d+)/summary$")
+_SUMMARY_QUERY = PORTFOLIO_SUMMARY_QUERY.format(baseline_date="$1", user_id="$2")
+
+
+async def _send_json(send, payload, status=200, headers=()):
+    body = flask_app.json.dumps(payload).encode() + b"\n"
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"access-control-allow-origin", b"*"),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _error(send, message, status):
+    await _send_json(send, {"error": message}, status)
+
+
+async def _load_snapshot():
+    pool = await async_db.get_pool()
+    async with pool.acquire(timeout=POOL_TIMEOUT) as conn:
+        tick_id = await conn.fetchval("SELECT last_value FROM market_tick_seq;")
+        statement = await conn.prepare(market_snapshot.SNAPSHOT_QUERY)
+        columns = [attribute.name for attribute in statement.get_attributes()]
+        rows = [tuple(record) for record in await statement.fetch()]
+    return MarketSnapshot(columns, rows, tick_id)
+
+
+async def current_snapshot():
+    """
+    Async counterpart of market_snapshot.current(): one coroutine refreshes a
+    stale snapshot while the rest keep being served the previous one.
+    """
+    snapshot = market_snapshot.peek()
+    if not market_snapshot.is_stale(snapshot):
+        return snapshot
+    if snapshot is not None and _snapshot_lock.locked():
+        return snapshot
+
+    async with _snapshot_lock:
+        if market_snapshot.peek() is not snapshot:
+            return market_snapshot.peek()
+        try:
+            return market_snapshot.install(await _load_snapshot())
+        except Exception as e:
+            if snapshot is None:
+                raise
+            print(f"Serving stale market snapshot: {e}")
+            return snapshot
+
+
+async def _send_snapshot(scope, send, snapshot, payload, etag=None):
+    """Sends payload with the snapshot's tags, or a 304 if the client already has it."""
+    etag = etag or snapshot.etag
+    headers = [
+        (b"etag", etag.encode()),
+        (b"x-market-tick", str(snapshot.tick_id).encode()),
+        (b"cache-control", b"no-cache"),
+    ]
+    if_none_match = dict(scope["headers"]).get(b"if-none-match")
+    if if_none_match and parse_etags(if_none_match.decode("latin-1")).contains(etag.strip('"')):
+        conditional.record(scope["path"], "hits")
+        await send({"type": "http.response.start", "status": 304, "headers": headers + [(b"access-control-allow-origin", b"*")]})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    conditional.record(scope["path"], "misses")
+    await _send_json(send, payload, headers=headers)
+
+
+async def _stocks_all(query, scope, send):
+    try:
+        fields = market_snapshot.parse_fields(query.get("fields"))
+        fmt = market_snapshot.parse_format(query.get("format"))
+    except ValueError as e:
+        return await _error(send, str(e), 400)
+
+    snapshot = await current_snapshot()
+    columns, stocks, etag = snapshot.listing(fields, fmt)
+    await _send_snapshot(scope, send, snapshot, {
+        "status": "success", "format": fmt, "columns": columns, "stocks": stocks
+    }, etag)
+
+
+async def _stock_by_id(query, scope, send):
+    stock_id = query.get("stock_id")
+    if not stock_id:
+        return await _error(send, "Missing stock_id parameter.", 400)
+    try:
+        stock_id = int(stock_id)
+    except ValueError:
+        return await _error(send, "Invalid stock_id parameter.", 400)
+
+    snapshot = await current_snapshot()
+    stock_record = snapshot.by_id.get(stock_id)
+    if stock_record is None:
+        return await _error(send, "Stock not found.", 404)
+    await _send_snapshot(scope, send, snapshot, {"status": "success", "stock": stock_record})
+
+
+async def _stock_id_by_symbol(query, scope, send):
+    symbol = query.get("symbol")
+    if not symbol:
+        return await _error(send, "Missing symbol parameter.", 400)
+
+    snapshot = await current_snapshot()
+    stock_id = snapshot.id_by_symbol.get(symbol)
+    if stock_id is None:
+        return await _error(send, "Stock not found.", 404)
+    await _send_snapshot(scope, send, snapshot, {"status": "success", "stock_id": stock_id})
+
+
+async def _top_gainers(query, scope, send):
+    snapshot = await current_snapshot()
+    await _send_snapshot(scope, send, snapshot, {"status": "success", "top_gainers": snapshot.top_gainers})
+
+
+async def _top_losers(query, scope, send):
+    snapshot = await current_snapshot()
+    await _send_snapshot(scope, send, snapshot, {"status": "success", "top_losers": snapshot.top_losers})
+
+
+async def _portfolio_summary(user_id, scope, send):
+    headers = dict(scope["headers"])
+    token = bearer_token(headers.get(b"authorization", b"").decode("latin-1"))
+    _, error, status = authorize(token, user_id)
+    if error is not None:
+        return await _error(send, error, status)
+
+    pool = await async_db.get_pool()
+    async with pool.acquire(timeout=POOL_TIMEOUT) as conn:
+        row = await conn.fetchrow(_SUMMARY_QUERY, market_date(), user_id)
+    snapshot = await current_snapshot()
+
+    try:
+        summary = build_portfolio_summary(user_id, row, snapshot)
+    except ValueError as ve:
+        return await _error(send, str(ve), 404)
+    await _send_json(send, dict(summary, status="success"))
+
+
+def _sse_event(event, version, quotes):
+    payload = json.dumps({"tick": version, "prices": quotes}, default=str)
+    return f"id: {version}\nevent: {event}\ndata: {payload}\n\n".encode()
+
+
+async def _price_stream(query, receive, send):
+    symbols = query.get("symbols")
+    stock_ids = query.get("stock_ids")
+    try:
+        symbols = {s.strip().upper() for s in symbols.split(",") if s.strip()} if symbols else None
+        stock_ids = {int(s) for s in stock_ids.split(",") if s.strip()} if stock_ids else None
+    except ValueError:
+        return await _error(send, "stock_ids must be a comma-separated list of integers.", 400)
+
+    try:
+        # subscribe() may load quotes and start the poller thread on first use.
+        subscription, snapshot = await asyncio.to_thread(publisher.subscribe, stock_ids, symbols)
+    except Exception as e:
+        print(f"Price Stream Error: {e}")
+        return await _error(send, "An unexpected error occurred.", 500)
+
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    subscription.waker = lambda: loop.call_soon_threadsafe(wake.set)
+
+    async def wait_for_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    disconnect = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+                (b"access-control-allow-origin", b"*"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": _sse_event("snapshot", subscription.version, snapshot), "more_body": True})
+
+        while True:
+            woken = asyncio.ensure_future(wake.wait())
+            done, _ = await asyncio.wait({woken, disconnect}, timeout=HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            woken.cancel()
+            if disconnect in done:
+                break
+
+            wake.clear()
+            version, quotes = subscription.take(0)
+            if quotes:
+                await send({"type": "http.response.body", "body": _sse_event("prices", version, quotes), "more_body": True})
+            elif not done:
+                await send({"type": "http.response.body", "body": b": keep-alive\n\n", "more_body": True})
+    finally:
+        disconnect.cancel()
+        publisher.unsubscribe(subscription)
+
+
+_SNAPSHOT_ROUTES = {
+    "/stocks/all": _stocks_all,
+    "/stocks/stock_by_id": _stock_by_id,
+    "/stocks/stock_id": _stock_id_by_symbol,
+    "/stocks/top_gainers": _top_gainers,
+    "/stocks/top_losers": _top_losers,
+}
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            invalidation.ensure_started()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await async_db.close_pool()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+
+    path = scope.get("path", "")
+    if scope["type"] != "http" or scope["method"] != "GET":
+        return await _wsgi(scope, receive, send)
+
+    query = {key: values[0] for key, values in parse_qs(scope["query_string"].decode()).items()}
+    if path == "/stocks/stream":
+        return await _price_stream(query, receive, send)
+
+    try:
+        if path in _SNAPSHOT_ROUTES:
+            return await _SNAPSHOT_ROUTES[path](query, scope, send)
+        match = _SUMMARY_PATH.match(path)
+        if match:
+            return await _portfolio_summary(int(match.group(1)), scope, send)
+
+    except Exception as e:
+        print(f"ASGI route error on {path}: {e!r}")
+        return await _error(send, "An unexpected error occurred.", 500)
+
+    return await _wsgi(scope, receive, send)
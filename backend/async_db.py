@@ -0,0 +1,55 @@
+import asyncio
+import os
+
+import asyncpg
+
+from .db import POOL_MIN_SIZE, POOL_MAX_SIZE
+
+# asyncpg pool used by the ASGI entry point (backend/asgi.py). Sized by the
+# same DB_POOL_* settings as the psycopg2 pool in db.py; one pool per worker
+# process and event loop.
+
+_pool = None
+_pool_lock = None
+
+
+def _connect_kwargs():
+    db_url = os.getenv("DATABASE_URL")
+    if db_url:
+        return {"dsn": db_url}
+
+    host = os.getenv("DB_HOST", "localhost")
+    return {
+        "host": host,
+        "port": int(os.getenv("DB_PORT", "5432")),
+        "database": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASS"),
+        "ssl": False if host in ("localhost", "127.0.0.1") else "require",
+    }
+
+
+async def get_pool():
+    global _pool, _pool_lock
+    if _pool is not None:
+        return _pool
+
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                min_size=POOL_MIN_SIZE,
+                max_size=POOL_MAX_SIZE,
+                timeout=5,
+                command_timeout=30,
+                **_connect_kwargs()
+            )
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.close()
@@ -1,11 +1,10 @@
 from flask import Blueprint, request, jsonify
-import bcrypt
 from .auth_repo import check_login_status, login_user, create_user, logout_user, get_user_id, getUserRoleByUserId
+from .passwords import hash_password, PasswordHasherBusy, RETRY_AFTER_SECONDS
+from .session_tokens import issue_token, revoke_token, token_from_request, current_session, SESSION_MAX_AGE_SECONDS
 
-def hash_password(password):
-    salt = bcrypt.gensalt()
-    hashed_bytes = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed_bytes.decode('utf-8')
+def busy_response(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": str(RETRY_AFTER_SECONDS)}
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
@@ -19,6 +18,9 @@ def logout():
     user_id = data['user_id']
 
     try:
+        token = token_from_request()
+        if token:
+            revoke_token(token)
         logout_user(user_id)  
         
         return jsonify({
@@ -60,9 +62,15 @@ def login():
                 "user_id": user[0],
                 "username": user[1],
                 "email": user[2],
-            }
+                "role_name": user[3],
+            },
+            "token": issue_token(user[0], user[3]),
+            "expires_in": SESSION_MAX_AGE_SECONDS
         }), 200
         
+    except PasswordHasherBusy as e:
+        return busy_response(e)
+
     except Exception as e:
         print(f"Login Error: {e}")
         return jsonify({"error": "An unexpected error occurred."}), 500
@@ -74,7 +82,11 @@ def get_role():
         return jsonify({"error": "Missing user_id parameter."}), 400
 
     try:
-        role_name = getUserRoleByUserId(user_id) 
+        session = current_session()
+        if session is not None and str(session["uid"]) == user_id:
+            role_name = session["role"]
+        else:
+            role_name = getUserRoleByUserId(user_id) 
         
         if role_name is None:
             return jsonify({"error": "User not found."}), 404
@@ -120,6 +132,9 @@ def register_user():
         # Catches custom errors, e.g., 'Username already exists' (409 Conflict)
         return jsonify({"error": str(e)}), 409
         
+    except PasswordHasherBusy as e:
+        return busy_response(e)
+
     except Exception as e:
         print(f"Registration Error: {e}")
         return jsonify({"error": "An unexpected error occurred."}), 500
@@ -157,6 +172,16 @@ def check_login_status_route():
         return jsonify({"error": "Missing user_id parameter."}), 400
 
     try:
+        # A valid token answers this without a query; its role comes along so
+        # the frontend can skip /auth/get_role.
+        session = current_session()
+        if session is not None and str(session["uid"]) == user_id:
+            return jsonify({
+                "status": "success",
+                "is_logged_in": True,
+                "user_role": session["role"]
+            }), 200
+
         is_logged_in = check_login_status(user_id)  
         
         return jsonify({
@@ -0,0 +1,75 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+# bcrypt releases the GIL while hashing, so a thread pool runs hashes in
+# parallel across cores. The pool caps how many hashes run at once and the
+# queue limit caps how many requests may wait for one; past that, callers get
+# PasswordHasherBusy (a 503) instead of piling up on the web workers.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", str(PASSWORD_WORKERS * 4)))
+PASSWORD_TIMEOUT = float(os.getenv("PASSWORD_TIMEOUT", "10"))
+RETRY_AFTER_SECONDS = 1
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+_slots = threading.BoundedSemaphore(PASSWORD_WORKERS + PASSWORD_QUEUE_LIMIT)
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def _run(func, *args):
+    if not _slots.acquire(blocking=False):
+        raise PasswordHasherBusy("Too many login requests; try again shortly.")
+    try:
+        future = _executor.submit(func, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=PASSWORD_TIMEOUT)
+    except FutureTimeout:
+        raise PasswordHasherBusy("Password check timed out; try again shortly.")
+
+
+def _hash(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(BCRYPT_ROUNDS)).decode('utf-8')
+
+
+def _check(password, stored_hash):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8'))
+    except ValueError:
+        # Not a bcrypt hash.
+        return False
+
+
+def hash_password(password):
+    """Hashes a password at the configured cost on the bcrypt pool."""
+    return _run(_hash, password)
+
+
+def check_password(password, stored_hash):
+    """Checks a password against a stored bcrypt hash on the bcrypt pool."""
+    return _run(_check, password, stored_hash)
+
+
+def needs_rehash(stored_hash):
+    """True if the hash was made at a different cost than BCRYPT_ROUNDS."""
+    try:
+        return int(stored_hash.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+def pool_stats():
+    return {
+        "workers": PASSWORD_WORKERS,
+        "queue_limit": PASSWORD_QUEUE_LIMIT,
+        "in_use": PASSWORD_WORKERS + PASSWORD_QUEUE_LIMIT - _slots._value,
+    }
@@ -0,0 +1,200 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from .. import invalidation
+
+# Tokens are signed with SESSION_SECRET; every worker must share it. Startup
+# fails without one unless SESSION_ALLOW_RANDOM_SECRET is set for local
+# development, where a random per-process secret is used and tokens only work
+# against the worker that issued them, until it restarts.
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+SESSION_ALLOW_RANDOM_SECRET = os.getenv("SESSION_ALLOW_RANDOM_SECRET", "false").lower() in ("1", "true", "yes")
+SESSION_MAX_AGE_SECONDS = int(os.getenv("SESSION_MAX_AGE_SECONDS", str(12 * 3600)))
+# While false, requests without a token are let through as before so the
+# frontend can roll out first; a token that is sent is always checked.
+SESSION_AUTH_REQUIRED = os.getenv("SESSION_AUTH_REQUIRED", "false").lower() in ("1", "true", "yes")
+VERIFIED_CACHE_SIZE = 10000
+
+if not SESSION_SECRET:
+    if not SESSION_ALLOW_RANDOM_SECRET:
+        raise RuntimeError(
+            "SESSION_SECRET is not set. Set it to the same value for every worker, "
+            "or set SESSION_ALLOW_RANDOM_SECRET=true for local development."
+        )
+    print("SESSION_SECRET is not set; session tokens will not be valid across workers or restarts.")
+    SESSION_SECRET = secrets.token_hex(32)
+
+_serializer = URLSafeTimedSerializer(SESSION_SECRET, salt="cloudex-session")
+
+
+class InvalidSession(Exception):
+    pass
+
+
+class _SessionCache:
+    """
+    Verified tokens (so repeat requests skip the signature check) and
+    revoked token ids, both kept until the token would have expired anyway.
+    """
+
+    def __init__(self, max_size=VERIFIED_CACHE_SIZE):
+        self.max_size = max_size
+        self._verified = OrderedDict()
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    def get(self, token, now):
+        entry = self._verified.get(token)
+        if entry is None:
+            return None
+        claims, expires_at = entry
+        if expires_at <= now:
+            return None
+        return claims
+
+    def put(self, token, claims, expires_at):
+        with self._lock:
+            self._verified[token] = (claims, expires_at)
+            if len(self._verified) > self.max_size:
+                self._verified.popitem(last=False)
+
+    def revoke(self, jti, expires_at):
+        with self._lock:
+            self._revoked[jti] = expires_at
+            now = time.time()
+            if len(self._revoked) % 1000 == 0:
+                self._revoked = {k: v for k, v in self._revoked.items() if v > now}
+
+    def is_revoked(self, jti):
+        return jti in self._revoked
+
+
+_cache = _SessionCache()
+
+
+def issue_token(user_id, role):
+    """Returns a signed token carrying the user id, role and a unique token id."""
+    return _serializer.dumps({"uid": int(user_id), "role": role or "", "jti": secrets.token_hex(8)})
+
+
+def verify_token(token):
+    """
+    Returns the token's claims (uid, role, jti, exp) without touching the
+    database, or raises InvalidSession.
+    """
+    now = time.time()
+    claims = _cache.get(token, now)
+    if claims is None:
+        try:
+            payload, issued_at = _serializer.loads(token, max_age=SESSION_MAX_AGE_SECONDS, return_timestamp=True)
+        except SignatureExpired:
+            raise InvalidSession("Session expired.")
+        except BadSignature:
+            raise InvalidSession("Invalid session token.")
+        expires_at = issued_at.timestamp() + SESSION_MAX_AGE_SECONDS
+        claims = dict(payload, exp=expires_at)
+        _cache.put(token, claims, expires_at)
+
+    if _cache.is_revoked(claims["jti"]):
+        raise InvalidSession("Session has been logged out.")
+    return claims
+
+
+def revoke_token(token):
+    """Logs a token out. Returns its claims, or None if it was not valid."""
+    try:
+        claims = verify_token(token)
+    except InvalidSession:
+        return None
+    revoke_jti(claims["jti"], claims["exp"])
+    try:
+        invalidation.publish(invalidation.SESSION_REVOKED, f"{claims['jti']} {claims['exp']}")
+    except Exception as e:
+        print(f"Logout of {claims['jti']} not sent to other workers: {e}")
+    return claims
+
+
+def revoke_jti(jti, expires_at):
+    """Rejects the token with this id in this process until it expires."""
+    _cache.revoke(jti, expires_at)
+
+
+def bearer_token(header):
+    if header and header.startswith("Bearer "):
+        return header[len("Bearer "):].strip() or None
+    return None
+
+
+def token_from_request():
+    return bearer_token(request.headers.get("Authorization"))
+
+
+def current_session():
+    """Claims of the request's valid session token, or None."""
+    if "session" not in g:
+        token = token_from_request()
+        try:
+            g.session = verify_token(token) if token else None
+        except InvalidSession:
+            g.session = None
+    return g.session
+
+
+def _requested_user_id(view_args):
+    if "user_id" in view_args:
+        return view_args["user_id"]
+    if "user_id" in request.args:
+        return request.args["user_id"]
+    if request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict) and "user_id" in body:
+            return body["user_id"]
+    return None
+
+
+def authorize(token, requested_user_id=None, role=None):
+    """
+    Checks a request's token against the user it acts on and the role it
+    needs. Returns (claims, None, None) or (None, error_message, status).
+    """
+    if token is None:
+        if not SESSION_AUTH_REQUIRED:
+            return None, None, None
+        return None, "Authentication required.", 401
+
+    try:
+        claims = verify_token(token)
+    except InvalidSession as e:
+        return None, str(e), 401
+
+    if role is not None and claims["role"] != role:
+        return None, "Forbidden.", 403
+    if requested_user_id is not None and claims["role"] != "admin":
+        if str(requested_user_id) != str(claims["uid"]):
+            return None, "Forbidden.", 403
+    return claims, None, None
+
+
+def session_required(role=None):
+    """
+    Route decorator. Verifies the bearer token, rejects requests acting on a
+    different user_id than the token's (unless the token is an admin's) and,
+    with `role`, requests from users without that role.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            claims, error, status = authorize(token_from_request(), _requested_user_id(kwargs), role)
+            if error is not None:
+                return jsonify({"error": error}), status
+            g.session = claims
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,181 @@
+"""
+Conditional GET (ETag / If-None-Match) for read endpoints.
+
+A client that sends back the ETag of the body it already has gets an empty
+304 instead of the body again. There are two ways a route finds out whether
+the tag is current:
+
+- Routes served from the market snapshot already know their tag (the tick
+  id plus a digest of the rows) and call not_modified() before encoding.
+- Routes wrapped in @conditional remember, per request, the tag of the body
+  they last produced and the version of their data at that point. Writers
+  call bump() for the data they changed. While the version is unchanged, a
+  request carrying that tag is answered without calling the view (and so
+  without its query). Versions are per process; bumps made by other workers
+  arrive through the invalidation listener, and CONDITIONAL_TTL_SECONDS
+  bounds staleness if that listener is down.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+CONDITIONAL_TTL_SECONDS = float(os.getenv("CONDITIONAL_TTL_SECONDS", "10"))
+CONDITIONAL_CACHE_SIZE = int(os.getenv("CONDITIONAL_CACHE_SIZE", "10000"))
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def bump(scope):
+    """Marks the data named by scope (e.g. "holidays", "user:42") as changed."""
+    with _versions_lock:
+        _versions[scope] = _versions.get(scope, 0) + 1
+
+
+def version(scope):
+    return _versions.get(scope, 0)
+
+
+def user_scope(user_id):
+    return f"user:{user_id}"
+
+
+class Metrics:
+    """
+    Per-endpoint counts of 304s answered without running the view (hits),
+    304s after running it (revalidated) and full responses (misses).
+    """
+
+    RESULTS = ("hits", "revalidated", "misses")
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def incr(self, endpoint, result):
+        with self._lock:
+            counts = self._counts.setdefault(endpoint, dict.fromkeys(self.RESULTS, 0))
+            counts[result] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = {endpoint: dict(counts) for endpoint, counts in self._counts.items()}
+        for counts in stats.values():
+            total = sum(counts.values())
+            counts["hit_rate"] = counts["hits"] / total if total else 0.0
+        return stats
+
+
+class TagCache:
+    """Bounded LRU of (version, etag, stored_at) by request."""
+
+    def __init__(self, max_size=CONDITIONAL_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_metrics = Metrics()
+_tags = TagCache()
+
+
+def reset():
+    """Forgets every remembered tag, for when bumps may have been missed."""
+    _tags.clear()
+
+
+def stats():
+    return _metrics.stats()
+
+
+def record(endpoint, result):
+    """Counts an outcome for callers outside Flask (the ASGI snapshot routes)."""
+    _metrics.incr(endpoint, result)
+
+
+def _endpoint():
+    rule = request.url_rule
+    return rule.rule if rule is not None else request.path
+
+
+def not_modified(etag, headers=None):
+    """
+    Returns a 304 response if the request's If-None-Match matches etag (a
+    quoted tag), otherwise None. Counts the outcome either way.
+    """
+    if request.if_none_match.contains(etag.strip('"')):
+        _metrics.incr(_endpoint(), "hits")
+        return Response(status=304, headers=dict(headers or {}, ETag=etag))
+    _metrics.incr(_endpoint(), "misses")
+    return None
+
+
+def conditional(scope, extra_version=None, private=False):
+    """
+    Route decorator. scope() returns the version scope of the data the view
+    reads, or None to skip caching for this request. extra_version(), if
+    given, returns any other version the body depends on (such as the market
+    tick for a body containing prices).
+    """
+    cache_control = "private, no-cache" if private else "no-cache"
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            data_scope = scope()
+            if data_scope is None:
+                return view(*args, **kwargs)
+
+            endpoint = _endpoint()
+            key = (endpoint, request.query_string, data_scope)
+            current = (version(data_scope), extra_version() if extra_version else None)
+
+            entry = _tags.get(key)
+            if (
+                entry is not None
+                and entry[0] == current
+                and time.monotonic() - entry[2] < CONDITIONAL_TTL_SECONDS
+                and request.if_none_match.contains(entry[1])
+            ):
+                _metrics.incr(endpoint, "hits")
+                return Response(status=304, headers={"ETag": f'"{entry[1]}"', "Cache-Control": cache_control})
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+
+            etag = hashlib.blake2b(response.get_data(), digest_size=8).hexdigest()
+            _tags.put(key, (current, etag, time.monotonic()))
+            response.headers["ETag"] = f'"{etag}"'
+            response.headers["Cache-Control"] = cache_control
+            if request.if_none_match.contains(etag):
+                _metrics.incr(endpoint, "revalidated")
+                return Response(status=304, headers={"ETag": f'"{etag}"', "Cache-Control": cache_control})
+
+            _metrics.incr(endpoint, "misses")
+            return response
+        return wrapper
+    return decorator
@@ -1,14 +1,34 @@
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import extensions
+
+from .metrics import TimedCursor, record_connection_held
 # You may not even need dotenv if you only use DATABASE_URL
 
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX", "10"))
+# How long a request may wait for a free connection before giving up.
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Idle connections older than this are pinged with SELECT 1 before reuse.
+POOL_HEALTHCHECK_AFTER = float(os.getenv("DB_POOL_HEALTHCHECK_AFTER", "30"))
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    pass
+
+
 def get_db_conn():
     # Render's DATABASE_URL already includes sslmode=require if it's external
     db_url = os.getenv("DATABASE_URL")
 
     # Check if we are using the simple URL or the full set of variables
     if db_url:
-        return psycopg2.connect(db_url, connect_timeout=5)
+        return psycopg2.connect(db_url, connect_timeout=5, cursor_factory=TimedCursor)
     else:
         # Fallback to separate variables for local testing
         host = os.getenv("DB_HOST", "localhost")
@@ -21,5 +41,222 @@ def get_db_conn():
             user=os.getenv("DB_USER"),
             password=os.getenv("DB_PASS"),
             sslmode=sslmode,
-            connect_timeout=5
+            connect_timeout=5,
+            cursor_factory=TimedCursor
         )
+
+
+class ConnectionPool:
+    """
+    Per-process pool of psycopg2 connections.
+
+    Connections are created lazily up to max_size, checked for health when
+    handed out, and rolled back before they are returned so the next caller
+    always starts outside a transaction.
+    """
+
+    def __init__(self, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE, timeout=POOL_TIMEOUT):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pid = os.getpid()
+
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+
+        self.checkouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.discarded = 0
+
+    def _connect(self):
+        conn = get_db_conn()
+        self.connects += 1
+        return conn
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        status = conn.info.transaction_status
+        if status != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - idle_since < POOL_HEALTHCHECK_AFTER:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self.discarded += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a database connection.")
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                else:
+                    conn, idle_since = None, None
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(conn, idle_since):
+                self._discard(conn)
+                with self._cond:
+                    self._size -= 1
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self.checkouts += 1
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+            return conn
+
+    def putconn(self, conn):
+        healthy = not conn.closed
+        if healthy and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                healthy = False
+
+        with self._cond:
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._size -= 1
+            self._cond.notify()
+
+        if not healthy:
+            self._discard(conn)
+
+    def prefill(self):
+        for _ in range(max(self.min_size - self._size, 0)):
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            self.putconn(conn)
+
+    def closeall(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            size = self._size
+            return {
+                "pid": self.pid,
+                "size": size,
+                "idle": idle,
+                "in_use": size - idle,
+                "max_size": self.max_size,
+                "checkouts": self.checkouts,
+                "wait_time_total": self.wait_time_total,
+                "wait_time_max": self.wait_time_max,
+                "wait_time_avg": self.wait_time_total / self.checkouts if self.checkouts else 0.0,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "discarded": self.discarded,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# Pools inherited across fork() are kept referenced so their sockets are never
+# finalized (and the parent's sessions terminated) from inside the child.
+_inherited_pools = []
+
+
+def _reset_pool_after_fork():
+    global _pool, _pool_lock
+    if _pool is not None:
+        _inherited_pools.append(_pool)
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+
+def get_pool():
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            if _pool is not None:
+                _inherited_pools.append(_pool)
+            _pool = ConnectionPool()
+            try:
+                _pool.prefill()
+            except psycopg2.Error as e:
+                print(f"Database pool prefill failed: {e}")
+        return _pool
+
+
+@contextmanager
+def connection():
+    """
+    Borrow a pooled connection for the duration of a with-block.
+
+    Callers commit explicitly; anything left uncommitted (including after an
+    exception) is rolled back when the connection goes back to the pool.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    checked_out = time.perf_counter()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+        record_connection_held(time.perf_counter() - checked_out)
+
+
+def pool_stats():
+    return get_pool().stats()
@@ -0,0 +1,277 @@
+"""
+Idempotency-Key support for endpoints that move money or place orders.
+
+A client that retries a request with the same Idempotency-Key header gets
+the first attempt's response back instead of running it again. Keys are
+scoped to the route and the user, and are claimed in the idempotency_keys
+table before the handler runs, so two workers cannot both run the same key.
+Completed responses are kept for IDEMPOTENCY_TTL_SECONDS, and the most recent
+ones are also cached in memory so repeats skip the database.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import psycopg2
+from flask import Response, g, jsonify, make_response, request
+
+from . import db
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# A claim whose handler never recorded a response (e.g. the worker died) is
+# treated as abandoned after this long and may be run again.
+IDEMPOTENCY_CLAIM_SECONDS = int(os.getenv("IDEMPOTENCY_CLAIM_SECONDS", "60"))
+MAX_KEY_LENGTH = 255
+PURGE_INTERVAL_SECONDS = 3600
+
+
+class StoredResponse:
+    __slots__ = ("request_hash", "status_code", "body", "content_type", "expires_at")
+
+    def __init__(self, request_hash, status_code, body, content_type, expires_at):
+        self.request_hash = request_hash
+        self.status_code = status_code
+        self.body = body
+        self.content_type = content_type
+        self.expires_at = expires_at
+
+    def to_response(self):
+        response = Response(self.body, status=self.status_code, content_type=self.content_type)
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+
+class ResponseCache:
+    """Bounded LRU of completed responses by scope key."""
+
+    def __init__(self, max_size=IDEMPOTENCY_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, scope_key):
+        with self._lock:
+            stored = self._entries.get(scope_key)
+            if stored is None:
+                return None
+            if stored.expires_at <= time.time():
+                del self._entries[scope_key]
+                return None
+            self._entries.move_to_end(scope_key)
+            return stored
+
+    def put(self, scope_key, stored):
+        with self._lock:
+            self._entries[scope_key] = stored
+            self._entries.move_to_end(scope_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Metrics:
+    def __init__(self):
+        self.requests = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.executed = 0
+        self.in_progress = 0
+        self.mismatched = 0
+        self._lock = threading.Lock()
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        replayed = self.memory_hits + self.db_hits
+        return {
+            "requests": self.requests,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "executed": self.executed,
+            "in_progress": self.in_progress,
+            "mismatched": self.mismatched,
+            "hit_rate": replayed / self.requests if self.requests else 0.0,
+            "cached": len(_cache),
+        }
+
+
+_cache = ResponseCache()
+_metrics = Metrics()
+
+
+def stats():
+    return _metrics.stats()
+
+
+def _claim(scope_key, request_hash):
+    """
+    Claims the key for this request. Returns None if the caller now owns it,
+    or the existing row as (request_hash, status_code, body, content_type,
+    expires_at) otherwise; status_code is None while it is still running.
+    """
+    with db.connection() as conn, conn.cursor() as cursor:
+        # Loops only if the row is deleted (a failed attempt) between the two
+        # statements.
+        while True:
+            cursor.execute("""
+                INSERT INTO idempotency_keys (scope_key, request_hash)
+                VALUES (%s, %s)
+                ON CONFLICT (scope_key) DO UPDATE
+                SET request_hash = EXCLUDED.request_hash,
+                    status_code = NULL,
+                    response_body = NULL,
+                    content_type = NULL,
+                    created_at = NOW(),
+                    completed_at = NULL
+                WHERE idempotency_keys.created_at < NOW() - make_interval(secs => %s)
+                    OR (idempotency_keys.completed_at IS NULL
+                        AND idempotency_keys.created_at < NOW() - make_interval(secs => %s))
+                RETURNING scope_key;
+            """, (scope_key, request_hash, IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_CLAIM_SECONDS))
+            claimed = cursor.fetchone() is not None
+            conn.commit()
+            if claimed:
+                return None
+
+            cursor.execute("""
+                SELECT request_hash, status_code, response_body, content_type,
+                    EXTRACT(EPOCH FROM created_at) + %s
+                FROM idempotency_keys
+                WHERE scope_key = %s;
+            """, (IDEMPOTENCY_TTL_SECONDS, scope_key))
+            row = cursor.fetchone()
+            conn.commit()
+            if row is not None:
+                return row
+
+
+def _complete(scope_key, response):
+    """Records the response for the claimed key; returns its expiry time, if kept."""
+    row = None
+    with db.connection() as conn, conn.cursor() as cursor:
+        if response.status_code >= 500:
+            # Failed attempts are not remembered, so the client can retry.
+            cursor.execute("DELETE FROM idempotency_keys WHERE scope_key = %s;", (scope_key,))
+        else:
+            cursor.execute("""
+                UPDATE idempotency_keys
+                SET status_code = %s,
+                    response_body = %s,
+                    content_type = %s,
+                    completed_at = NOW()
+                WHERE scope_key = %s
+                RETURNING EXTRACT(EPOCH FROM created_at) + %s;
+            """, (response.status_code, response.get_data(as_text=True), response.content_type,
+                  scope_key, IDEMPOTENCY_TTL_SECONDS))
+            row = cursor.fetchone()
+        conn.commit()
+
+    return float(row[0]) if row is not None else None
+
+
+def _scope_key(key):
+    session = g.get("session")
+    if session is not None:
+        user = session["uid"]
+    else:
+        body = request.get_json(silent=True)
+        user = body.get("user_id") if isinstance(body, dict) else None
+    return f"{request.method} {request.path} {user} {key}"
+
+
+def idempotent(view):
+    """
+    Route decorator. Without an Idempotency-Key header the view runs as
+    usual. With one, a repeat of a completed request gets the stored
+    response (marked Idempotent-Replayed), a repeat while the first is still
+    running gets a 409, and reusing a key with a different body gets a 422.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"Idempotency-Key may be at most {MAX_KEY_LENGTH} characters."}), 400
+
+        _metrics.incr("requests")
+        scope_key = _scope_key(key)
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+
+        stored = _cache.get(scope_key)
+        if stored is not None:
+            if stored.request_hash != request_hash:
+                _metrics.incr("mismatched")
+                return jsonify({"error": "Idempotency-Key was already used with a different request."}), 422
+            _metrics.incr("memory_hits")
+            return stored.to_response()
+
+        try:
+            existing = _claim(scope_key, request_hash)
+        except psycopg2.Error as e:
+            print(f"Idempotency claim error: {e}")
+            return jsonify({"error": "An unexpected error occurred."}), 500
+
+        if existing is not None:
+            stored_hash, status_code, body, content_type, expires_at = existing
+            if stored_hash != request_hash:
+                _metrics.incr("mismatched")
+                return jsonify({"error": "Idempotency-Key was already used with a different request."}), 422
+            if status_code is None:
+                _metrics.incr("in_progress")
+                return jsonify({"error": "A request with this Idempotency-Key is still being processed."}), 409
+            stored = StoredResponse(stored_hash, status_code, body, content_type, float(expires_at))
+            _cache.put(scope_key, stored)
+            _metrics.incr("db_hits")
+            return stored.to_response()
+
+        _metrics.incr("executed")
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            response = make_response(jsonify({"error": "An unexpected error occurred."}), 500)
+            _complete_quietly(scope_key, response)
+            raise
+
+        expires_at = _complete_quietly(scope_key, response)
+        if expires_at is not None:
+            _cache.put(scope_key, StoredResponse(
+                request_hash, response.status_code, response.get_data(as_text=True), response.content_type, expires_at
+            ))
+        return response
+    return wrapper
+
+
+def _complete_quietly(scope_key, response):
+    try:
+        return _complete(scope_key, response)
+    except psycopg2.Error as e:
+        # The handler's own work is already committed; the claim will lapse
+        # after IDEMPOTENCY_CLAIM_SECONDS.
+        print(f"Idempotency store error: {e}")
+        return None
+
+
+def purge_expired_keys():
+    """Deletes stored responses older than the TTL. Returns the number removed."""
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                DELETE FROM idempotency_keys
+                WHERE created_at < NOW() - make_interval(secs => %s);
+            """, (IDEMPOTENCY_TTL_SECONDS,))
+            removed = cursor.rowcount
+            conn.commit()
+            return removed
+
+    except psycopg2.Error as e:
+        print(f"Database error in purge_expired_keys: {e}")
+        raise
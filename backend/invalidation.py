@@ -0,0 +1,203 @@
+"""
+Cross-process cache invalidation over Postgres LISTEN/NOTIFY.
+
+Every process keeps its own caches: the market snapshot, the search index,
+the market calendar, conditional-GET versions and revoked sessions. A write
+announces what it changed with notify() inside its own transaction, so the
+message is delivered only if the write commits. Each process runs one
+listener thread on a dedicated connection. The thread applies each message
+to that process's caches, usually within milliseconds of the commit. The
+writing process hears its own messages too, and applying one twice is
+harmless.
+
+Messages sent while a listener is disconnected are lost. After every
+(re)connect the listener therefore drops all of its caches. The TTL on each
+cache still bounds staleness if the listener cannot connect at all.
+"""
+import os
+import select
+import threading
+import time
+
+import psycopg2
+
+from . import db
+
+INVALIDATION_LISTEN = os.getenv("INVALIDATION_LISTEN", "true").lower() in ("1", "true", "yes")
+RECONNECT_MAX_SECONDS = float(os.getenv("INVALIDATION_RECONNECT_MAX_SECONDS", "30"))
+# An idle listener pings its connection this often so a dead one is noticed.
+HEARTBEAT_SECONDS = 5
+APPLICATION_NAME = "cloudex-invalidation"
+
+STOCKS_CHANGED = "stocks_changed"
+PRICE_TICK = "price_tick"
+CALENDAR_CHANGED = "calendar_changed"
+USER_CHANGED = "user_changed"
+SESSION_REVOKED = "session_revoked"
+
+
+def notify(cursor, channel, payload=""):
+    """Queues a message for every listening process; it is sent when the caller commits."""
+    cursor.execute("SELECT pg_notify(%s, %s);", (channel, str(payload)))
+
+
+def publish(channel, payload=""):
+    """Sends a message right away, for changes made outside a database transaction."""
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            notify(cursor, channel, payload)
+            conn.commit()
+
+    except psycopg2.Error as e:
+        print(f"Database error in invalidation publish: {e}")
+        raise
+
+
+def _stocks_changed(payload):
+    from .stock import market_snapshot, search_index
+    market_snapshot.invalidate()
+    search_index.invalidate()
+
+
+def _price_tick(payload):
+    from .stock import market_snapshot
+    from .stock.price_stream import publisher
+    market_snapshot.invalidate()
+    if publisher.subscriber_count():
+        publisher.refresh()
+
+
+def _calendar_changed(payload):
+    from . import conditional
+    from .market_hours import market_calendar
+    market_calendar.invalidate()
+    conditional.bump(payload)
+
+
+def _user_changed(payload):
+    from . import conditional
+    conditional.bump(conditional.user_scope(payload))
+
+
+def _session_revoked(payload):
+    from .auth import session_tokens
+    jti, _, expires_at = payload.partition(" ")
+    session_tokens.revoke_jti(jti, float(expires_at))
+
+
+HANDLERS = {
+    STOCKS_CHANGED: _stocks_changed,
+    PRICE_TICK: _price_tick,
+    CALENDAR_CHANGED: _calendar_changed,
+    USER_CHANGED: _user_changed,
+    SESSION_REVOKED: _session_revoked,
+}
+
+
+def refresh_all():
+    """Drops every cache that messages would have invalidated."""
+    from . import conditional
+    from .market_hours import market_calendar
+    from .stock import market_snapshot, search_index
+    market_snapshot.invalidate()
+    search_index.invalidate()
+    market_calendar.invalidate()
+    conditional.reset()
+
+
+class Listener:
+    def __init__(self):
+        self.pid = None
+        self.connected = False
+        self.connects = 0
+        self.received = 0
+        self.errors = 0
+        # channel -> wall-clock time its last message was applied
+        self.applied_at = {}
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        """Starts the listener thread in this process if it is not running yet."""
+        if self.pid == os.getpid() or not INVALIDATION_LISTEN:
+            return
+        with self._lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.connected = False
+        threading.Thread(target=self._run, name="invalidation-listener", daemon=True).start()
+
+    def _dispatch(self, channel, payload):
+        handler = HANDLERS.get(channel)
+        if handler is None:
+            return
+        try:
+            handler(payload)
+        except Exception as e:
+            self.errors += 1
+            print(f"Invalidation handler error on {channel}: {e}")
+        self.received += 1
+        self.applied_at[channel] = time.time()
+
+    def _listen(self, conn):
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("SET application_name = %s;", (APPLICATION_NAME,))
+            for channel in HANDLERS:
+                cursor.execute(f"LISTEN {channel};")
+        # Listening before dropping the caches means no change can fall between the two.
+        refresh_all()
+        self.connects += 1
+        self.connected = True
+
+        while True:
+            if select.select([conn], [], [], HEARTBEAT_SECONDS) == ([], [], []):
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1;")
+            conn.poll()
+            while conn.notifies:
+                message = conn.notifies.pop(0)
+                self._dispatch(message.channel, message.payload)
+
+    def _run(self):
+        delay = 1.0
+        while True:
+            conn = None
+            try:
+                conn = db.get_db_conn()
+                delay = 1.0
+                self._listen(conn)
+            except Exception as e:
+                print(f"Invalidation listener disconnected: {e}")
+            finally:
+                self.connected = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+
+    def stats(self):
+        return {
+            "connected": self.connected,
+            "connects": self.connects,
+            "received": self.received,
+            "errors": self.errors,
+        }
+
+
+listener = Listener()
+
+
+def ensure_started():
+    listener.ensure_started()
+
+
+def stats():
+    return listener.stats()
+
+
+def init_app(app):
+    app.before_request(ensure_started)
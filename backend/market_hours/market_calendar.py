@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from .. import db
+
+# Trading hours in market_hours are wall-clock times in this zone.
+MARKET_TIMEZONE = ZoneInfo(os.getenv("MARKET_TIMEZONE", "America/New_York"))
+# How many days of sessions are precomputed per load.
+CALENDAR_DAYS = int(os.getenv("MARKET_CALENDAR_DAYS", "30"))
+# Hours/holiday edits made through another worker are picked up after at
+# most this long.
+CALENDAR_TTL_SECONDS = float(os.getenv("MARKET_CALENDAR_TTL_SECONDS", "60"))
+
+
+class MarketCalendar:
+    """
+    Trading sessions for the next CALENDAR_DAYS days, as UTC instants.
+
+    `sessions` maps each local market date to its (open, close) pair, or
+    None on holidays, so is_open() is a date conversion and a dict lookup.
+    """
+
+    def __init__(self, open_time, close_time, holidays, start=None, days=CALENDAR_DAYS):
+        self.open_time = open_time
+        self.close_time = close_time
+        self.holidays = holidays
+        self.built_at = time.monotonic()
+
+        start = start or datetime.now(timezone.utc).astimezone(MARKET_TIMEZONE).date()
+        self.first_day = start
+        self.last_day = start + timedelta(days=days - 1)
+
+        self.sessions = {}
+        self._opens = []
+        self._closes = []
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            if not open_time or not close_time or day in holidays:
+                self.sessions[day] = None
+                continue
+            opens = datetime.combine(day, open_time, MARKET_TIMEZONE).astimezone(timezone.utc)
+            closes = datetime.combine(day, close_time, MARKET_TIMEZONE).astimezone(timezone.utc)
+            self.sessions[day] = (opens, closes)
+            self._opens.append(opens)
+            self._closes.append(closes)
+
+    @property
+    def configured(self):
+        return bool(self.open_time and self.close_time)
+
+    def covers(self, now):
+        return now.astimezone(MARKET_TIMEZONE).date() <= self.last_day
+
+    def session(self, now):
+        return self.sessions.get(now.astimezone(MARKET_TIMEZONE).date())
+
+    def is_holiday(self, now):
+        return now.astimezone(MARKET_TIMEZONE).date() in self.holidays
+
+    def is_open(self, now):
+        session = self.session(now)
+        return session is not None and session[0] <= now <= session[1]
+
+    def next_open(self, now):
+        i = bisect_right(self._opens, now)
+        return self._opens[i] if i < len(self._opens) else None
+
+    def next_close(self, now):
+        i = bisect_right(self._closes, now)
+        return self._closes[i] if i < len(self._closes) else None
+
+
+_calendar = None
+_load_lock = threading.Lock()
+
+
+def _load():
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT open_time, close_time FROM market_hours LIMIT 1;")
+        row = cur.fetchone()
+
+        today = datetime.now(timezone.utc).astimezone(MARKET_TIMEZONE).date()
+        cur.execute("""
+            SELECT holiday_date
+            FROM market_holidays
+            WHERE holiday_date BETWEEN %s AND %s;
+        """, (today, today + timedelta(days=CALENDAR_DAYS)))
+        holidays = {r[0] for r in cur.fetchall()}
+
+    open_time, close_time = row if row else (None, None)
+    return MarketCalendar(open_time, close_time, holidays, start=today)
+
+
+def current(now=None):
+    """
+    Returns the calendar, reloading it when it has been invalidated, is older
+    than CALENDAR_TTL_SECONDS, or no longer covers `now`.
+    """
+    global _calendar
+    now = now or datetime.now(timezone.utc)
+    calendar = _calendar
+    if (
+        calendar is not None
+        and time.monotonic() - calendar.built_at < CALENDAR_TTL_SECONDS
+        and calendar.covers(now)
+    ):
+        return calendar
+
+    with _load_lock:
+        if _calendar is calendar:
+            _calendar = _load()
+        return _calendar
+
+
+def invalidate():
+    """Drops the cached calendar; called after market hours or holidays change."""
+    global _calendar
+    _calendar = None
+
+
+def is_open(now=None):
+    now = now or datetime.now(timezone.utc)
+    return current(now).is_open(now)
+
+
+def market_status(now=None):
+    now = now or datetime.now(timezone.utc)
+    calendar = current(now)
+    next_open = calendar.next_open(now)
+    next_close = calendar.next_close(now)
+
+    return {
+        "is_open": calendar.is_open(now),
+        "is_holiday": calendar.is_holiday(now),
+        "timezone": str(MARKET_TIMEZONE),
+        "open_time": calendar.open_time.strftime("%H:%M") if calendar.open_time else None,
+        "close_time": calendar.close_time.strftime("%H:%M") if calendar.close_time else None,
+        "next_open": next_open.isoformat() if next_open else None,
+        "next_close": next_close.isoformat() if next_close else None,
+        "server_time": now.isoformat()
+    }
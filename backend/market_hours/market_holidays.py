@@ -1,27 +1,18 @@
-from .. import db
+from .. import conditional, db, invalidation
+from . import market_calendar
 
 def is_market_holiday():
-    conn = db.get_db_conn()
-    cur = conn.cursor()
-
-    cur.execute("SELECT 1 FROM market_holidays WHERE holiday_date = CURRENT_DATE;")
-    result = cur.fetchone()
-
-    cur.close()
-    conn.close()
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM market_holidays WHERE holiday_date = CURRENT_DATE;")
+        result = cur.fetchone()
 
     return result is not None
 
 
 def get_holidays():
-    conn = db.get_db_conn()
-    cur = conn.cursor()
-
-    cur.execute("SELECT id, holiday_date, name FROM market_holidays ORDER BY holiday_date;")
-    rows = cur.fetchall()
-
-    cur.close()
-    conn.close()
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id, holiday_date, name FROM market_holidays ORDER BY holiday_date;")
+        rows = cur.fetchall()
 
     return [
         {
@@ -34,26 +25,25 @@ def get_holidays():
 
 
 def add_holiday(holiday_date, name):
-    conn = db.get_db_conn()
-    cur = conn.cursor()
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO market_holidays (holiday_date, name)
+            VALUES (%s, %s)
+            ON CONFLICT (holiday_date) DO NOTHING;
+        """, (holiday_date, name))
+        invalidation.notify(cur, invalidation.CALENDAR_CHANGED, "holidays")
 
-    cur.execute("""
-        INSERT INTO market_holidays (holiday_date, name)
-        VALUES (%s, %s)
-        ON CONFLICT (holiday_date) DO NOTHING;
-    """, (holiday_date, name))
+        conn.commit()
 
-    conn.commit()
-    cur.close()
-    conn.close()
+    market_calendar.invalidate()
+    conditional.bump("holidays")
 
 
 def delete_holiday(holiday_id):
-    conn = db.get_db_conn()
-    cur = conn.cursor()
-
-    cur.execute("DELETE FROM market_holidays WHERE id = %s;", (holiday_id,))
-    conn.commit()
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM market_holidays WHERE id = %s;", (holiday_id,))
+        invalidation.notify(cur, invalidation.CALENDAR_CHANGED, "holidays")
+        conn.commit()
 
-    cur.close()
-    conn.close()
+    market_calendar.invalidate()
+    conditional.bump("holidays")
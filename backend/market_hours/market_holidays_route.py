@@ -1,13 +1,17 @@
 from flask import Blueprint, request, jsonify
 from .market_holidays import get_holidays, add_holiday, delete_holiday
+from ..auth.session_tokens import session_required
+from ..conditional import conditional
 
 market_holidays_bp = Blueprint("market_holidays", __name__, url_prefix="/api")
 
 @market_holidays_bp.get("/holidays")
+@conditional(lambda: "holidays")
 def list_holidays():
     return jsonify(get_holidays()), 200
 
 @market_holidays_bp.post("/holidays")
+@session_required(role="admin")
 def create_holiday():
     data = request.get_json() or {}
     holiday_date = data.get("date")
@@ -20,6 +24,7 @@ def create_holiday():
     return jsonify({"status": "success"}), 201
 
 @market_holidays_bp.delete("/holidays/<int:holiday_id>")
+@session_required(role="admin")
 def remove_holiday(holiday_id):
     delete_holiday(holiday_id)
     return jsonify({"status": "success"}), 200
\ No newline at end of file
@@ -1,14 +1,11 @@
-from .. import db
+from datetime import datetime, timezone
+from .. import conditional, db, invalidation
+from . import market_calendar
 
 def get_market_hours():
-    conn = db.get_db_conn()
-    cur = conn.cursor()
-
-    cur.execute("SELECT open_time, close_time FROM market_hours LIMIT 1;")
-    row = cur.fetchone()
-
-    cur.close()
-    conn.close()
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT open_time, close_time FROM market_hours LIMIT 1;")
+        row = cur.fetchone()
 
     if not row:
         return None, None
@@ -17,15 +14,35 @@ def get_market_hours():
 
 
 def set_market_hours(open_time_str, close_time_str):
-    conn = db.get_db_conn()
-    cur = conn.cursor()
-
-    cur.execute("""
-        UPDATE market_hours
-        SET open_time = %s, close_time = %s
-        WHERE id = 1;
-    """, (open_time_str, close_time_str))
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            UPDATE market_hours
+            SET open_time = %s, close_time = %s
+            WHERE id = 1;
+        """, (open_time_str, close_time_str))
+        invalidation.notify(cur, invalidation.CALENDAR_CHANGED, "market_hours")
+
+        conn.commit()
+
+    market_calendar.invalidate()
+    conditional.bump("market_hours")
+
+
+def market_closed_reason(now=None):
+    """
+    Checks trading hours and holidays against the cached market calendar.
+    Returns None when the market is open, otherwise (error message, HTTP status).
+    """
+    calendar = market_calendar.current(now)
+    now = now or datetime.now(timezone.utc)
+
+    if not calendar.configured:
+        return "Market hours not configured.", 500
+
+    if calendar.is_holiday(now):
+        return "Market is closed today due to a holiday.", 400
+
+    if not calendar.is_open(now):
+        return "Market is currently closed.", 400
+
+    return None
@@ -1,9 +1,13 @@
 from flask import Blueprint, request, jsonify
 from .market_hours import get_market_hours, set_market_hours
+from .market_calendar import market_status
+from ..auth.session_tokens import session_required
+from ..conditional import conditional
 
 market_hours_bp = Blueprint("market_hours", __name__, url_prefix="/api")
 
 @market_hours_bp.get("/market_hours")
+@conditional(lambda: "market_hours")
 def get_hours():
     open_t, close_t = get_market_hours()
     return jsonify({
@@ -12,6 +16,7 @@ def get_hours():
     }), 200
 
 @market_hours_bp.put("/market_hours")
+@session_required(role="admin")
 def update_hours():
     data = request.get_json() or {}
 
@@ -26,4 +31,12 @@ def update_hours():
     except ValueError:
         return jsonify({"error": "Time must be in HH:MM format, for example '09:30'."}), 400
 
-    return jsonify({"status": "success"}), 200
\ No newline at end of file
+    return jsonify({"status": "success"}), 200
+
+@market_hours_bp.get("/market_status")
+def get_market_status():
+    try:
+        return jsonify(market_status()), 200
+    except Exception as e:
+        print(f"Market Status Error: {e}")
+        return jsonify({"error": "An unexpected error occurred."}), 500
@@ -0,0 +1,272 @@
+"""
+Request and database instrumentation, served at GET /metrics in the
+Prometheus text format.
+
+init_app() times every Flask request and records its status and response
+size, labelled by route rule (not the raw path, to keep the series count
+bounded). Every psycopg2 cursor is a TimedCursor (see db.get_db_conn), so
+each request's query count, query time and the time it held a pooled
+connection are recorded against its route too. Queries slower than
+SLOW_QUERY_SECONDS are printed.
+
+Metrics are per worker process; each worker serves its own /metrics.
+"""
+import bisect
+import os
+import threading
+import time
+
+from flask import Response, request
+from psycopg2 import extensions
+
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} counter")
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in sorted(items):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} histogram")
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+
+
+REQUESTS = Counter("http_requests_total", "Requests by route, method and status.", ("route", "method", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency.", LATENCY_BUCKETS, ("route", "method"))
+RESPONSE_BYTES = Histogram("http_response_size_bytes", "Response body size.", SIZE_BUCKETS, ("route", "method"))
+REQUEST_QUERIES = Histogram("http_request_db_queries", "Database queries per request.", QUERY_COUNT_BUCKETS, ("route", "method"))
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Time per request spent in database queries.", LATENCY_BUCKETS, ("route", "method"))
+REQUEST_CONN_SECONDS = Histogram("http_request_db_connection_held_seconds", "Time per request holding pooled connections.", LATENCY_BUCKETS, ("route", "method"))
+BACKGROUND_QUERIES = Counter("db_background_queries_total", "Queries run outside a request (jobs, streams).")
+BACKGROUND_DB_SECONDS = Counter("db_background_query_seconds_total", "Time in queries run outside a request.")
+SLOW_QUERIES = Counter("db_slow_queries_total", "Queries slower than SLOW_QUERY_SECONDS, by route.", ("route",))
+
+_HISTOGRAMS = (REQUEST_SECONDS, RESPONSE_BYTES, REQUEST_QUERIES, REQUEST_DB_SECONDS, REQUEST_CONN_SECONDS)
+_COUNTERS = (REQUESTS, SLOW_QUERIES, BACKGROUND_QUERIES, BACKGROUND_DB_SECONDS)
+
+
+class _RequestStats:
+    __slots__ = ("route", "started", "queries", "db_seconds", "connection_seconds")
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.connection_seconds = 0.0
+
+
+_current = threading.local()
+
+
+def _stats():
+    return getattr(_current, "stats", None)
+
+
+def record_query(query, elapsed):
+    stats = _stats()
+    if stats is None:
+        BACKGROUND_QUERIES.inc()
+        BACKGROUND_DB_SECONDS.inc(amount=elapsed)
+    else:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+    if elapsed >= SLOW_QUERY_SECONDS:
+        route = stats.route if stats is not None else "background"
+        SLOW_QUERIES.inc((route,))
+        if isinstance(query, bytes):
+            query = query.decode("utf-8", "replace")
+        text = " ".join(str(query).split())
+        print(f"Slow query ({elapsed * 1000:.0f} ms) on {route}: {text[:500]}")
+
+
+def record_connection_held(elapsed):
+    stats = _stats()
+    if stats is not None:
+        stats.connection_seconds += elapsed
+
+
+class TimedCursor(extensions.cursor):
+    """psycopg2 cursor that reports each execute to the metrics."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+
+def _before_request():
+    rule = request.url_rule
+    _current.stats = _RequestStats(rule.rule if rule is not None else "unmatched")
+
+
+def _after_request(response):
+    stats = _stats()
+    if stats is None:
+        return response
+    labels = (stats.route, request.method)
+    REQUESTS.inc(labels + (str(response.status_code),))
+    REQUEST_SECONDS.observe(labels, time.perf_counter() - stats.started)
+    REQUEST_QUERIES.observe(labels, stats.queries)
+    REQUEST_DB_SECONDS.observe(labels, stats.db_seconds)
+    REQUEST_CONN_SECONDS.observe(labels, stats.connection_seconds)
+    if not response.is_streamed:
+        RESPONSE_BYTES.observe(labels, response.calculate_content_length() or 0)
+    return response
+
+
+def _teardown_request(error):
+    _current.stats = None
+
+
+def _gauge(lines, name, help_text, samples, kind="gauge"):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{name}{labels} {_number(value)}")
+
+
+def render():
+    from . import conditional, db, idempotency, invalidation, scheduler, single_flight
+    from .auth import passwords
+
+    lines = []
+    for metric in _COUNTERS + _HISTOGRAMS:
+        metric.render(lines)
+
+    pool = db.pool_stats()
+    for key in ("size", "idle", "in_use", "max_size"):
+        _gauge(lines, f"db_pool_{key}", f"Connection pool {key.replace('_', ' ')}.", [("", pool[key])])
+    for key in ("checkouts", "timeouts", "connects", "discarded"):
+        _gauge(lines, f"db_pool_{key}_total", f"Connection pool {key} since start.", [("", pool[key])], "counter")
+    _gauge(lines, "db_pool_wait_seconds_total", "Time spent waiting for a pooled connection.", [("", pool["wait_time_total"])], "counter")
+    _gauge(lines, "db_pool_wait_seconds_max", "Longest wait for a pooled connection.", [("", pool["wait_time_max"])])
+
+    idem = idempotency.stats()
+    for key in ("requests", "memory_hits", "db_hits", "executed", "in_progress", "mismatched"):
+        _gauge(lines, f"idempotency_{key}_total", f"Idempotency-Key requests: {key.replace('_', ' ')}.", [("", idem[key])], "counter")
+    _gauge(lines, "idempotency_hit_ratio", "Share of keyed requests answered from a stored response.", [("", idem["hit_rate"])])
+
+    cond = conditional.stats()
+    if cond:
+        _gauge(lines, "conditional_get_total", "Conditional GET outcomes: hits (304 without the view), revalidated, misses.", [
+            (_labels(("route", "result"), (route, result)), counts[result])
+            for route, counts in sorted(cond.items()) for result in conditional.Metrics.RESULTS
+        ], "counter")
+        _gauge(lines, "conditional_get_hit_ratio", "Share of requests answered 304 without running the view.", [
+            (_labels(("route",), (route,)), counts["hit_rate"]) for route, counts in sorted(cond.items())
+        ])
+
+    listener = invalidation.stats()
+    _gauge(lines, "invalidation_listener_connected", "Whether this process is listening for cache invalidations.", [("", int(listener["connected"]))])
+    for key in ("connects", "received", "errors"):
+        _gauge(lines, f"invalidation_{key}_total", f"Cache invalidation listener {key} since start.", [("", listener[key])], "counter")
+
+    flights = single_flight.stats()
+    if flights:
+        for key in ("calls", "executions", "collapsed"):
+            _gauge(lines, f"single_flight_{key}_total", f"Coalesced reads: {key}.", [
+                (_labels(("name",), (name,)), counts[key]) for name, counts in sorted(flights.items())
+            ], "counter")
+        _gauge(lines, "single_flight_max_waiters", "Most callers that shared one in-flight read.", [
+            (_labels(("name",), (name,)), counts["max_waiters"]) for name, counts in sorted(flights.items())
+        ])
+
+    hasher = passwords.pool_stats()
+    _gauge(lines, "password_hash_slots_in_use", "bcrypt jobs running or queued.", [("", hasher["in_use"])])
+
+    jobs = scheduler.job_stats()
+    if jobs:
+        for key in ("runs", "failures", "skipped", "overruns", "last_duration", "max_duration"):
+            _gauge(lines, f"scheduler_job_{key}", f"Scheduled job {key.replace('_', ' ')}.", [
+                (_labels(("job",), (job["job_id"],)), job[key]) for job in jobs
+            ])
+
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view():
+    return Response(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view, methods=["GET"])
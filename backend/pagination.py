@@ -0,0 +1,45 @@
+import base64
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    if value in (None, ""):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer.")
+    if limit < 1:
+        raise ValueError("limit must be at least 1.")
+    return min(limit, maximum)
+
+
+def encode_cursor(ts, row_id):
+    """Opaque keyset cursor for the row at (ts, row_id)."""
+    raw = f"{ts.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Returns the (ts, row_id) encoded by encode_cursor, or raises ValueError."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(ts), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+
+def keyset_page(rows, limit, ts_index, id_index):
+    """
+    Trims a result fetched with LIMIT limit + 1 to one page and returns it
+    with the cursor for the next page (None on the last page).
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last[ts_index], last[id_index])
@@ -0,0 +1,226 @@
+"""
+Background job runner.
+
+Run it as its own process (the Procfile's `worker` entry):
+
+    python -m backend.scheduler
+
+Any number of copies may run; they elect a leader through a Postgres
+advisory lock and only the leader runs jobs. If the leader's lock connection
+drops, its jobs are paused and another instance takes over.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import psycopg2
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from . import db, invalidation
+from .stock.price_stream import TICK_SECONDS
+from .stock.stock_repo import update_all_stock_prices
+from .user.portfolio_snapshots import snapshot_portfolio_values, SNAPSHOT_INTERVAL_SECONDS
+from .user.cash_ledger import compact_cash_ledger, COMPACT_INTERVAL_SECONDS
+from .idempotency import purge_expired_keys, PURGE_INTERVAL_SECONDS
+
+# Arbitrary key shared by every scheduler instance for pg_try_advisory_lock.
+LEADER_LOCK_KEY = 401_000_001
+# How often a follower retries the lock and the leader checks it still holds it.
+LEADER_CHECK_SECONDS = float(os.getenv("SCHEDULER_LEADER_CHECK_SECONDS", "5"))
+METRICS_LOG_SECONDS = float(os.getenv("SCHEDULER_METRICS_LOG_SECONDS", "300"))
+
+
+class JobMetrics:
+    """Run counts and timings for one job, updated by the job wrapper."""
+
+    def __init__(self, job_id, interval):
+        self.job_id = job_id
+        self.interval = interval
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.overruns = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.last_started_at = None
+        self.last_error = None
+
+    def stats(self):
+        return {
+            "job_id": self.job_id,
+            "interval": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "overruns": self.overruns,
+            "last_duration": self.last_duration,
+            "max_duration": self.max_duration,
+            "avg_duration": self.total_duration / self.runs if self.runs else 0.0,
+            "last_started_at": self.last_started_at.isoformat() if self.last_started_at else None,
+            "last_error": self.last_error,
+        }
+
+
+_metrics = {}
+
+
+def _timed(metrics, func):
+    def run():
+        metrics.last_started_at = datetime.now(timezone.utc)
+        started = time.monotonic()
+        try:
+            func()
+        except Exception as e:
+            metrics.failures += 1
+            metrics.last_error = str(e)
+            print(f"Scheduled job {metrics.job_id} failed: {e}")
+        finally:
+            duration = time.monotonic() - started
+            metrics.runs += 1
+            metrics.last_duration = duration
+            metrics.total_duration += duration
+            metrics.max_duration = max(metrics.max_duration, duration)
+            if duration > metrics.interval:
+                metrics.overruns += 1
+                print(f"Scheduled job {metrics.job_id} took {duration:.1f}s, longer than its {metrics.interval}s interval.")
+    return run
+
+
+def _on_skipped(event):
+    metrics = _metrics.get(event.job_id)
+    if metrics is not None:
+        metrics.skipped += 1
+
+
+def build_scheduler():
+    """
+    The app's recurring jobs. Each job runs at most once at a time; a run
+    that comes due while the previous one is still going is skipped rather
+    than queued, and missed runs are coalesced into one.
+    """
+    scheduler = BackgroundScheduler(job_defaults={
+        "max_instances": 1,
+        "coalesce": True,
+        "misfire_grace_time": 1,
+    })
+    scheduler.add_listener(_on_skipped, EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
+
+    jobs = [
+        ('stock_price_updater', 'Update stock prices and match limit orders', update_all_stock_prices, TICK_SECONDS),
+        ('portfolio_value_snapshot', 'Record changed position values for daily change calculation', snapshot_portfolio_values, SNAPSHOT_INTERVAL_SECONDS),
+        ('cash_ledger_compaction', 'Fold cash ledger entries into balance checkpoints', compact_cash_ledger, COMPACT_INTERVAL_SECONDS),
+        ('idempotency_key_purge', 'Delete expired idempotency keys', purge_expired_keys, PURGE_INTERVAL_SECONDS),
+    ]
+    for job_id, name, func, interval in jobs:
+        metrics = _metrics[job_id] = JobMetrics(job_id, interval)
+        scheduler.add_job(
+            func=_timed(metrics, func),
+            trigger="interval",
+            seconds=interval,
+            id=job_id,
+            name=name
+        )
+    return scheduler
+
+
+def job_stats():
+    return [metrics.stats() for metrics in _metrics.values()]
+
+
+class LeaderElection:
+    """
+    Holds a session-level advisory lock on a dedicated connection (outside
+    the pool, since the lock lives as long as the session does).
+    """
+
+    def __init__(self, key=LEADER_LOCK_KEY):
+        self.key = key
+        self._conn = None
+
+    def try_acquire(self):
+        try:
+            if self._conn is None or self._conn.closed:
+                self._conn = db.get_db_conn()
+                self._conn.autocommit = True
+            with self._conn.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s);", (self.key,))
+                return cursor.fetchone()[0]
+        except psycopg2.Error as e:
+            print(f"Scheduler leader election error: {e}")
+            self.release()
+            return False
+
+    def still_held(self):
+        try:
+            with self._conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT 1 FROM pg_locks
+                    WHERE locktype = 'advisory'
+                        AND pid = pg_backend_pid()
+                        AND classid = %s AND objid = %s AND objsubid = 1
+                        AND granted;
+                """, ((self.key >> 32) & 0xFFFFFFFF, self.key & 0xFFFFFFFF))
+                return cursor.fetchone() is not None
+        except (psycopg2.Error, AttributeError) as e:
+            print(f"Scheduler lost its leader connection: {e}")
+            self.release()
+            return False
+
+    def release(self):
+        conn, self._conn = self._conn, None
+        if conn is not None and not conn.closed:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+
+def run(stop_event=None):
+    """Runs the election loop until stop_event is set (forever by default)."""
+    stop_event = stop_event or threading.Event()
+    # Tick jobs read the market calendar, which the web workers change.
+    invalidation.ensure_started()
+    election = LeaderElection()
+    scheduler = build_scheduler()
+    scheduler.start(paused=True)
+    leader = False
+    last_metrics_log = time.monotonic()
+    print("Scheduler started; waiting for leadership.")
+
+    try:
+        while not stop_event.is_set():
+            if not leader and election.try_acquire():
+                leader = True
+                scheduler.resume()
+                print(f"Scheduler is leader (pid {os.getpid()}); jobs running.")
+            elif leader and not election.still_held():
+                leader = False
+                scheduler.pause()
+                print("Scheduler lost leadership; jobs paused.")
+
+            if leader and time.monotonic() - last_metrics_log >= METRICS_LOG_SECONDS:
+                last_metrics_log = time.monotonic()
+                for stats in job_stats():
+                    print(f"Scheduler job stats: {stats}")
+
+            stop_event.wait(LEADER_CHECK_SECONDS)
+    finally:
+        scheduler.shutdown(wait=False)
+        election.release()
+
+
+def start_in_background():
+    """Runs the scheduler on a daemon thread of the current process."""
+    stop_event = threading.Event()
+    threading.Thread(target=run, args=(stop_event,), name="scheduler", daemon=True).start()
+    return stop_event
+
+
+if __name__ == "__main__":
+    try:
+        run()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,130 @@
+"""
+Coalescing of identical concurrent reads within a worker.
+
+When a tick lands, many requests ask for the same rows at the same moment.
+do() runs a load once per key at a time: the first caller runs the query,
+and callers that arrive while it is in flight wait for it and share its
+result (or its exception), or with wait=False go on without it. Nothing is
+kept once the call returns, so later calls always see fresh data. The market
+snapshot refresh goes through do(); @single_flight applies the same to a
+repository read, keyed by its arguments.
+
+Callers share the returned object, so they must not modify it.
+"""
+import os
+import threading
+from functools import wraps
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+
+# Returned by do(..., wait=False) to a caller that found the load running.
+IN_FLIGHT = object()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class Metrics:
+    """
+    Per-name counts of calls, of queries actually run (executions) and of
+    callers that relied on another caller's query (collapsed).
+    """
+
+    FIELDS = ("calls", "executions", "collapsed", "max_waiters")
+
+    def __init__(self):
+        self._counts = {}
+
+    def counts(self, name):
+        return self._counts.setdefault(name, dict.fromkeys(self.FIELDS, 0))
+
+    def stats(self):
+        stats = {name: dict(counts) for name, counts in self._counts.items()}
+        for counts in stats.values():
+            counts["collapse_rate"] = counts["collapsed"] / counts["calls"] if counts["calls"] else 0.0
+        return stats
+
+
+class Group:
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.metrics = Metrics()
+
+    def do(self, name, key, fn, wait=True):
+        """
+        Runs fn() for key, or waits for the call already running for it and
+        returns its result. With wait=False, returns IN_FLIGHT at once instead
+        of waiting.
+        """
+        with self._lock:
+            counts = self.metrics.counts(name)
+            counts["calls"] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                counts["executions"] += 1
+            else:
+                flight.waiters += 1
+                counts["collapsed"] += 1
+
+        if not leader:
+            if not wait:
+                return IN_FLIGHT
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                counts["max_waiters"] = max(counts["max_waiters"], flight.waiters)
+            flight.done.set()
+
+
+_group = Group()
+
+
+def stats():
+    with _group._lock:
+        return _group.metrics.stats()
+
+
+def do(name, key, fn, wait=True):
+    """
+    Coalesces fn() with concurrent calls under the same key; see Group.do.
+    Not affected by SINGLE_FLIGHT, which only turns off @single_flight.
+    """
+    return _group.do(name, key, fn, wait)
+
+
+def single_flight(fn):
+    """Decorator; arguments must be hashable for calls to be coalesced."""
+    name = fn.__name__
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not SINGLE_FLIGHT_ENABLED:
+            return fn(*args, **kwargs)
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return fn(*args, **kwargs)
+        return _group.do(name, key, lambda: fn(*args, **kwargs))
+    return wrapper
@@ -0,0 +1,219 @@
+"""
+Content-addressed company logos.
+
+A logo is stored once in stock_logos under the SHA-256 of its bytes, with a
+THUMBNAIL_SIZE px PNG thumbnail made when it is uploaded. Stock rows keep only
+the hash and listings carry the /stocks/logo/<hash> URL. The bytes behind a
+hash never change, so clients may cache the logo routes indefinitely and
+this process keeps recently served logos in a bounded in-memory cache.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import psycopg2
+from PIL import Image, UnidentifiedImageError
+
+from .. import db
+
+THUMBNAIL_SIZE = int(os.getenv("LOGO_THUMBNAIL_SIZE", "64"))
+MAX_LOGO_BYTES = int(os.getenv("LOGO_MAX_BYTES", str(2 * 1024 * 1024)))
+# A small compressed file can declare a huge canvas, so the pixel count is
+# checked from the header before anything is decoded.
+MAX_LOGO_PIXELS = int(os.getenv("LOGO_MAX_PIXELS", str(2048 * 2048)))
+LOGO_CACHE_BYTES = int(os.getenv("LOGO_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+FORMATS = {"PNG": "image/png", "JPEG": "image/jpeg", "GIF": "image/gif", "WEBP": "image/webp"}
+HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class Logo:
+    __slots__ = ("logo_hash", "content_type", "data", "thumbnail")
+
+    def __init__(self, logo_hash, content_type, data, thumbnail):
+        self.logo_hash = logo_hash
+        self.content_type = content_type
+        self.data = data
+        self.thumbnail = thumbnail
+
+
+def decode_image_data(value):
+    """Bytes of a base64 data: URL or a bare base64 string."""
+    if not isinstance(value, str):
+        raise ValueError("image_data must be a base64 string.")
+    if value.startswith("data:"):
+        header, sep, value = value.partition(",")
+        if not sep or not header.endswith(";base64"):
+            raise ValueError("image_data must be a base64 data URL.")
+    try:
+        return base64.b64decode("".join(value.split()), validate=True)
+    except binascii.Error:
+        raise ValueError("image_data is not valid base64.")
+
+
+def make_thumbnail(image):
+    thumbnail = image.convert("RGBA") if image.mode not in ("RGB", "RGBA") else image.copy()
+    thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    out = io.BytesIO()
+    thumbnail.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+def _open(data):
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > MAX_LOGO_PIXELS:
+            raise ValueError(f"Logo may be at most {MAX_LOGO_PIXELS} pixels.")
+        image.load()
+        return image
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValueError("image_data is not a readable image.")
+
+
+def prepare_logo(image_data):
+    """Validates an uploaded logo and makes its thumbnail. Raises ValueError."""
+    data = decode_image_data(image_data)
+    if len(data) > MAX_LOGO_BYTES:
+        raise ValueError(f"Logo may be at most {MAX_LOGO_BYTES} bytes.")
+
+    image = _open(data)
+    content_type = FORMATS.get(image.format)
+    if content_type is None:
+        raise ValueError(f"Logo must be one of: {', '.join(FORMATS)}.")
+
+    return Logo(hashlib.sha256(data).hexdigest(), content_type, data, make_thumbnail(image))
+
+
+def store_logo(cursor, logo):
+    """Stores the logo if no identical one exists; returns its hash. The caller commits."""
+    cursor.execute("""
+        INSERT INTO stock_logos (logo_hash, content_type, original, thumbnail)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (logo_hash) DO NOTHING;
+    """, (logo.logo_hash, logo.content_type, psycopg2.Binary(logo.data), psycopg2.Binary(logo.thumbnail)))
+    return logo.logo_hash
+
+
+class LogoCache:
+    """LRU of served logos by (hash, thumbnail), bounded by total bytes."""
+
+    def __init__(self, max_bytes=LOGO_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        if len(entry[0]) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[0])
+            self._entries[key] = entry
+            self.size += len(entry[0])
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted[0])
+
+
+_cache = LogoCache()
+
+
+def _load(cursor, logo_hash, thumbnail):
+    cursor.execute("""
+        SELECT content_type, original, thumbnail
+        FROM stock_logos
+        WHERE logo_hash = %s;
+    """, (logo_hash,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    content_type, original, stored_thumbnail = row
+    if not thumbnail:
+        return bytes(original), content_type
+    if stored_thumbnail is not None:
+        return bytes(stored_thumbnail), "image/png"
+
+    # Logos moved by migration 010 get their thumbnail on first request.
+    made = _fill_thumbnail(cursor, logo_hash, bytes(original))
+    if made is None:
+        return bytes(original), content_type
+    return made, "image/png"
+
+
+def _fill_thumbnail(cursor, logo_hash, original):
+    """Stores and returns the thumbnail of a logo that has none, or None if it is unreadable."""
+    try:
+        made = make_thumbnail(_open(original))
+    except ValueError:
+        return None
+    cursor.execute("""
+        UPDATE stock_logos SET thumbnail = %s
+        WHERE logo_hash = %s AND thumbnail IS NULL;
+    """, (psycopg2.Binary(made), logo_hash))
+    return made
+
+
+def fill_missing_thumbnails(after="", limit=100):
+    """
+    Makes the thumbnails of up to `limit` logos that have none, taking hashes
+    after `after` in order, as the first thumbnail request would. Returns
+    (last hash looked at, thumbnails made); the hash is None when none are left.
+    """
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT logo_hash, original
+                FROM stock_logos
+                WHERE thumbnail IS NULL AND logo_hash > %s
+                ORDER BY logo_hash
+                LIMIT %s;
+            """, (after, limit))
+            rows = cursor.fetchall()
+
+            made = sum(
+                _fill_thumbnail(cursor, logo_hash, bytes(original)) is not None
+                for logo_hash, original in rows
+            )
+            conn.commit()
+
+    except psycopg2.Error as e:
+        print(f"Database error in fill_missing_thumbnails: {e}")
+        raise
+
+    return (rows[-1][0] if rows else None), made
+
+
+def get_logo(logo_hash, thumbnail=False):
+    """Returns (bytes, content_type) of a logo or its thumbnail, or None if unknown."""
+    key = (logo_hash, thumbnail)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            logo = _load(cursor, logo_hash, thumbnail)
+            conn.commit()
+
+    except psycopg2.Error as e:
+        print(f"Database error in get_logo: {e}")
+        raise
+
+    if logo is not None:
+        _cache.put(key, logo)
+    return logo
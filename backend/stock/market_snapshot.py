@@ -0,0 +1,214 @@
+import hashlib
+import heapq
+import os
+import time
+import psycopg2
+from .. import db, single_flight
+from .price_stream import TICK_SECONDS
+
+# A worker that did not run the tick itself picks up new prices at most this
+# long after they were written.
+SNAPSHOT_TTL_SECONDS = float(os.getenv("MARKET_SNAPSHOT_TTL_SECONDS", str(TICK_SECONDS)))
+TOP_MOVERS = 3
+
+LISTING_CACHE_SIZE = 32
+
+# Stock columns served by listings, in row order, with the SQL for each. Logos
+# stay out of the rows: each row carries the URL of its content-addressed logo
+# instead (see logos.py).
+LISTING_COLUMNS = {
+    "stock_id": "stock_id",
+    "company_name": "company_name",
+    "symbol": "symbol",
+    "price": "price",
+    "description": "description",
+    "previous_price": "previous_price",
+    "logo_url": "CASE WHEN logo_hash IS NULL THEN NULL ELSE '/stocks/logo/' || logo_hash END AS logo_url",
+    "is_tradable": "is_tradable",
+    "volatility": "volatility",
+    "drift": "drift",
+}
+
+
+def select_list(fields=None):
+    """SQL select list for the given listing fields (all of them by default)."""
+    return ", ".join(LISTING_COLUMNS[field] for field in (fields or LISTING_COLUMNS))
+
+
+def parse_fields(value):
+    """
+    Parses a comma-separated fields= parameter into a tuple of listing column
+    names, or None when absent. Raises ValueError on unknown names.
+    """
+    if not value:
+        return None
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(",") if field.strip()))
+    unknown = [field for field in fields if field not in LISTING_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(LISTING_COLUMNS)}.")
+    return fields or None
+
+
+def parse_format(value):
+    if value in (None, "", "rows"):
+        return "rows"
+    if value == "columns":
+        return "columns"
+    raise ValueError("format must be 'rows' or 'columns'.")
+
+
+STOCK_COLUMNS = select_list()
+SNAPSHOT_QUERY = f"SELECT {STOCK_COLUMNS} FROM stocks;"
+
+
+class MarketSnapshot:
+    """
+    Read-only view of the stocks table as of one tick.
+
+    Built once and then only read, so request threads can use it without
+    locking; a refresh builds a new snapshot and swaps the reference.
+    """
+
+    def __init__(self, columns, rows, tick_id):
+        self.columns = columns
+        self.tick_id = tick_id
+        self.built_at = time.monotonic()
+
+        col = {name: i for i, name in enumerate(columns)}
+        id_col, symbol_col = col["stock_id"], col["symbol"]
+        price_col, previous_col = col["price"], col["previous_price"]
+        name_col, tradable_col = col["company_name"], col["is_tradable"]
+
+        self.rows = sorted(rows, key=lambda row: row[id_col])
+        self.by_id = {row[id_col]: row for row in self.rows}
+        self.id_by_symbol = {row[symbol_col]: row[id_col] for row in self.rows}
+        self.tradable = [row for row in self.rows if row[tradable_col]]
+
+        movers = [
+            (row, (row[price_col] - row[previous_col]) / row[previous_col] * 100)
+            for row in self.rows
+            if row[previous_col] is not None and row[previous_col] > 0
+        ]
+
+        def mover(row, pct):
+            return (row[id_col], row[symbol_col], row[name_col], row[price_col], row[previous_col], pct)
+
+        self.top_gainers = [
+            mover(row, pct) for row, pct in heapq.nlargest(TOP_MOVERS, movers, key=lambda m: m[1])
+        ]
+        self.top_losers = [
+            mover(row, -pct) for row, pct in heapq.nsmallest(TOP_MOVERS, movers, key=lambda m: m[1])
+        ]
+
+        digest = hashlib.blake2b(repr(self.rows).encode(), digest_size=8).hexdigest()
+        self.etag = f'"{tick_id}-{digest}"'
+
+        self._col = col
+        self._listings = {}
+
+    def listing(self, fields=None, fmt="rows"):
+        """
+        Tradable stocks restricted to the given fields, as (columns, data,
+        etag). "rows" data is one list per stock and "columns" data one list
+        per field. Results are kept per snapshot, since it never changes.
+        """
+        key = (fields, fmt)
+        listing = self._listings.get(key)
+        if listing is not None:
+            return listing
+
+        columns = list(fields or self.columns)
+        if fields is None and fmt == "rows":
+            data = self.tradable
+        else:
+            indexes = [self._col[name] for name in columns]
+            if fmt == "columns":
+                data = [[row[i] for row in self.tradable] for i in indexes]
+            else:
+                data = [[row[i] for i in indexes] for row in self.tradable]
+
+        if fields is None and fmt == "rows":
+            etag = self.etag
+        else:
+            variant = hashlib.blake2b(repr(key).encode(), digest_size=4).hexdigest()
+            etag = f'{self.etag[:-1]}-{variant}"'
+
+        listing = (columns, data, etag)
+        if len(self._listings) < LISTING_CACHE_SIZE:
+            self._listings[key] = listing
+        return listing
+
+
+_snapshot = None
+
+
+def _load():
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT last_value FROM market_tick_seq;")
+            tick_id = cursor.fetchone()[0]
+
+            cursor.execute(SNAPSHOT_QUERY)
+            columns = [desc[0] for desc in cursor.description]
+            rows = cursor.fetchall()
+
+        return MarketSnapshot(columns, rows, tick_id)
+
+    except psycopg2.Error as e:
+        print(f"Database error in market snapshot refresh: {e}")
+        raise
+
+
+def install(snapshot):
+    global _snapshot
+    _snapshot = snapshot
+    return snapshot
+
+
+def refresh():
+    return install(_load())
+
+
+def peek():
+    """The snapshot currently held by this process, fresh or not (or None)."""
+    return _snapshot
+
+
+def is_stale(snapshot):
+    return snapshot is None or time.monotonic() - snapshot.built_at >= SNAPSHOT_TTL_SECONDS
+
+
+def _refresh_from(seen):
+    """Rebuilds the snapshot unless another caller has already replaced seen."""
+    snapshot = _snapshot
+    if snapshot is not seen and not is_stale(snapshot):
+        return snapshot
+    return refresh()
+
+
+def current():
+    """
+    Returns the latest snapshot. Only the first callers in a process wait for
+    the database, sharing one load; after that a stale snapshot is refreshed
+    by one request while the others keep being served from the previous one.
+    """
+    snapshot = _snapshot
+    if not is_stale(snapshot):
+        return snapshot
+
+    if snapshot is None:
+        return single_flight.do("market_snapshot", "refresh", lambda: _refresh_from(None))
+
+    try:
+        fresh = single_flight.do("market_snapshot", "refresh", lambda: _refresh_from(snapshot), wait=False)
+    except Exception as e:
+        print(f"Serving stale market snapshot: {e}")
+        return snapshot
+    return snapshot if fresh is single_flight.IN_FLIGHT else fresh
+
+
+def invalidate():
+    """Marks the snapshot stale so the next read rebuilds it."""
+    snapshot = _snapshot
+    if snapshot is not None:
+        snapshot.built_at = float("-inf")
@@ -0,0 +1,285 @@
+import heapq
+import threading
+from collections import namedtuple
+from decimal import Decimal
+import psycopg2
+from psycopg2 import errors
+from .. import db
+
+ORDER_SIDES = ('BUY', 'SELL')
+ORDER_STATUSES = ('OPEN', 'FILLED', 'CANCELLED', 'REJECTED')
+# Orders committed out of id order (a slow insert that got a lower id) are
+# still picked up if they were created within this window.
+SYNC_OVERLAP = "1 minute"
+
+LimitOrder = namedtuple(
+    "LimitOrder",
+    ["order_id", "user_id", "stock_id", "side", "shares", "limit_price", "fee_amount"]
+)
+
+
+class OrderBook:
+    """
+    Resting limit orders for one stock in price-time priority.
+
+    Bids sit in a max-heap on limit price and asks in a min-heap, both
+    tie-broken by order_id (ids are handed out in arrival order). Cancelled
+    orders are only dropped from `orders`; their heap entries are skipped
+    when they reach the top and swept out once they outnumber live orders.
+    """
+
+    def __init__(self):
+        self.orders = {}
+        self._bids = []
+        self._asks = []
+
+    def add(self, order):
+        self.orders[order.order_id] = order
+        if order.side == 'BUY':
+            heapq.heappush(self._bids, (-order.limit_price, order.order_id))
+        else:
+            heapq.heappush(self._asks, (order.limit_price, order.order_id))
+
+    def cancel(self, order_id):
+        if self.orders.pop(order_id, None) is None:
+            return False
+        if len(self._bids) + len(self._asks) > 2 * len(self.orders) + 64:
+            self._compact()
+        return True
+
+    def _compact(self):
+        self._bids = [entry for entry in self._bids if entry[1] in self.orders]
+        self._asks = [entry for entry in self._asks if entry[1] in self.orders]
+        heapq.heapify(self._bids)
+        heapq.heapify(self._asks)
+
+    def best_bid(self):
+        self._skip_cancelled(self._bids)
+        return -self._bids[0][0] if self._bids else None
+
+    def best_ask(self):
+        self._skip_cancelled(self._asks)
+        return self._asks[0][0] if self._asks else None
+
+    def _skip_cancelled(self, heap):
+        while heap and heap[0][1] not in self.orders:
+            heapq.heappop(heap)
+
+    def match(self, price):
+        """
+        Removes and returns every order the market price `price` satisfies:
+        bids at or above it, then asks at or below it, each in priority order.
+        """
+        triggered = []
+        bids, asks, orders = self._bids, self._asks, self.orders
+
+        while bids and -bids[0][0] >= price:
+            order = orders.pop(heapq.heappop(bids)[1], None)
+            if order is not None:
+                triggered.append(order)
+
+        while asks and asks[0][0] <= price:
+            order = orders.pop(heapq.heappop(asks)[1], None)
+            if order is not None:
+                triggered.append(order)
+
+        return triggered
+
+    def __len__(self):
+        return len(self.orders)
+
+
+class OrderBooks:
+    """
+    Every stock's order book in this process, kept in step with the
+    limit_orders table by sync(). Only the process that runs the price tick
+    loads and matches them; elsewhere the books stay empty.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.last_order_id = 0
+        self._books = {}
+        self._stock_of = {}
+        self._lock = threading.Lock()
+
+    def _add(self, order):
+        if order.order_id in self._stock_of:
+            return
+        book = self._books.get(order.stock_id)
+        if book is None:
+            book = self._books[order.stock_id] = OrderBook()
+        book.add(order)
+        self._stock_of[order.order_id] = order.stock_id
+        self.last_order_id = max(self.last_order_id, order.order_id)
+
+    def add(self, order):
+        with self._lock:
+            self._add(order)
+
+    def add_many(self, orders):
+        with self._lock:
+            for order in orders:
+                self._add(order)
+
+    def cancel(self, order_id):
+        with self._lock:
+            stock_id = self._stock_of.pop(order_id, None)
+            if stock_id is None:
+                return False
+            return self._books[stock_id].cancel(order_id)
+
+    def match(self, ticks):
+        """Returns the orders triggered by a batch of (stock_id, price) ticks."""
+        triggered = []
+        with self._lock:
+            for stock_id, price in ticks:
+                book = self._books.get(stock_id)
+                if book:
+                    for order in book.match(price):
+                        del self._stock_of[order.order_id]
+                        triggered.append(order)
+        return triggered
+
+    def depth(self, stock_id):
+        book = self._books.get(stock_id)
+        if not book:
+            return None, None, 0
+        with self._lock:
+            return book.best_bid(), book.best_ask(), len(book)
+
+    def open_count(self):
+        return len(self._stock_of)
+
+
+books = OrderBooks()
+
+
+def _order_from_row(row):
+    return LimitOrder(row[0], row[1], row[2], row[3], row[4], row[5], row[6])
+
+
+def _order_to_dict(row):
+    return {
+        "order_id": row[0],
+        "user_id": row[1],
+        "stock_id": row[2],
+        "side": row[3],
+        "shares": row[4],
+        "limit_price": row[5],
+        "fee_amount": row[6],
+        "status": row[7],
+        "transaction_id": row[8],
+        "reject_reason": row[9],
+        "created_at": row[10].isoformat() if row[10] else None,
+        "updated_at": row[11].isoformat() if row[11] else None
+    }
+
+
+_ORDER_COLUMNS = """
+    order_id, user_id, stock_id, side, shares, limit_price, fee_amount,
+    status, transaction_id, reject_reason, created_at, updated_at
+"""
+
+
+def sync():
+    """
+    Loads open orders placed since the last sync (all of them the first
+    time). Orders cancelled elsewhere are not tracked here; they are dropped
+    when matching fails to claim them.
+    """
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT order_id, user_id, stock_id, side, shares, limit_price, fee_amount
+                FROM limit_orders
+                WHERE status = 'OPEN'
+                    AND (order_id > %s OR created_at > NOW() - INTERVAL '{SYNC_OVERLAP}')
+                ORDER BY order_id;
+            """, (books.last_order_id,))
+            books.add_many(_order_from_row(row) for row in cursor.fetchall())
+            books.loaded = True
+
+    except psycopg2.Error as e:
+        print(f"Database error in order book sync: {e}")
+        raise
+
+
+def place_limit_order(user_id, stock_id, side, shares, limit_price, fee_amount=0):
+    side = str(side).upper()
+    if side not in ORDER_SIDES:
+        raise ValueError("Invalid side. Must be 'BUY' or 'SELL'.")
+
+    try:
+        shares = Decimal(str(shares))
+        limit_price = Decimal(str(limit_price))
+        fee_amount = Decimal(str(fee_amount))
+    except Exception:
+        raise ValueError("Invalid number format for shares, limit_price, or fee_amount.")
+
+    if shares <= 0 or limit_price <= 0:
+        raise ValueError("shares and limit_price must be greater than zero.")
+    if fee_amount < 0:
+        raise ValueError("fee_amount cannot be negative.")
+
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO limit_orders (user_id, stock_id, side, shares, limit_price, fee_amount)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING {_ORDER_COLUMNS};
+            """, (user_id, stock_id, side, shares, limit_price, fee_amount))
+            row = cursor.fetchone()
+            conn.commit()
+
+    except errors.ForeignKeyViolation:
+        raise ValueError("Unknown user_id or stock_id.")
+    except psycopg2.Error as e:
+        print(f"Database error in place_limit_order: {e}")
+        raise
+
+    if books.loaded:
+        books.add(_order_from_row(row))
+    return _order_to_dict(row)
+
+
+def cancel_limit_order(user_id, order_id):
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE limit_orders
+                SET status = 'CANCELLED', updated_at = NOW()
+                WHERE order_id = %s AND user_id = %s AND status = 'OPEN'
+                RETURNING {_ORDER_COLUMNS};
+            """, (order_id, user_id))
+            row = cursor.fetchone()
+            conn.commit()
+
+    except psycopg2.Error as e:
+        print(f"Database error in cancel_limit_order: {e}")
+        raise
+
+    if row is None:
+        raise ValueError(f"Order {order_id} not found or no longer open.")
+
+    books.cancel(order_id)
+    return _order_to_dict(row)
+
+
+def get_user_limit_orders(user_id, status=None):
+    if status is not None and status not in ORDER_STATUSES:
+        raise ValueError(f"Invalid status. Use one of: {', '.join(ORDER_STATUSES)}.")
+
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT {_ORDER_COLUMNS}
+                FROM limit_orders
+                WHERE user_id = %s AND (%s::text IS NULL OR status = %s)
+                ORDER BY order_id DESC;
+            """, (user_id, status, status))
+            return [_order_to_dict(row) for row in cursor.fetchall()]
+
+    except psycopg2.Error as e:
+        print(f"Database error in get_user_limit_orders: {e}")
+        raise
@@ -0,0 +1,50 @@
+import os
+import random
+from decimal import Decimal
+from psycopg2.extras import execute_values
+
+# A tick moves each price by drift +/- volatility (as a fraction of the price),
+# which with the defaults matches the old uniform +/-1% walk.
+DEFAULT_VOLATILITY = float(os.getenv("PRICE_TICK_VOLATILITY", "0.01"))
+DEFAULT_DRIFT = float(os.getenv("PRICE_TICK_DRIFT", "0"))
+MIN_PRICE = 0.01
+
+
+def generate_ticks(stocks, rng=random):
+    """
+    Computes the next price for every stock in a single pass.
+
+    `stocks` is a sequence of (stock_id, price, volatility, drift) rows; NULL
+    volatility/drift fall back to the defaults. Returns (stock_id, new_price)
+    pairs with prices rounded to the cent.
+    """
+    draw = rng.random
+    ticks = []
+    append = ticks.append
+    for stock_id, price, volatility, drift in stocks:
+        sigma = DEFAULT_VOLATILITY if volatility is None else float(volatility)
+        mu = DEFAULT_DRIFT if drift is None else float(drift)
+        new_price = float(price) * (1.0 + mu + sigma * (2.0 * draw() - 1.0))
+        if new_price < MIN_PRICE:
+            new_price = MIN_PRICE
+        append((stock_id, Decimal(f"{new_price:.2f}")))
+    return ticks
+
+
+def apply_ticks(cursor, ticks):
+    """
+    Writes a batch of ticks with one UPDATE ... FROM (VALUES ...) statement.
+    Returns the number of rows updated.
+    """
+    if not ticks:
+        return 0
+
+    execute_values(cursor, """
+        UPDATE stocks AS s
+        SET previous_price = s.price,
+            price = v.price
+        FROM (VALUES %s) AS v(stock_id, price)
+        WHERE s.stock_id = v.stock_id;
+    """, ticks, template="(%s, %s::numeric)", page_size=len(ticks))
+
+    return cursor.rowcount
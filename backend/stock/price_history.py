@@ -0,0 +1,209 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+import psycopg2
+from .. import db
+
+# Candle resolutions and their bucket width.
+RESOLUTIONS = {
+    "1m": timedelta(minutes=1),
+    "5m": timedelta(minutes=5),
+    "1h": timedelta(hours=1),
+    "1d": timedelta(days=1),
+}
+
+# Raw ticks are only kept long enough to rebuild recent candles; older days
+# live on in price_candles.
+TICK_RETENTION_DAYS = int(os.getenv("PRICE_TICK_RETENTION_DAYS", "7"))
+MAX_CANDLES = 5000
+
+_partition_days = set()
+_partition_lock = threading.Lock()
+
+
+def bucket_start(ts, resolution):
+    if resolution == "1m":
+        return ts.replace(second=0, microsecond=0)
+    if resolution == "5m":
+        return ts.replace(minute=ts.minute - ts.minute % 5, second=0, microsecond=0)
+    if resolution == "1h":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if resolution == "1d":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unsupported interval '{resolution}'.")
+
+
+def _partition_name(day):
+    return f"price_ticks_{day:%Y%m%d}"
+
+
+def ensure_tick_partitions(cursor, ts):
+    """
+    Makes sure the daily partitions for `ts` and the following day exist and
+    drops partitions past the retention window. Runs its DDL at most once per
+    day per process.
+    """
+    today = ts.date()
+    if today in _partition_days:
+        return
+
+    with _partition_lock:
+        for day in (today, today + timedelta(days=1)):
+            start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {_partition_name(day)}
+                PARTITION OF price_ticks
+                FOR VALUES FROM (%s) TO (%s);
+            """, (start, start + timedelta(days=1)))
+
+        cursor.execute("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'price_ticks'::regclass;
+        """)
+        cutoff = _partition_name(today - timedelta(days=TICK_RETENTION_DAYS))
+        for (relname,) in cursor.fetchall():
+            if relname.startswith("price_ticks_") and relname < cutoff:
+                cursor.execute(f"DROP TABLE IF EXISTS {relname};")
+
+        _partition_days.add(today)
+
+
+def forget_tick_partitions():
+    # Called when a tick transaction rolls back, since partitions created in
+    # it were rolled back too.
+    with _partition_lock:
+        _partition_days.clear()
+
+
+def record_ticks(cursor, ticks, ts):
+    """
+    Appends a batch of (stock_id, price) ticks to price_ticks and folds them
+    into the open 1m/5m/1h/1d candles. Runs inside the caller's transaction.
+    """
+    if not ticks:
+        return
+
+    ensure_tick_partitions(cursor, ts)
+    # Candle rows are locked in stock order, as roll_up_trade_volumes does.
+    ticks = sorted(ticks, key=lambda tick: tick[0])
+
+    stock_ids = [stock_id for stock_id, _ in ticks]
+    prices = [price for _, price in ticks]
+    resolutions = list(RESOLUTIONS)
+    buckets = [bucket_start(ts, resolution) for resolution in resolutions]
+
+    cursor.execute("""
+        INSERT INTO price_ticks (stock_id, ts, price)
+        SELECT t.stock_id, %s, t.price
+        FROM unnest(%s::integer[], %s::numeric[]) AS t(stock_id, price);
+    """, (ts, stock_ids, prices))
+
+    cursor.execute("""
+        INSERT INTO price_candles (stock_id, resolution, bucket_start, open, high, low, close, tick_count)
+        SELECT t.stock_id, r.resolution, r.bucket_start, t.price, t.price, t.price, t.price, 1
+        FROM unnest(%s::integer[], %s::numeric[]) AS t(stock_id, price)
+        CROSS JOIN unnest(%s::text[], %s::timestamptz[]) AS r(resolution, bucket_start)
+        ON CONFLICT (stock_id, resolution, bucket_start) DO UPDATE
+        SET high = GREATEST(price_candles.high, EXCLUDED.high),
+            low = LEAST(price_candles.low, EXCLUDED.low),
+            close = EXCLUDED.close,
+            tick_count = price_candles.tick_count + 1;
+    """, (stock_ids, prices, resolutions, buckets))
+
+
+def queue_trade_volumes(cursor, trades):
+    """
+    Queues a batch of (stock_id, shares, price) trades for the candles. Runs
+    inside the trade's transaction, which only appends rows, so concurrent
+    trades and the tick never wait on each other's candle locks. The volume
+    shows up in the candles at the next price tick.
+    """
+    if not trades:
+        return
+
+    cursor.execute("""
+        INSERT INTO trade_volume_queue (stock_id, shares, price)
+        SELECT * FROM unnest(%s::integer[], %s::numeric[], %s::numeric[]);
+    """, (
+        [stock_id for stock_id, _, _ in trades],
+        [shares for _, shares, _ in trades],
+        [price for _, _, price in trades],
+    ))
+
+
+def roll_up_trade_volumes(cursor):
+    """
+    Moves the queued trades into the 1m/5m/1h/1d candles of the buckets they
+    were made in, in one upsert. Runs inside the tick's transaction, so if it
+    rolls back the trades stay queued. Returns the number of trades added.
+    """
+    cursor.execute("DELETE FROM trade_volume_queue RETURNING stock_id, shares, price, executed_at;")
+    trades = cursor.fetchall()
+    if not trades:
+        return 0
+
+    # A single upsert cannot touch the same candle twice, so trades are summed
+    # per candle first; the latest price opens a candle the ticks never did.
+    candles = {}
+    for stock_id, shares, price, executed_at in sorted(trades, key=lambda trade: trade[3]):
+        for resolution in RESOLUTIONS:
+            key = (stock_id, resolution, bucket_start(executed_at.astimezone(timezone.utc), resolution))
+            total, _ = candles.get(key, (0, price))
+            candles[key] = (total + shares, price)
+
+    keys = sorted(candles)
+    cursor.execute("""
+        INSERT INTO price_candles (stock_id, resolution, bucket_start, open, high, low, close, volume)
+        SELECT t.stock_id, t.resolution, t.bucket_start, t.price, t.price, t.price, t.price, t.shares
+        FROM unnest(%s::integer[], %s::text[], %s::timestamptz[], %s::numeric[], %s::numeric[])
+            AS t(stock_id, resolution, bucket_start, shares, price)
+        ON CONFLICT (stock_id, resolution, bucket_start) DO UPDATE
+        SET volume = price_candles.volume + EXCLUDED.volume;
+    """, (
+        [key[0] for key in keys],
+        [key[1] for key in keys],
+        [key[2] for key in keys],
+        [candles[key][0] for key in keys],
+        [candles[key][1] for key in keys],
+    ))
+    return len(trades)
+
+
+def get_candles(stock_id, resolution, start=None, end=None):
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unsupported interval '{resolution}'. Use one of: {', '.join(RESOLUTIONS)}.")
+
+    end = end or datetime.now(timezone.utc)
+    start = start or end - RESOLUTIONS[resolution] * 500
+
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            query = """
+                SELECT bucket_start, open, high, low, close, volume
+                FROM price_candles
+                WHERE stock_id = %s
+                    AND resolution = %s
+                    AND bucket_start >= %s
+                    AND bucket_start <= %s
+                ORDER BY bucket_start
+                LIMIT %s;
+            """
+            cursor.execute(query, (stock_id, resolution, start, end, MAX_CANDLES))
+
+            return [
+                {
+                    "time": row[0].isoformat(),
+                    "open": row[1],
+                    "high": row[2],
+                    "low": row[3],
+                    "close": row[4],
+                    "volume": row[5]
+                }
+                for row in cursor.fetchall()
+            ]
+
+    except psycopg2.Error as e:
+        print(f"Database error in get_candles: {e}")
+        raise
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+import psycopg2
+from .. import db
+
+# How often prices move (matches the scheduler's tick job) and how often an
+# idle stream gets a keep-alive comment.
+TICK_SECONDS = float(os.getenv("PRICE_TICK_SECONDS", "10"))
+HEARTBEAT_SECONDS = float(os.getenv("PRICE_STREAM_HEARTBEAT_SECONDS", "15"))
+
+
+class Subscription:
+    """
+    One connected stream. Updates are merged per stock until the client reads
+    them, so a slow consumer only ever sees the latest price for each symbol.
+    """
+
+    def __init__(self, stock_ids=None, symbols=None):
+        self.stock_ids = stock_ids
+        self.symbols = symbols
+        self.version = 0
+        self.coalesced = 0
+        # Optional callable run after new updates are queued, for consumers
+        # that wait on something other than take() (e.g. an event loop).
+        self.waker = None
+        self._pending = {}
+        self._cond = threading.Condition()
+
+    def wants(self, quote):
+        if self.stock_ids is None and self.symbols is None:
+            return True
+        return (
+            (self.stock_ids is not None and quote["stock_id"] in self.stock_ids)
+            or (self.symbols is not None and quote["symbol"] in self.symbols)
+        )
+
+    def offer(self, version, quotes):
+        with self._cond:
+            for quote in quotes:
+                if self.wants(quote):
+                    if quote["stock_id"] in self._pending:
+                        self.coalesced += 1
+                    self._pending[quote["stock_id"]] = quote
+            self.version = version
+            if self._pending:
+                self._cond.notify()
+                if self.waker is not None:
+                    self.waker()
+
+    def take(self, timeout):
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            pending, self._pending = self._pending, {}
+            return self.version, list(pending.values())
+
+
+class PricePublisher:
+    """
+    Process-wide fan-out of price changes to every open stream.
+
+    The tick job pushes new prices in directly when it runs in this process;
+    otherwise a single poller thread reads the stocks table once per tick, so
+    the database cost is the same no matter how many clients are connected.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._quotes = {}
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._last_update = 0.0
+        self._poller_pid = None
+
+    def _load_quotes(self):
+        try:
+            with db.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT stock_id, symbol, price, previous_price
+                    FROM stocks
+                    WHERE is_tradable = true;
+                """)
+                return {
+                    row[0]: {
+                        "stock_id": row[0],
+                        "symbol": row[1],
+                        "price": row[2],
+                        "previous_price": row[3]
+                    }
+                    for row in cursor.fetchall()
+                }
+
+        except psycopg2.Error as e:
+            print(f"Database error in price stream refresh: {e}")
+            raise
+
+    def _fan_out(self, changed):
+        self.version += 1
+        self._last_update = time.monotonic()
+        for subscriber in list(self._subscribers):
+            subscriber.offer(self.version, changed)
+
+    def refresh(self):
+        """Reloads every quote from the database and publishes what changed."""
+        quotes = self._load_quotes()
+        with self._lock:
+            changed = [
+                quote for stock_id, quote in quotes.items()
+                if self._quotes.get(stock_id) != quote
+            ]
+            self._quotes = quotes
+            self._last_update = time.monotonic()
+            if changed:
+                self._fan_out(changed)
+
+    def push_ticks(self, ticks):
+        """Publishes (stock_id, new_price) pairs written by the tick job."""
+        with self._lock:
+            if not self._subscribers:
+                return
+            changed = []
+            for stock_id, price in ticks:
+                quote = self._quotes.get(stock_id)
+                if quote is None or quote["price"] == price:
+                    continue
+                quote = dict(quote, previous_price=quote["price"], price=price)
+                self._quotes[stock_id] = quote
+                changed.append(quote)
+            if changed:
+                self._fan_out(changed)
+
+    def subscribe(self, stock_ids=None, symbols=None):
+        """
+        Registers a stream and returns it with the current quotes it is
+        interested in. Quotes stop updating while nobody is subscribed, so
+        they are reloaded first if they are older than a tick.
+        """
+        if not self._quotes or time.monotonic() - self._last_update >= TICK_SECONDS:
+            self.refresh()
+        self._ensure_poller()
+
+        subscription = Subscription(stock_ids, symbols)
+        with self._lock:
+            self._subscribers.add(subscription)
+            subscription.version = self.version
+            snapshot = [quote for quote in self._quotes.values() if subscription.wants(quote)]
+        return subscription, snapshot
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _ensure_poller(self):
+        if self._poller_pid == os.getpid():
+            return
+        with self._lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()
+        threading.Thread(target=self._poll, name="price-stream-poller", daemon=True).start()
+
+    def _poll(self):
+        while True:
+            time.sleep(TICK_SECONDS)
+            if not self._subscribers:
+                continue
+            if time.monotonic() - self._last_update < TICK_SECONDS:
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Price stream poller error: {e}")
+
+
+publisher = PricePublisher()
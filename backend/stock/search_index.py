@@ -0,0 +1,253 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+import psycopg2
+from .. import db
+
+# "memory" serves searches from the in-process index, "postgres" sends them to
+# the pg_trgm-backed queries in stock_repo.
+SEARCH_BACKEND = os.getenv("STOCK_SEARCH_BACKEND", "memory")
+# Edits made by another worker are picked up after at most this long.
+SEARCH_INDEX_TTL_SECONDS = float(os.getenv("STOCK_SEARCH_INDEX_TTL_SECONDS", "300"))
+FUZZY_THRESHOLD = 0.3
+
+
+def _trigrams(word):
+    # Same padding as pg_trgm so similarity scores line up with the fallback.
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _substring_grams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class SearchIndex:
+    """
+    In-memory index over stock symbols and company names.
+
+    Results are ranked exact > prefix > substring > fuzzy (trigram
+    similarity), with symbol matches ahead of company name matches inside a
+    tier and symbols in alphabetical order.
+    """
+
+    def __init__(self, rows):
+        # Row positions double as the tie-breaker: rows are sorted by symbol.
+        self.rows = sorted(rows, key=lambda row: row[1])
+        self.built_at = time.monotonic()
+
+        self._symbols = [row[1].lower() for row in self.rows]
+        self._names = [(row[2] or "").lower() for row in self.rows]
+
+        self._exact = defaultdict(list)
+        self._name_exact = defaultdict(list)
+        name_words = []
+        # Substring postings keyed by 2- and 3-character grams.
+        self._symbol_grams = defaultdict(list)
+        self._name_grams = defaultdict(list)
+        # Fuzzy matching compares the query against each distinct word (a
+        # symbol or a word of a company name) and then expands to its rows.
+        self._fuzzy_symbol_grams = defaultdict(list)
+        self._fuzzy_name_grams = defaultdict(list)
+        self._fuzzy_vocab = {}
+        self._fuzzy_sizes = []
+        self._fuzzy_symbol_rows = []
+        self._fuzzy_name_rows = []
+
+        for i, (symbol, name) in enumerate(zip(self._symbols, self._names)):
+            self._exact[symbol].append(i)
+            self._name_exact[name].append(i)
+            words = set(name.split())
+            name_words.extend((word, i) for word in words | {name})
+
+            for size in (2, 3):
+                for gram in _substring_grams(symbol, size):
+                    self._symbol_grams[gram].append(i)
+                for gram in _substring_grams(name, size):
+                    self._name_grams[gram].append(i)
+
+            self._fuzzy_symbol_rows[self._word_id(symbol, self._fuzzy_symbol_grams)].append(i)
+            for word in words:
+                self._fuzzy_name_rows[self._word_id(word, self._fuzzy_name_grams)].append(i)
+
+        self._name_words = sorted(name_words)
+
+    def _word_id(self, word, grams_index):
+        word_id = self._fuzzy_vocab.get(word)
+        if word_id is None:
+            word_id = self._fuzzy_vocab[word] = len(self._fuzzy_sizes)
+            self._fuzzy_sizes.append(len(_trigrams(word)))
+            self._fuzzy_symbol_rows.append([])
+            self._fuzzy_name_rows.append([])
+        # A word can be both a symbol and part of a name; it is posted under
+        # each index it appears in, at most once.
+        rows = self._fuzzy_symbol_rows if grams_index is self._fuzzy_symbol_grams else self._fuzzy_name_rows
+        if not rows[word_id]:
+            for gram in _trigrams(word):
+                grams_index[gram].append(word_id)
+        return word_id
+
+    def _substring_candidates(self, grams_index, query):
+        if len(query) < 2:
+            return range(len(self.rows))
+        grams = _substring_grams(query, min(len(query), 3))
+        postings = sorted((grams_index.get(gram, ()) for gram in grams), key=len)
+        if not postings[0]:
+            return ()
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return ()
+        return sorted(candidates)
+
+    def _fuzzy(self, query, include_names):
+        # Very short queries match almost everything by trigram similarity.
+        if len(query) < 3:
+            return
+
+        query_grams = _trigrams(query)
+        grams_indexes = [self._fuzzy_symbol_grams]
+        if include_names:
+            grams_indexes.append(self._fuzzy_name_grams)
+
+        query_size = len(query_grams)
+        sizes = self._fuzzy_sizes
+        best = {}
+        for grams_index in grams_indexes:
+            shared = defaultdict(int)
+            for gram in query_grams:
+                for word_id in grams_index.get(gram, ()):
+                    shared[word_id] += 1
+            for word_id, count in shared.items():
+                score = count / (query_size + sizes[word_id] - count)
+                if score >= FUZZY_THRESHOLD and score > best.get(word_id, 0):
+                    best[word_id] = score
+        scored = sorted((-score, word_id) for word_id, score in best.items())
+
+        for _, word_id in scored:
+            yield from self._fuzzy_symbol_rows[word_id]
+            if include_names:
+                yield from self._fuzzy_name_rows[word_id]
+
+    def search(self, query, limit, include_names=True):
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        results = []
+        seen = set()
+
+        def take(indices):
+            for i in indices:
+                if i not in seen:
+                    seen.add(i)
+                    results.append(self.rows[i])
+                    if len(results) == limit:
+                        return True
+            return False
+
+        def symbol_prefix():
+            start = bisect_left(self._symbols, query)
+            for i in range(start, len(self._symbols)):
+                if not self._symbols[i].startswith(query):
+                    break
+                yield i
+
+        def name_prefix():
+            start = bisect_left(self._name_words, (query, -1))
+            for position in range(start, len(self._name_words)):
+                word, i = self._name_words[position]
+                if not word.startswith(query):
+                    break
+                yield i
+
+        def symbol_substring():
+            for i in self._substring_candidates(self._symbol_grams, query):
+                if query in self._symbols[i]:
+                    yield i
+
+        def name_substring():
+            for i in self._substring_candidates(self._name_grams, query):
+                if query in self._names[i]:
+                    yield i
+
+        tiers = [lambda: self._exact.get(query, ()), symbol_prefix, symbol_substring]
+        if include_names:
+            tiers = [
+                lambda: self._exact.get(query, ()),
+                lambda: self._name_exact.get(query, ()),
+                symbol_prefix,
+                name_prefix,
+                symbol_substring,
+                name_substring,
+            ]
+        tiers.append(lambda: self._fuzzy(query, include_names))
+
+        for tier in tiers:
+            if take(tier()):
+                break
+        return results
+
+
+_index = None
+_build_lock = threading.Lock()
+
+
+def _load():
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT stock_id, symbol, company_name FROM stocks;")
+            return SearchIndex(cursor.fetchall())
+
+    except psycopg2.Error as e:
+        print(f"Database error in search index build: {e}")
+        raise
+
+
+def enabled():
+    return SEARCH_BACKEND == "memory"
+
+
+def _rebuild():
+    global _index
+    index = _load()
+    _index = index
+    return index
+
+
+def current():
+    """
+    Returns the search index, building it on first use. Once built, a stale
+    index keeps answering while a single request rebuilds it.
+    """
+    index = _index
+    if index is not None and time.monotonic() - index.built_at < SEARCH_INDEX_TTL_SECONDS:
+        return index
+
+    if index is None:
+        with _build_lock:
+            if _index is None:
+                return _rebuild()
+            return _index
+
+    if _build_lock.acquire(blocking=False):
+        try:
+            if _index is index:
+                return _rebuild()
+            return _index
+        except Exception as e:
+            print(f"Serving stale search index: {e}")
+            return index
+        finally:
+            _build_lock.release()
+    return index
+
+
+def invalidate():
+    """Marks the index stale so the next search rebuilds it."""
+    index = _index
+    if index is not None:
+        index.built_at = float("-inf")
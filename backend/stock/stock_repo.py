@@ -1,656 +1,723 @@
 import psycopg2
 from psycopg2 import errors
+from psycopg2.extras import execute_values
 from decimal import Decimal
-import random
+from datetime import datetime, timezone
 from .. import db
+from .price_engine import generate_ticks, apply_ticks
+from .price_history import record_ticks, queue_trade_volumes, roll_up_trade_volumes, forget_tick_partitions
+from .price_stream import publisher
+from . import market_snapshot, search_index, order_book
+from .logos import store_logo
+from ..market_hours.market_hours import market_closed_reason
+from ..user import cash_ledger
+from .. import conditional, invalidation
+from ..single_flight import single_flight
 
-def get_stocks():
-    conn = None
-    cursor = None
-    try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
-        
-        query = "SELECT * FROM stocks WHERE is_tradable = true;"
-        cursor.execute(query)
-        
-        stocks = cursor.fetchall()
-        return stocks  
-    
-    except psycopg2.Error as e:
-        print(f"Database error: {e}")
-        raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
-def get_top_losers():
-    conn = None
-    cursor = None
-    try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
-        
-        query = """
-            SELECT 
-                stock_id,
-                symbol,
-                company_name,
-                price,
-                previous_price,
-                ((previous_price - price) / previous_price) * 100 AS percentage_loss
-            FROM stocks
-            WHERE 
-                previous_price IS NOT NULL 
-                AND previous_price > 0 
-            ORDER BY percentage_loss DESC
-            LIMIT 3;
-        """
-        cursor.execute(query)
-        
-        losers = cursor.fetchall()
-        return losers  
-    
-    except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
-        print(f"Database error in get_top_losers: {e}")
-        raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
-def get_top_gainers():
-    conn = None
-    cursor = None
-    try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
-        
-        query = """
-            SELECT 
-                stock_id,
-                symbol,
-                company_name,
-                price,
-                previous_price,
-                ((price - previous_price) / previous_price) * 100 AS percentage_change
-            FROM stocks
-            WHERE 
-                previous_price IS NOT NULL 
-                AND previous_price > 0 
-            ORDER BY percentage_change DESC
-            LIMIT 3;
-        """
-        cursor.execute(query)
-        
-        gainers = cursor.fetchall()
-        return gainers  
-    
-    except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
-        print(f"Database error in get_top_gainers: {e}")
-        raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
-def get_stock_by_id(stock_id):
-    conn = None
-    cursor = None
+def create_stock(stock_data):
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        query = "SELECT * FROM stocks WHERE stock_id = %s;"
-        cursor.execute(query, (stock_id,))
+            insert_query = """
+                INSERT INTO stocks (company_name, symbol, price, description, previous_price, logo_hash)
+                VALUES (%s, %s, %s, %s, %s, %s) RETURNING stock_id;
+            """
         
-        stock_record = cursor.fetchone()
-        return stock_record  
-    
-    except psycopg2.Error as e:
-        print(f"Database error: {e}")
-        raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
-def create_stock(stock_data):
-    conn = None
-    cursor = None
-    try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
-        
-        insert_query = """
-            INSERT INTO stocks (company_name, symbol, price, description, previous_price, image_data)
-            VALUES (%s, %s, %s, %s, %s, %s) RETURNING stock_id;
-        """
-        
-        image_data = stock_data.get('image_data', '')
-        
-        cursor.execute(insert_query, (
-            stock_data['company_name'],
-            stock_data['symbol'],
-            stock_data['price'],
-            stock_data['description'],
-            stock_data['price'],
-            image_data
-        ))
-        stock_id = cursor.fetchone()[0]
-        conn.commit()
-        
-        return stock_id 
+            logo = stock_data.get('logo')
+            logo_hash = store_logo(cursor, logo) if logo is not None else None
+        
+            cursor.execute(insert_query, (
+                stock_data['company_name'],
+                stock_data['symbol'],
+                stock_data['price'],
+                stock_data['description'],
+                stock_data['price'],
+                logo_hash
+            ))
+            stock_id = cursor.fetchone()[0]
+            invalidation.notify(cursor, invalidation.STOCKS_CHANGED)
+            conn.commit()
+            market_snapshot.invalidate()
+            search_index.invalidate()
+        
+            return stock_id 
     
     except errors.UniqueViolation:
-        if conn:
-            conn.rollback()
         raise ValueError(f"The stock symbol '{stock_data['symbol']}' already exists.")
         
     except psycopg2.Error as e:
         print(f"Database error in create_stock: {e}")
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
+
 def delete_stock(stock_id):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        delete_transactions_query = "DELETE FROM transaction_history WHERE stock_id = %s;"
-        cursor.execute(delete_transactions_query, (stock_id,))
-        print(f"Deleted {cursor.rowcount} associated transaction records for stock ID {stock_id}.")
+            delete_transactions_query = "DELETE FROM transaction_history WHERE stock_id = %s;"
+            cursor.execute(delete_transactions_query, (stock_id,))
+            print(f"Deleted {cursor.rowcount} associated transaction records for stock ID {stock_id}.")
         
-        delete_stock_query = "DELETE FROM stocks WHERE stock_id = %s;"
-        cursor.execute(delete_stock_query, (stock_id,))
+            delete_stock_query = "DELETE FROM stocks WHERE stock_id = %s;"
+            cursor.execute(delete_stock_query, (stock_id,))
         
-        if cursor.rowcount == 0:
-             raise ValueError(f"Stock ID {stock_id} not found.")
+            if cursor.rowcount == 0:
+                 raise ValueError(f"Stock ID {stock_id} not found.")
              
-        conn.commit()
+            invalidation.notify(cursor, invalidation.STOCKS_CHANGED)
+            conn.commit()
+            market_snapshot.invalidate()
+            search_index.invalidate()
         
     except ValueError:
-        if conn:
-            conn.rollback()
         raise
         
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
         print(f"Database error during deletion: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
+
 def update_stock(stock_id, stock_data):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
+        
+            update_query = """
+                UPDATE stocks
+                SET company_name = %s,
+                    description = %s,
+                    logo_hash = COALESCE(%s, logo_hash)
+                WHERE stock_id = %s;
+            """
         
-        update_query = """
-            UPDATE stocks
-            SET company_name = %s,
-                description = %s
-            WHERE stock_id = %s;
-        """
+            logo = stock_data.get('logo')
+            logo_hash = store_logo(cursor, logo) if logo is not None else None
         
-        cursor.execute(update_query, (
-            stock_data['company_name'],
-            stock_data['description'],
-            stock_id
-        ))
+            cursor.execute(update_query, (
+                stock_data['company_name'],
+                stock_data['description'],
+                logo_hash,
+                stock_id
+            ))
         
-        rows_affected = cursor.rowcount
-        conn.commit()
+            rows_affected = cursor.rowcount
+            invalidation.notify(cursor, invalidation.STOCKS_CHANGED)
+            conn.commit()
+            market_snapshot.invalidate()
+            search_index.invalidate()
         
-        if rows_affected == 0:
-            return False
-        return True
+            if rows_affected == 0:
+                return False
+            return True
         
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
         print(f"Database error in update_stock: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 from decimal import Decimal
 import psycopg2 
 
-def buy_sell_stock(user_id, stock_id, shares, price_per_share, fee_amount, transaction_type):
-    conn = None
-    cursor = None
+MAX_BATCH_ORDERS = 500
 
+def _parse_order(shares, price_per_share, fee_amount, transaction_type, limit_price=None):
     try:
         shares = Decimal(str(shares))
         fee_amount = Decimal(str(fee_amount))
         price_per_share = Decimal(str(price_per_share))
+        if limit_price is not None:
+            limit_price = Decimal(str(limit_price))
     except Exception:
-        raise ValueError("Invalid number format for shares, price, or fee_amount.")
+        raise ValueError("Invalid number format for shares, price, fee_amount, or limit_price.")
+
+    transaction_type = str(transaction_type).upper()
+    if transaction_type not in ('BUY', 'SELL'):
+        raise ValueError("Invalid transaction_type. Must be 'BUY' or 'SELL'.")
 
+    if not price_per_share or price_per_share <= 0:
+        raise ValueError("Invalid stock price provided for transaction.")
+
+    if limit_price is not None and not (limit_price.is_finite() and limit_price > 0):
+        raise ValueError("limit_price must be greater than zero.")
+
+    return shares, price_per_share, fee_amount, transaction_type, limit_price
+
+def _fill_order(balance, current_shares, current_avg_cost, shares, price_per_share, fee_amount, transaction_type):
+    """
+    Applies one parsed order to a cash balance and position.
+    Returns (new_balance, new_total_shares, new_average_cost).
+    """
     amount = shares * price_per_share
 
-    if transaction_type.upper() == 'BUY':
+    if transaction_type == 'BUY':
         net_cash_change = -(amount + fee_amount)
         shares_delta = shares
-    elif transaction_type.upper() == 'SELL':
+    else:
         net_cash_change = amount - fee_amount
         shares_delta = -shares
+
+    new_balance = balance + net_cash_change
+    if transaction_type == 'BUY' and new_balance < 0:
+        raise ValueError(f"Insufficient funds. Current balance: ${balance:.2f}. Required for purchase: ${(amount + fee_amount):.2f}.")
+
+    new_total_shares = current_shares + shares_delta
+    if transaction_type == 'SELL' and new_total_shares < 0:
+        raise ValueError("Insufficient shares to complete this sale.")
+
+    if transaction_type == 'BUY' and new_total_shares > 0:
+        new_average_cost = ((current_shares * current_avg_cost) + (shares * price_per_share)) / new_total_shares
     else:
-        raise ValueError("Invalid transaction_type. Must be 'BUY' or 'SELL'.")
+        new_average_cost = current_avg_cost if new_total_shares > 0 else Decimal('0.00')
 
-    if not price_per_share or price_per_share <= 0:
-        raise ValueError("Invalid stock price provided for transaction.")
+    return new_balance, new_total_shares, new_average_cost
+
+def buy_sell_stock(user_id, stock_id, shares, price_per_share, fee_amount, transaction_type):
+    shares, price_per_share, fee_amount, transaction_type, _ = _parse_order(
+        shares, price_per_share, fee_amount, transaction_type
+    )
 
     try:
-        conn = db.get_db_conn()
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
 
-        cursor.execute("SELECT balance FROM cloudex_users WHERE user_id = %s FOR UPDATE;", (user_id,))
-        current_balance_record = cursor.fetchone()
-        if current_balance_record is None:
-            raise ValueError(f"User ID {user_id} not found.")
+            # The position row is the lock that serializes trades in this
+            # stock for this user; make sure it exists before a buy.
+            if transaction_type == 'BUY':
+                _ensure_positions(cursor, user_id, [stock_id])
+            cursor.execute("SELECT total_shares, average_cost FROM portfolio WHERE user_id = %s AND stock_id = %s FOR UPDATE;", (user_id, stock_id))
+            portfolio_record = cursor.fetchone()
+            if transaction_type == 'BUY' and portfolio_record is None:
+                raise ValueError(f"Stock ID {stock_id} does not exist.")
+            current_shares = portfolio_record[0] if portfolio_record else Decimal('0')
+            current_avg_cost = portfolio_record[1] if portfolio_record else Decimal('0.00')
 
-        current_balance = current_balance_record[0]
-        new_balance = current_balance + net_cash_change
-        
-        if transaction_type.upper() == 'BUY' and new_balance < 0:
-            raise ValueError(f"Insufficient funds. Current balance: ${current_balance:.2f}. Required for purchase: ${(amount + fee_amount):.2f}.")
+            current_balance = cash_ledger.balance(cursor, user_id)
+            if current_balance is None:
+                raise ValueError(f"User ID {user_id} not found.")
+
+            new_balance, new_total_shares, new_average_cost = _fill_order(
+                current_balance, current_shares, current_avg_cost,
+                shares, price_per_share, fee_amount, transaction_type
+            )
+            if new_balance < current_balance:
+                # A debit: check again against the balance under the debit lock.
+                current_balance = cash_ledger.lock_for_debit(cursor, user_id)
+                new_balance, new_total_shares, new_average_cost = _fill_order(
+                    current_balance, current_shares, current_avg_cost,
+                    shares, price_per_share, fee_amount, transaction_type
+                )
 
-        cursor.execute("SELECT total_shares, average_cost FROM portfolio WHERE user_id = %s AND stock_id = %s;", (user_id, stock_id))
-        portfolio_record = cursor.fetchone()
-        current_shares = portfolio_record[0] if portfolio_record else Decimal('0')
-        current_avg_cost = portfolio_record[1] if portfolio_record else Decimal('0.00')
+            cursor.execute("""
+                INSERT INTO portfolio (user_id, stock_id, total_shares, average_cost, previous_total_value)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (user_id, stock_id) DO UPDATE
+                SET total_shares = EXCLUDED.total_shares,
+                    average_cost = EXCLUDED.average_cost
+            """, (user_id, stock_id, new_total_shares, new_average_cost, Decimal('0.00')))
 
-        new_total_shares = current_shares + shares_delta
-        if transaction_type.upper() == 'SELL' and new_total_shares < 0:
-            raise ValueError("Insufficient shares to complete this sale.")
+            cursor.execute("""
+                INSERT INTO transaction_history 
+                    (user_id, stock_id, shares, price_per_share, transaction_type, fee_amount, executed_at)
+                VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                RETURNING transaction_id;
+            """, (user_id, stock_id, shares, price_per_share, transaction_type, fee_amount))
 
-        if transaction_type.upper() == 'BUY' and new_total_shares > 0:
-            new_average_cost = ((current_shares * current_avg_cost) + (shares * price_per_share)) / new_total_shares
-        else:
-            new_average_cost = current_avg_cost if new_total_shares > 0 else Decimal('0.00')
+            transaction_id = cursor.fetchone()[0]
+            queue_trade_volumes(cursor, [(stock_id, shares, price_per_share)])
+            cash_ledger.append(cursor, user_id, [(new_balance - current_balance, transaction_type, transaction_id)])
+            invalidation.notify(cursor, invalidation.USER_CHANGED, user_id)
+            conn.commit()
+            conditional.bump(conditional.user_scope(user_id))
+            return transaction_id
+
+    except ValueError:
+        raise
+    except psycopg2.Error as e:
+        raise
+
+def _ensure_positions(cursor, user_id, stock_ids):
+    """
+    Creates empty portfolio rows so they can be locked before a first buy.
+    Unknown stocks are skipped; an unknown user raises ValueError, since its
+    rows would fail the foreign key.
+    """
+    if cash_ledger.balance(cursor, user_id) is None:
+        raise ValueError(f"User ID {user_id} not found.")
+    cursor.execute("""
+        INSERT INTO portfolio (user_id, stock_id, total_shares, average_cost, previous_total_value)
+        SELECT %s, stock_id, 0, 0, 0
+        FROM stocks
+        WHERE stock_id = ANY(%s)
+        ORDER BY stock_id
+        ON CONFLICT (user_id, stock_id) DO NOTHING;
+    """, (user_id, list(stock_ids)))
+
+def _execute_orders(cursor, user_id, orders, all_or_nothing):
+    """
+    Fills a list of order dicts for one user on the caller's cursor and
+    transaction. See execute_order_batch for the semantics.
+    """
+    try:
+        stock_ids = sorted({int(order['stock_id']) for order in orders})
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Every order needs a numeric stock_id.")
+
+    # Position rows are locked in stock_id order and before the cash ledger
+    # locks, the same order buy_sell_stock uses.
+    buy_ids = sorted({int(order['stock_id']) for order in orders if str(order.get('transaction_type')).upper() == 'BUY'})
+    if buy_ids:
+        _ensure_positions(cursor, user_id, buy_ids)
+
+    cursor.execute("SELECT stock_id, price FROM stocks WHERE stock_id = ANY(%s);", (stock_ids,))
+    prices = dict(cursor.fetchall())
+
+    cursor.execute("""
+        SELECT stock_id, total_shares, average_cost
+        FROM portfolio
+        WHERE user_id = %s AND stock_id = ANY(%s)
+        ORDER BY stock_id
+        FOR UPDATE;
+    """, (user_id, stock_ids))
+    positions = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    # Orders are checked against an unlocked read of the balance; a net debit
+    # is re-checked under the debit lock before anything is written.
+    balance = cash_ledger.balance(cursor, user_id)
+    if balance is None:
+        raise ValueError(f"User ID {user_id} not found.")
+
+    results = []
+    fills = []
+    for index, order in enumerate(orders):
+        stock_id = int(order['stock_id'])
+        try:
+            if stock_id not in prices:
+                raise ValueError(f"Stock ID {stock_id} does not exist.")
 
-        cursor.execute("UPDATE cloudex_users SET balance = %s WHERE user_id = %s;", (new_balance, user_id))
+            shares, price_per_share, fee_amount, transaction_type, limit_price = _parse_order(
+                order.get('shares'), prices[stock_id], order.get('fee_amount', 0), order.get('transaction_type'),
+                order.get('limit_price')
+            )
+            if shares <= 0:
+                raise ValueError("shares must be greater than zero.")
 
-        cursor.execute("""
+            if limit_price is not None and (
+                (transaction_type == 'BUY' and price_per_share > limit_price)
+                or (transaction_type == 'SELL' and price_per_share < limit_price)
+            ):
+                raise ValueError("Market price is outside the order's limit price.")
+
+            current_shares, current_avg_cost = positions.get(stock_id, (Decimal('0'), Decimal('0.00')))
+            new_balance, new_total_shares, new_average_cost = _fill_order(
+                balance, current_shares, current_avg_cost,
+                shares, price_per_share, fee_amount, transaction_type
+            )
+            cash_change = cash_ledger.to_cents(new_balance - balance)
+            balance += cash_change
+            positions[stock_id] = (new_total_shares, new_average_cost)
+
+        except ValueError as e:
+            if all_or_nothing:
+                raise ValueError(f"Order {index} rejected: {e}")
+            results.append({"index": index, "stock_id": stock_id, "status": "rejected", "error": str(e)})
+            continue
+
+        fills.append((stock_id, shares, price_per_share, transaction_type, fee_amount, cash_change))
+        results.append({
+            "index": index,
+            "stock_id": stock_id,
+            "status": "filled",
+            "shares": shares,
+            "price_per_share": price_per_share,
+            "transaction_type": transaction_type
+        })
+
+    if fills:
+        net_cash_change = sum(fill[5] for fill in fills)
+        if net_cash_change < 0:
+            available = cash_ledger.lock_for_debit(cursor, user_id)
+            if available + net_cash_change < 0:
+                raise ValueError(f"Insufficient funds. Current balance: ${available:.2f}. Required: ${-net_cash_change:.2f}.")
+            balance = available + net_cash_change
+
+        touched = sorted({fill[0] for fill in fills})
+        execute_values(cursor, """
             INSERT INTO portfolio (user_id, stock_id, total_shares, average_cost, previous_total_value)
-            VALUES (%s, %s, %s, %s, %s)
+            VALUES %s
             ON CONFLICT (user_id, stock_id) DO UPDATE
             SET total_shares = EXCLUDED.total_shares,
                 average_cost = EXCLUDED.average_cost
-        """, (user_id, stock_id, new_total_shares, new_average_cost, Decimal('0.00')))
+        """, [
+            (user_id, stock_id, positions[stock_id][0], positions[stock_id][1], Decimal('0.00'))
+            for stock_id in touched
+        ], page_size=len(touched))
 
-        cursor.execute("""
+        transaction_ids = execute_values(cursor, """
             INSERT INTO transaction_history 
                 (user_id, stock_id, shares, price_per_share, transaction_type, fee_amount, executed_at)
-            VALUES (%s, %s, %s, %s, %s, %s, NOW())
+            VALUES %s
             RETURNING transaction_id;
-        """, (user_id, stock_id, shares, price_per_share, transaction_type.upper(), fee_amount))
+        """, [
+            (user_id, stock_id, shares, price_per_share, transaction_type, fee_amount)
+            for stock_id, shares, price_per_share, transaction_type, fee_amount, _ in fills
+        ], template="(%s, %s, %s, %s, %s, %s, NOW())", page_size=len(fills), fetch=True)
+
+        filled = (result for result in results if result["status"] == "filled")
+        for result, (transaction_id,) in zip(filled, transaction_ids):
+            result["transaction_id"] = transaction_id
+
+        queue_trade_volumes(cursor, [
+            (stock_id, shares, price_per_share)
+            for stock_id, shares, price_per_share, _, _, _ in fills
+        ])
+
+        cash_ledger.append(cursor, user_id, [
+            (fill[5], fill[3], transaction_id)
+            for fill, (transaction_id,) in zip(fills, transaction_ids)
+        ])
+        if net_cash_change >= 0:
+            balance = cash_ledger.balance(cursor, user_id)
+
+    return results, balance
+
+def execute_order_batch(user_id, orders, all_or_nothing=True):
+    """
+    Executes many market orders for one user in a single transaction.
 
-        transaction_id = cursor.fetchone()[0]
-        conn.commit()
-        return transaction_id
+    Every order is priced from the same read of the stocks table and applied
+    in request order against the user's running balance and positions. With
+    all_or_nothing, the first rejected order aborts the whole batch with a
+    ValueError; otherwise rejected orders are reported and the rest fill.
+    Returns (results, new_balance) where results has one entry per order.
+    """
+    if not orders:
+        raise ValueError("No orders provided.")
+    if len(orders) > MAX_BATCH_ORDERS:
+        raise ValueError(f"A batch may contain at most {MAX_BATCH_ORDERS} orders.")
+
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+
+            results, balance = _execute_orders(cursor, user_id, orders, all_or_nothing)
+            invalidation.notify(cursor, invalidation.USER_CHANGED, user_id)
+            conn.commit()
+            conditional.bump(conditional.user_scope(user_id))
+            return results, balance
 
     except ValueError:
-        if conn:
-            conn.rollback()
         raise
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
+        print(f"Database error in execute_order_batch: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
             
 def search_stocks(keyword):
     if not keyword or not isinstance(keyword, str) or len(keyword.strip()) == 0:
         return []
 
-    conn = None
-    cursor = None
+    if search_index.enabled():
+        return [(row[0], row[1]) for row in search_index.current().search(keyword, 3, include_names=False)]
+
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
-        
-        search_query = """
-            SELECT stock_id, symbol
-            FROM stocks
-            WHERE symbol ILIKE %s
-            ORDER BY
-                CASE
-                    WHEN symbol ILIKE %s THEN 1
-                    WHEN symbol ILIKE %s THEN 2
-                    ELSE 3
-                END,
-                symbol ASC
-            LIMIT 3;
-        """
-        
-        exact_pattern = keyword 
-        starts_with_pattern = f"{keyword}%"
-        like_pattern = f"%{keyword}%"
-
-        params = (
-            like_pattern,
-            exact_pattern,
-            starts_with_pattern
-        )
-
-        cursor.execute(search_query, params)
-        
-        results = cursor.fetchall()
-        return results 
+        with db.connection() as conn, conn.cursor() as cursor:
+        
+            search_query = """
+                SELECT stock_id, symbol
+                FROM stocks
+                WHERE symbol ILIKE %(like)s OR symbol %% %(keyword)s
+                ORDER BY
+                    CASE
+                        WHEN symbol ILIKE %(keyword)s THEN 1
+                        WHEN symbol ILIKE %(prefix)s THEN 2
+                        WHEN symbol ILIKE %(like)s THEN 3
+                        ELSE 4
+                    END,
+                    similarity(symbol, %(keyword)s) DESC,
+                    symbol ASC
+                LIMIT 3;
+            """
+
+            cursor.execute(search_query, {
+                "keyword": keyword,
+                "prefix": f"{keyword}%",
+                "like": f"%{keyword}%"
+            })
+        
+            results = cursor.fetchall()
+            return results 
     
     except psycopg2.Error as e:
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
+
 def get_shares(user_id, stock_id):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        query = "SELECT total_shares FROM portfolio WHERE user_id = %s AND stock_id = %s;"
-        cursor.execute(query, (user_id, stock_id))
+            query = "SELECT total_shares FROM portfolio WHERE user_id = %s AND stock_id = %s;"
+            cursor.execute(query, (user_id, stock_id))
         
-        result = cursor.fetchone()
+            result = cursor.fetchone()
         
-        if result is None:
-            return Decimal('0')
+            if result is None:
+                return Decimal('0')
             
-        return result[0]  
+            return result[0]  
     
     except psycopg2.Error as e:
         print(f"Database error in get_amount_of_stocks_owned: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 def search_stocks_bar(keyword):
-    conn = None
-    cursor = None
-    try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
-        
-        search_query = """
-            SELECT stock_id, symbol, company_name
-            FROM stocks
-            WHERE 
-                symbol ILIKE %s OR
-                company_name ILIKE %s OR
-                symbol ILIKE %s OR
-                company_name ILIKE %s
-            ORDER BY symbol ASC
-            LIMIT 5;
-        """
-        
-        start_pattern = f"{keyword}%"
-        like_pattern = f"%{keyword}%"
-
-        params = (
-            start_pattern,
-            start_pattern,
-            like_pattern,
-            like_pattern
-        )
-
-        cursor.execute(search_query, params)
-        
-        results = cursor.fetchall()
-        
+    if search_index.enabled():
         return [
             {
                 "stock_id": row[0],
                 "symbol": row[1],
                 "company_name": row[2]
-            } for row in results
+            } for row in search_index.current().search(keyword, 5)
         ]
+
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+        
+            search_query = """
+                SELECT stock_id, symbol, company_name
+                FROM stocks
+                WHERE 
+                    symbol ILIKE %(like)s OR
+                    company_name ILIKE %(like)s OR
+                    symbol %% %(keyword)s OR
+                    company_name %% %(keyword)s
+                ORDER BY
+                    CASE
+                        WHEN symbol ILIKE %(keyword)s THEN 1
+                        WHEN company_name ILIKE %(keyword)s THEN 2
+                        WHEN symbol ILIKE %(prefix)s THEN 3
+                        WHEN company_name ILIKE %(prefix)s THEN 4
+                        WHEN symbol ILIKE %(like)s THEN 5
+                        WHEN company_name ILIKE %(like)s THEN 6
+                        ELSE 7
+                    END,
+                    GREATEST(similarity(symbol, %(keyword)s), similarity(company_name, %(keyword)s)) DESC,
+                    symbol ASC
+                LIMIT 5;
+            """
+
+            cursor.execute(search_query, {
+                "keyword": keyword,
+                "prefix": f"{keyword}%",
+                "like": f"%{keyword}%"
+            })
+        
+            results = cursor.fetchall()
+        
+            return [
+                {
+                    "stock_id": row[0],
+                    "symbol": row[1],
+                    "company_name": row[2]
+                } for row in results
+            ]
     
     except psycopg2.Error as e:
         print(f"Database error in search_stocks_bar: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
+
+@single_flight
 def get_stock_price(stock_id):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        query = "SELECT price FROM stocks WHERE stock_id = %s;"
-        cursor.execute(query, (stock_id,))
+            query = "SELECT price FROM stocks WHERE stock_id = %s;"
+            cursor.execute(query, (stock_id,))
         
-        result = cursor.fetchone()
+            result = cursor.fetchone()
         
-        if result is None:
-            raise ValueError(f"Stock ID {stock_id} does not exist.")
+            if result is None:
+                raise ValueError(f"Stock ID {stock_id} does not exist.")
             
-        return result[0] 
+            return result[0] 
     
     except psycopg2.Error as e:
         print(f"Database error in get_stock_price: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
-def get_stock_id_by_symbol(symbol):
-        conn = None
-        cursor = None
-        try:
-            conn = db.get_db_conn() 
-            cursor = conn.cursor()
-            
-            query = "SELECT stock_id FROM stocks WHERE symbol = %s;"
-            cursor.execute(query, (symbol,))
-            
-            result = cursor.fetchone()
-            if result is None:
-                return None
-            return result[0]  
-        
-        except psycopg2.Error as e:
-            print(f"Database error in get_stock_id_by_symbol: {e}")
-            raise
-            
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
-                
+
 def update_all_stock_prices():
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        cursor.execute("SELECT stock_id, price FROM stocks;")
-        stocks = cursor.fetchall()
+            cursor.execute("SELECT stock_id, price, volatility, drift FROM stocks;")
+            stocks = cursor.fetchall()
         
-        if not stocks:
-            return 0
+            if not stocks:
+                return 0
             
-        updated_count = 0
-        
-        for stock_id, old_price in stocks:
-            change_percent = Decimal(str(random.uniform(-0.01, 0.01))) 
-            change_amount = old_price * change_percent
-            new_price = old_price + change_amount
-            if new_price < Decimal('0.01'):
-                new_price = Decimal('0.01')
-            update_query = """
-                UPDATE stocks
-                SET previous_price = price,
-                    price = %s
-                WHERE stock_id = %s;
-            """
-            cursor.execute(update_query, (new_price, stock_id))
-            updated_count += cursor.rowcount
+            ticks = generate_ticks(stocks)
+            updated_count = apply_ticks(cursor, ticks)
+            record_ticks(cursor, ticks, datetime.now(timezone.utc))
+            roll_up_trade_volumes(cursor)
+            cursor.execute("SELECT nextval('market_tick_seq');")
+            invalidation.notify(cursor, invalidation.PRICE_TICK, cursor.fetchone()[0])
             
-        conn.commit()
-        return updated_count
+            conn.commit()
+            market_snapshot.invalidate()
+            publisher.push_ticks(ticks)
 
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
+        forget_tick_partitions()
         print(f"Database error during price update simulation: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
+
+    try:
+        fill_limit_orders(ticks)
+    except Exception as e:
+        print(f"Limit order matching error: {e}")
+
+    return updated_count
+
+def fill_limit_orders(ticks):
+    """
+    Matches resting limit orders against a batch of (stock_id, price) ticks
+    and fills the triggered ones at the new market price, all in one
+    transaction. Orders cancelled since they were loaded fail the claim and
+    are dropped; orders that cannot be filled (e.g. insufficient funds) are
+    marked REJECTED. Each user's fills run under a savepoint, so a database
+    error rejects only that user's orders. Returns the number of orders filled.
+    """
+    books = order_book.books
+    order_book.sync()
+    if not books.open_count() or market_closed_reason():
+        return 0
+
+    triggered = books.match(ticks)
+    if not triggered:
+        return 0
+
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT order_id
+                FROM limit_orders
+                WHERE order_id = ANY(%s) AND status = 'OPEN'
+                FOR UPDATE;
+            """, ([order.order_id for order in triggered],))
+            claimed = {row[0] for row in cursor.fetchall()}
+
+            by_user = {}
+            for order in triggered:
+                if order.order_id in claimed:
+                    by_user.setdefault(order.user_id, []).append(order)
+
+            outcomes = []
+            # Users are locked in id order so concurrent batches cannot deadlock.
+            for user_id in sorted(by_user):
+                orders = by_user[user_id]
+                cursor.execute("SAVEPOINT fill_user;")
+                try:
+                    results, _ = _execute_orders(cursor, user_id, [
+                        {
+                            "stock_id": order.stock_id,
+                            "shares": order.shares,
+                            "transaction_type": order.side,
+                            "fee_amount": order.fee_amount,
+                            "limit_price": order.limit_price
+                        }
+                        for order in orders
+                    ], all_or_nothing=False)
+                except ValueError as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT fill_user;")
+                    results = [{"status": "rejected", "error": str(e)} for _ in orders]
+                except psycopg2.Error as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT fill_user;")
+                    print(f"Database error filling limit orders for user {user_id}: {e}")
+                    results = [{"status": "rejected", "error": "Order could not be filled."} for _ in orders]
+                cursor.execute("RELEASE SAVEPOINT fill_user;")
+
+                for order, result in zip(orders, results):
+                    if result["status"] == "filled":
+                        outcomes.append((order.order_id, 'FILLED', result["transaction_id"], None))
+                    else:
+                        outcomes.append((order.order_id, 'REJECTED', None, result["error"]))
+
+            if outcomes:
+                execute_values(cursor, """
+                    UPDATE limit_orders AS o
+                    SET status = v.status,
+                        transaction_id = v.transaction_id,
+                        reject_reason = v.reject_reason,
+                        updated_at = NOW()
+                    FROM (VALUES %s) AS v(order_id, status, transaction_id, reject_reason)
+                    WHERE o.order_id = v.order_id;
+                """, outcomes, template="(%s, %s, %s::integer, %s::text)", page_size=len(outcomes))
+
+            for user_id in by_user:
+                invalidation.notify(cursor, invalidation.USER_CHANGED, user_id)
+            conn.commit()
+            for user_id in by_user:
+                conditional.bump(conditional.user_scope(user_id))
+            return sum(1 for outcome in outcomes if outcome[1] == 'FILLED')
+
+    except Exception as e:
+        # Nothing was written, so the orders are still open; put them back
+        # for the next tick.
+        print(f"Error in fill_limit_orders; {len(triggered)} orders returned to the book: {e}")
+        books.add_many(triggered)
+        raise
+
 def addToWatchlist(user_id, stock_id):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        insert_query = """
-            INSERT INTO watchlist (user_id, stock_id)
-            VALUES (%s, %s);
-        """
+            insert_query = """
+                INSERT INTO watchlist (user_id, stock_id)
+                VALUES (%s, %s);
+            """
         
-        cursor.execute(insert_query, (user_id, stock_id))
-        conn.commit()
+            cursor.execute(insert_query, (user_id, stock_id))
+            invalidation.notify(cursor, invalidation.USER_CHANGED, user_id)
+            conn.commit()
+            conditional.bump(conditional.user_scope(user_id))
         
     except errors.UniqueViolation:
-        if conn:
-            conn.rollback()
         raise ValueError(f"Stock ID '{stock_id}' is already in the watchlist for User ID '{user_id}'.")
         
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
         print(f"Database error in addToWatchlist: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
+
 def removeFromWatchlist(user_id, stock_id):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        delete_query = """
-            DELETE FROM watchlist
-            WHERE user_id = %s AND stock_id = %s;
-        """
+            delete_query = """
+                DELETE FROM watchlist
+                WHERE user_id = %s AND stock_id = %s;
+            """
         
-        cursor.execute(delete_query, (user_id, stock_id))
+            cursor.execute(delete_query, (user_id, stock_id))
         
-        if cursor.rowcount == 0:
-            raise ValueError(f"Stock ID '{stock_id}' not found in watchlist for User ID '{user_id}'.")
+            if cursor.rowcount == 0:
+                raise ValueError(f"Stock ID '{stock_id}' not found in watchlist for User ID '{user_id}'.")
         
-        conn.commit()
+            invalidation.notify(cursor, invalidation.USER_CHANGED, user_id)
+            conn.commit()
+            conditional.bump(conditional.user_scope(user_id))
         
     except ValueError:
-        if conn:
-            conn.rollback()
         raise
         
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
         print(f"Database error in removeFromWatchlist: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
+
 def get_user_watchlist(user_id):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        query = """
+            query = """
 SELECT s.stock_id
                 FROM watchlist w
                 JOIN stocks s ON w.stock_id = s.stock_id
                 WHERE w.user_id = %s;
                 """
-        cursor.execute(query, (user_id,))
+            cursor.execute(query, (user_id,))
         
-        watchlist = [row[0] for row in cursor.fetchall()]
-        return watchlist  
+            watchlist = [row[0] for row in cursor.fetchall()]
+            return watchlist  
     
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
\ No newline at end of file
@@ -1,9 +1,19 @@
-from flask import Blueprint, request, jsonify
+import json
+from datetime import datetime, timezone
+from flask import Blueprint, Response, request, jsonify
+from .price_history import get_candles
+from .price_stream import publisher, HEARTBEAT_SECONDS
+from . import market_snapshot
+from .logos import HASH_PATTERN, get_logo, prepare_logo
+from .order_book import place_limit_order, cancel_limit_order, get_user_limit_orders
+from ..market_hours.market_hours import market_closed_reason
+from ..auth.session_tokens import session_required
+from ..idempotency import idempotent
+from ..conditional import not_modified
 from .stock_repo import (
-    get_stock_id_by_symbol, get_stocks, get_stock_by_id, create_stock,
-    delete_stock, update_stock, buy_sell_stock, get_stock_price,
-    get_top_gainers, get_top_losers, addToWatchlist, removeFromWatchlist,
-    get_user_watchlist, get_shares, search_stocks, search_stocks_bar
+    create_stock, delete_stock, update_stock, buy_sell_stock, get_stock_price,
+    addToWatchlist, removeFromWatchlist, get_user_watchlist, get_shares,
+    search_stocks, search_stocks_bar, execute_order_batch
 )
 
 stock_bp = Blueprint('stocks', __name__, url_prefix='/stocks')
@@ -24,20 +34,83 @@ def search_stocks_bar_route():
         return jsonify({"error": "An unexpected error occurred."}), 500
 
 
+def _snapshot_response(snapshot, payload, status=200, etag=None):
+    etag = etag or snapshot.etag
+    headers = {"ETag": etag, "X-Market-Tick": str(snapshot.tick_id), "Cache-Control": "no-cache"}
+    if status == 200:
+        unchanged = not_modified(etag, headers)
+        if unchanged is not None:
+            return unchanged
+
+    response = jsonify(payload)
+    response.status_code = status
+    response.headers.update(headers)
+    return response
+
+
 @stock_bp.route('/all', methods=['GET'])
 def all_stocks():
     try:
-        stocks = get_stocks()
-        return jsonify({
+        fields = market_snapshot.parse_fields(request.args.get('fields'))
+        fmt = market_snapshot.parse_format(request.args.get('format'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        snapshot = market_snapshot.current()
+        columns, stocks, etag = snapshot.listing(fields, fmt)
+        return _snapshot_response(snapshot, {
             "status": "success",
+            "format": fmt,
+            "columns": columns,
             "stocks": stocks
-        }), 200
+        }, etag=etag)
 
     except Exception as e:
         print(f"All Stocks Error: {e}")
         return jsonify({"error": "An unexpected error occurred."}), 500
 
 
+def _sse_event(event, version, quotes):
+    payload = json.dumps({"tick": version, "prices": quotes}, default=str)
+    return f"id: {version}\nevent: {event}\ndata: {payload}\n\n"
+
+
+@stock_bp.route('/stream', methods=['GET'])
+def price_stream():
+    symbols = request.args.get('symbols')
+    stock_ids = request.args.get('stock_ids')
+
+    try:
+        symbols = {s.strip().upper() for s in symbols.split(',') if s.strip()} if symbols else None
+        stock_ids = {int(s) for s in stock_ids.split(',') if s.strip()} if stock_ids else None
+    except ValueError:
+        return jsonify({"error": "stock_ids must be a comma-separated list of integers."}), 400
+
+    try:
+        subscription, snapshot = publisher.subscribe(stock_ids, symbols)
+    except Exception as e:
+        print(f"Price Stream Error: {e}")
+        return jsonify({"error": "An unexpected error occurred."}), 500
+
+    def events():
+        try:
+            yield _sse_event("snapshot", subscription.version, snapshot)
+            while True:
+                version, quotes = subscription.take(HEARTBEAT_SECONDS)
+                if quotes:
+                    yield _sse_event("prices", version, quotes)
+                else:
+                    yield ": keep-alive\n\n"
+        finally:
+            publisher.unsubscribe(subscription)
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
 @stock_bp.route('/stock_by_id', methods=['GET'])
 def stock_by_id():
     stock_id = request.args.get('stock_id')
@@ -45,22 +118,65 @@ def stock_by_id():
         return jsonify({"error": "Missing stock_id parameter."}), 400
 
     try:
-        stock_record = get_stock_by_id(stock_id)
+        stock_id = int(stock_id)
+    except ValueError:
+        return jsonify({"error": "Invalid stock_id parameter."}), 400
+
+    try:
+        snapshot = market_snapshot.current()
+        stock_record = snapshot.by_id.get(stock_id)
 
         if stock_record is None:
             return jsonify({"error": "Stock not found."}), 404
 
-        return jsonify({
+        return _snapshot_response(snapshot, {
             "status": "success",
             "stock": stock_record
-        }), 200
+        })
 
     except Exception as e:
         print(f"Stock By ID Error: {e}")
         return jsonify({"error": "An unexpected error occurred."}), 500
 
 
+def _parse_timestamp(value):
+    if not value:
+        return None
+    ts = datetime.fromisoformat(value)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+@stock_bp.route('/<int:stock_id>/candles', methods=['GET'])
+def stock_candles(stock_id):
+    interval = request.args.get('interval', '1d')
+
+    try:
+        start = _parse_timestamp(request.args.get('from'))
+        end = _parse_timestamp(request.args.get('to'))
+    except ValueError:
+        return jsonify({"error": "from and to must be ISO 8601 timestamps."}), 400
+
+    try:
+        candles = get_candles(stock_id, interval, start, end)
+        return jsonify({
+            "status": "success",
+            "stock_id": stock_id,
+            "interval": interval,
+            "candles": candles
+        }), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        print(f"Stock Candles Error: {e}")
+        return jsonify({"error": "An unexpected error occurred."}), 500
+
+
 @stock_bp.route('/create_stock', methods=['POST'])
+@session_required(role='admin')
 def create_stock_route():
     data = request.get_json()
 
@@ -69,14 +185,19 @@ def create_stock_route():
         if field not in data:
             return jsonify({"error": f"Missing field: {field}."}), 400
 
-    image_data = data.get('image_data', '')
+    logo = None
+    if data.get('image_data'):
+        try:
+            logo = prepare_logo(data['image_data'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
     stock_data = {
         'company_name': data['company_name'],
         'symbol': data['symbol'],
         'price': data['price'],
         'description': data['description'],
-        'image_data': image_data
+        'logo': logo
     }
 
     try:
@@ -95,6 +216,7 @@ def create_stock_route():
 
 
 @stock_bp.route('/delete_stock', methods=['DELETE'])
+@session_required(role='admin')
 def delete_stock_route():
     data = request.get_json()
     stock_id = data.get('stock_id')
@@ -126,6 +248,7 @@ def delete_stock_route():
 
 
 @stock_bp.route('/edit', methods=['PUT'])
+@session_required(role='admin')
 def edit_stock():
     data = request.get_json()
 
@@ -134,8 +257,15 @@ def edit_stock():
 
     stock_id = data['stock_id']
 
+    logo = None
+    if data.get('image_data'):
+        try:
+            logo = prepare_logo(data['image_data'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
     try:
-        was_updated = update_stock(stock_id, data)
+        was_updated = update_stock(stock_id, dict(data, logo=logo))
         if not was_updated:
             return jsonify({"error": f"Stock with ID {stock_id} not found."}), 404
 
@@ -150,6 +280,8 @@ def edit_stock():
 
 
 @stock_bp.route('/buy_sell', methods=['POST'])
+@session_required()
+@idempotent
 def buy_sell_route():
     data = request.get_json()
 
@@ -164,23 +296,10 @@ def buy_sell_route():
     transaction_type = data['transaction_type']
     fee_amount = data['fee_amount']
 
-    # MARKET HOURS CHECK
-    from ..market_hours.market_hours import get_market_hours
-    from datetime import datetime
-
-    open_time, close_time = get_market_hours()
-    if not open_time or not close_time:
-        return jsonify({"error": "Market hours not configured."}), 500
-
-    now = datetime.now().time()
-    if not (open_time <= now <= close_time):
-        return jsonify({"error": "Market is currently closed."}), 400
-
-        # HOLIDAY CHECK
-    from ..market_hours.market_holidays import is_market_holiday
-
-    if is_market_holiday():
-        return jsonify({"error": "Market is closed today due to a holiday."}), 400
+    closed = market_closed_reason()
+    if closed:
+        message, status = closed
+        return jsonify({"error": message}), status
 
     try:
         price_per_share = get_stock_price(stock_id)
@@ -210,6 +329,161 @@ def buy_sell_route():
         return jsonify({"error": "An unexpected error occurred."}), 500
 
 
+@stock_bp.route('/orders/batch', methods=['POST'])
+@session_required()
+@idempotent
+def order_batch_route():
+    data = request.get_json(silent=True) or {}
+
+    for field in ('user_id', 'orders'):
+        if field not in data:
+            return jsonify({"error": f"Missing field: {field}."}), 400
+
+    orders = data['orders']
+    if not isinstance(orders, list) or not all(isinstance(order, dict) for order in orders):
+        return jsonify({"error": "orders must be a list of objects."}), 400
+
+    mode = data.get('mode', 'all_or_nothing')
+    if mode not in ('all_or_nothing', 'partial'):
+        return jsonify({"error": "mode must be 'all_or_nothing' or 'partial'."}), 400
+
+    for index, order in enumerate(orders):
+        for field in ('stock_id', 'shares', 'transaction_type'):
+            if field not in order:
+                return jsonify({"error": f"Order {index} is missing field: {field}."}), 400
+
+    try:
+        closed = market_closed_reason()
+        if closed:
+            message, status = closed
+            return jsonify({"error": message}), status
+
+        results, balance = execute_order_batch(
+            data['user_id'],
+            orders,
+            all_or_nothing=(mode == 'all_or_nothing')
+        )
+
+        filled = sum(1 for result in results if result["status"] == "filled")
+        return jsonify({
+            "status": "success" if filled == len(results) else "partial",
+            "filled": filled,
+            "rejected": len(results) - filled,
+            "balance": balance,
+            "orders": results
+        }), 201 if filled else 200
+
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+    except Exception as e:
+        print(f"Order Batch Error: {e}")
+        return jsonify({"error": "An unexpected error occurred."}), 500
+
+
+@stock_bp.route('/orders', methods=['POST'])
+@session_required()
+@idempotent
+def place_limit_order_route():
+    data = request.get_json(silent=True) or {}
+
+    required_fields = ['user_id', 'stock_id', 'side', 'shares', 'limit_price']
+    for field in required_fields:
+        if field not in data:
+            return jsonify({"error": f"Missing field: {field}."}), 400
+
+    try:
+        order = place_limit_order(
+            data['user_id'],
+            data['stock_id'],
+            data['side'],
+            data['shares'],
+            data['limit_price'],
+            data.get('fee_amount', 0)
+        )
+        return jsonify({"status": "success", "order": order}), 201
+
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+    except Exception as e:
+        print(f"Place Limit Order Error: {e}")
+        return jsonify({"error": "An unexpected error occurred."}), 500
+
+
+@stock_bp.route('/orders/<int:order_id>', methods=['DELETE'])
+@session_required()
+def cancel_limit_order_route(order_id):
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Missing user_id parameter."}), 400
+
+    try:
+        order = cancel_limit_order(user_id, order_id)
+        return jsonify({"status": "success", "order": order}), 200
+
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 404
+
+    except Exception as e:
+        print(f"Cancel Limit Order Error: {e}")
+        return jsonify({"error": "An unexpected error occurred."}), 500
+
+
+@stock_bp.route('/orders', methods=['GET'])
+@session_required()
+def list_limit_orders_route():
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Missing user_id parameter."}), 400
+
+    status = request.args.get('status')
+    try:
+        orders = get_user_limit_orders(user_id, status.upper() if status else None)
+        return jsonify({"status": "success", "orders": orders}), 200
+
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+    except Exception as e:
+        print(f"List Limit Orders Error: {e}")
+        return jsonify({"error": "An unexpected error occurred."}), 500
+
+
+def _logo_response(logo_hash, thumbnail):
+    if not HASH_PATTERN.match(logo_hash):
+        return jsonify({"error": "Logo not found."}), 404
+
+    # A hash always names the same bytes, so a client that has it is current.
+    etag = f"{logo_hash}-thumbnail" if thumbnail else logo_hash
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    try:
+        logo = get_logo(logo_hash, thumbnail)
+        if logo is None:
+            return jsonify({"error": "Logo not found."}), 404
+
+        data, content_type = logo
+        headers["X-Content-Type-Options"] = "nosniff"
+        return Response(data, content_type=content_type, headers=headers)
+
+    except Exception as e:
+        print(f"Stock Logo Error: {e}")
+        return jsonify({"error": "An unexpected error occurred."}), 500
+
+
+@stock_bp.route('/logo/<logo_hash>', methods=['GET'])
+def stock_logo(logo_hash):
+    return _logo_response(logo_hash, thumbnail=False)
+
+
+@stock_bp.route('/logo/<logo_hash>/thumbnail', methods=['GET'])
+def stock_logo_thumbnail(logo_hash):
+    return _logo_response(logo_hash, thumbnail=True)
+
+
 @stock_bp.route('/search', methods=['GET'])
 def search_stocks_route():
     query = request.args.get('query')
@@ -226,6 +500,7 @@ def search_stocks_route():
 
 
 @stock_bp.route('/get_shares', methods=['GET'])
+@session_required()
 def get_shares_route():
     user_id = request.args.get('user_id')
     stock_id = request.args.get('stock_id')
@@ -251,15 +526,16 @@ def stock_id_by_symbol():
         return jsonify({"error": "Missing symbol parameter."}), 400
 
     try:
-        stock_id = get_stock_id_by_symbol(symbol)
+        snapshot = market_snapshot.current()
+        stock_id = snapshot.id_by_symbol.get(symbol)
 
         if stock_id is None:
             return jsonify({"error": "Stock not found."}), 404
 
-        return jsonify({
+        return _snapshot_response(snapshot, {
             "status": "success",
             "stock_id": stock_id
-        }), 200
+        })
 
     except Exception as e:
         print(f"Stock ID By Symbol Error: {e}")
@@ -269,11 +545,11 @@ def stock_id_by_symbol():
 @stock_bp.route('/top_gainers', methods=['GET'])
 def top_gainers():
     try:
-        gainers = get_top_gainers()
-        return jsonify({
+        snapshot = market_snapshot.current()
+        return _snapshot_response(snapshot, {
             "status": "success",
-            "top_gainers": gainers
-        }), 200
+            "top_gainers": snapshot.top_gainers
+        })
 
     except Exception as e:
         print(f"Top Gainers Error: {e}")
@@ -283,11 +559,11 @@ def top_gainers():
 @stock_bp.route('/top_losers', methods=['GET'])
 def top_losers():
     try:
-        losers = get_top_losers()
-        return jsonify({
+        snapshot = market_snapshot.current()
+        return _snapshot_response(snapshot, {
             "status": "success",
-            "top_losers": losers
-        }), 200
+            "top_losers": snapshot.top_losers
+        })
 
     except Exception as e:
         print(f"Top Losers Error: {e}")
@@ -295,6 +571,7 @@ def top_losers():
 
 
 @stock_bp.route('/add_wishlist', methods=['POST'])
+@session_required()
 def add_to_wishlist():
     data = request.get_json()
 
@@ -319,6 +596,7 @@ def add_to_wishlist():
 
 
 @stock_bp.route('/remove_wishlist', methods=['POST'])
+@session_required()
 def remove_from_wishlist():
     data = request.get_json()
 
@@ -343,6 +621,7 @@ def remove_from_wishlist():
 
 
 @stock_bp.route('/get_wishlist', methods=['GET'])
+@session_required()
 def get_wishlist():
     user_id = request.args.get('user_id')
     if not user_id:
@@ -1,12 +1,16 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from datetime import datetime
 from .. import db
+from ..pagination import DEFAULT_PAGE_SIZE, decode_cursor, keyset_page
 
 
-def get_transaction_history(user_id: str, start_date: str | None = None, end_date: str | None = None) -> List[Dict[str, Any]]:
-    
-    conn = db.get_db_conn()
-    cur = conn.cursor()
+def get_transaction_history(
+    user_id: str,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: str | None = None,
+) -> Tuple[List[Dict[str, Any]], str | None]:
 
     where_clauses = ["t.user_id = %s"]
     params: list[Any] = [user_id]
@@ -19,6 +23,13 @@ def get_transaction_history(user_id: str, start_date: str | None = None, end_dat
         where_clauses.append("t.created_at <= %s")
         params.append(end_date)
 
+    if after:
+        created_at, transaction_id = decode_cursor(after)
+        where_clauses.append("(t.created_at, t.transaction_id) < (%s, %s)")
+        params.extend([created_at, transaction_id])
+
+    params.append(limit + 1)
+
     query = f"""
         SELECT
             t.transaction_id,
@@ -30,13 +41,13 @@ def get_transaction_history(user_id: str, start_date: str | None = None, end_dat
         FROM transactions t
         JOIN stocks s ON t.stock_id = s.stock_id
         WHERE {" AND ".join(where_clauses)}
-        ORDER BY t.created_at DESC
+        ORDER BY t.created_at DESC, t.transaction_id DESC
+        LIMIT %s
     """
 
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db.connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        rows, next_cursor = keyset_page(cur.fetchall(), limit, 4, 0)
 
     history: List[Dict[str, Any]] = []
     for tx_id, tx_type, qty, price, created_at, symbol in rows:
@@ -51,4 +62,4 @@ def get_transaction_history(user_id: str, start_date: str | None = None, end_dat
             "timestamp": ts,
         })
 
-    return history
\ No newline at end of file
+    return history, next_cursor
\ No newline at end of file
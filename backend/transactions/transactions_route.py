@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from .transaction_repo import get_transaction_history
+from ..pagination import parse_limit
 
 transactions_bp = Blueprint("transactions", __name__, url_prefix="/api/transactions")
 
@@ -14,11 +15,15 @@ def history():
     end_date = request.args.get("end_date")      
 
     try:
-        history = get_transaction_history(user_id, start_date, end_date)
+        limit = parse_limit(request.args.get("limit"))
+        history, next_cursor = get_transaction_history(user_id, start_date, end_date, limit, request.args.get("after"))
         return jsonify({
             "status": "success",
-            "transactions": history
+            "transactions": history,
+            "next_cursor": next_cursor
         }), 200
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
     except Exception as e:
         print(f"Transaction history error: {e}")
         return jsonify({"error": "An unexpected error occurred."}), 500
@@ -0,0 +1,144 @@
+"""
+Append-only cash ledger.
+
+A user's cash balance is their row in cash_checkpoints plus every
+cash_ledger entry after it (the cash_balances view). Money moves by
+appending entries, so trades and deposits never update or lock the user's
+row:
+
+- Every writer takes a shared advisory lock on the user's ledger before
+  inserting. Shared locks do not block each other; they only keep
+  compaction away while entries are in flight.
+- A transaction whose net effect is a debit also takes the user's exclusive
+  debit lock and checks funds under it. Only debits for the same account
+  wait for each other, and only from the check to commit. Credits never wait.
+- compact_cash_ledger() periodically folds entries into the checkpoint so
+  the sum stays short. Entries are kept as history.
+"""
+import os
+from decimal import Decimal, ROUND_HALF_UP
+import psycopg2
+from psycopg2.extras import execute_values
+from .. import db
+
+# Advisory lock namespaces, used as pg_advisory_xact_lock(namespace, user_id).
+WRITE_LOCK_NAMESPACE = 4017
+DEBIT_LOCK_NAMESPACE = 4018
+
+COMPACT_INTERVAL_SECONDS = int(os.getenv("CASH_LEDGER_COMPACT_SECONDS", "60"))
+COMPACT_MIN_ENTRIES = int(os.getenv("CASH_LEDGER_COMPACT_MIN_ENTRIES", "20"))
+COMPACT_CHUNK_USERS = 500
+
+CENTS = Decimal('0.01')
+
+
+def to_cents(amount):
+    return Decimal(str(amount)).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def balance(cursor, user_id):
+    """The user's current balance, or None if there is no such user."""
+    cursor.execute("SELECT balance FROM cash_balances WHERE user_id = %s;", (user_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def lock_for_debit(cursor, user_id):
+    """
+    Takes the user's debit lock for the rest of the transaction and returns
+    the balance as of now (None if there is no such user). No other debit
+    for the user can commit until this transaction ends, so the caller may
+    spend up to the returned amount.
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock_shared(%s, %s);", (WRITE_LOCK_NAMESPACE, user_id))
+    cursor.execute("SELECT pg_advisory_xact_lock(%s, %s);", (DEBIT_LOCK_NAMESPACE, user_id))
+    return balance(cursor, user_id)
+
+
+def append(cursor, user_id, entries):
+    """
+    Appends (amount, reason, transaction_id) entries for one user; negative
+    amounts are debits. Callers posting a net debit must have called
+    lock_for_debit first. Do this last in the transaction: the shared lock
+    is held until commit.
+    """
+    if not entries:
+        return
+    cursor.execute("SELECT pg_advisory_xact_lock_shared(%s, %s);", (WRITE_LOCK_NAMESPACE, user_id))
+    execute_values(cursor, """
+        INSERT INTO cash_ledger (user_id, amount, reason, transaction_id)
+        VALUES %s;
+    """, [
+        (user_id, to_cents(amount), reason, transaction_id)
+        for amount, reason, transaction_id in entries
+    ], page_size=len(entries))
+
+
+def compact_cash_ledger(min_entries=None, chunk_size=None):
+    """
+    Moves the checkpoint of every user with at least `min_entries` entries
+    past it up to their latest entry. Also copies the balance into
+    cloudex_users.balance for reporting. Users with a ledger write in flight
+    are skipped until the next run. Returns the number of users compacted.
+    """
+    min_entries = min_entries or COMPACT_MIN_ENTRIES
+    chunk_size = chunk_size or COMPACT_CHUNK_USERS
+    compacted = 0
+
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT l.user_id
+                FROM cash_ledger l
+                LEFT JOIN cash_checkpoints c ON c.user_id = l.user_id
+                WHERE l.entry_id > COALESCE(c.last_entry_id, 0)
+                GROUP BY l.user_id
+                HAVING COUNT(*) >= %s
+                ORDER BY l.user_id;
+            """, (min_entries,))
+            user_ids = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+
+            for start in range(0, len(user_ids), chunk_size):
+                cursor.execute("""
+                    SELECT user_id
+                    FROM unnest(%s::integer[]) AS user_id
+                    WHERE pg_try_advisory_xact_lock(%s, user_id);
+                """, (user_ids[start:start + chunk_size], WRITE_LOCK_NAMESPACE))
+                locked = [row[0] for row in cursor.fetchall()]
+                if not locked:
+                    conn.commit()
+                    continue
+
+                # One statement, so the balance and last entry id come from the
+                # same snapshot, taken after the locks were granted.
+                cursor.execute("""
+                    WITH folded AS (
+                        SELECT b.user_id, b.balance,
+                            (SELECT MAX(l.entry_id) FROM cash_ledger l WHERE l.user_id = b.user_id) AS last_entry_id
+                        FROM cash_balances b
+                        WHERE b.user_id = ANY(%s)
+                    ), saved AS (
+                        INSERT INTO cash_checkpoints (user_id, balance, last_entry_id, checkpointed_at)
+                        SELECT user_id, balance, last_entry_id, NOW()
+                        FROM folded
+                        WHERE last_entry_id IS NOT NULL
+                        ON CONFLICT (user_id) DO UPDATE
+                        SET balance = EXCLUDED.balance,
+                            last_entry_id = EXCLUDED.last_entry_id,
+                            checkpointed_at = EXCLUDED.checkpointed_at
+                        RETURNING user_id, balance
+                    )
+                    UPDATE cloudex_users u
+                    SET balance = saved.balance
+                    FROM saved
+                    WHERE u.user_id = saved.user_id;
+                """, (locked,))
+                compacted += cursor.rowcount
+                conn.commit()
+
+        return compacted
+
+    except psycopg2.Error as e:
+        print(f"Database error in compact_cash_ledger: {e}")
+        raise
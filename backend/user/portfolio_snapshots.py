@@ -0,0 +1,77 @@
+import os
+from datetime import datetime, timezone
+import psycopg2
+from .. import db
+from ..market_hours.market_calendar import MARKET_TIMEZONE
+
+# How often the snapshot job runs, and how many users' positions it values
+# per transaction.
+SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("PORTFOLIO_SNAPSHOT_SECONDS", "3600"))
+SNAPSHOT_CHUNK_USERS = int(os.getenv("PORTFOLIO_SNAPSHOT_CHUNK_USERS", "500"))
+
+
+def market_date(now=None):
+    """The trading date `now` falls on, in the market's time zone."""
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(MARKET_TIMEZONE).date()
+
+
+def snapshot_portfolio_values(snapshot_date=None, chunk_size=None):
+    """
+    Records each position's market value for `snapshot_date` (today by
+    default) in portfolio_value_snapshots, skipping positions whose value is
+    unchanged since their latest snapshot. Runs again later the same day
+    overwrite that day's row, so the last run of a day leaves its closing
+    value. Users are processed in chunks, each in its own short transaction.
+    Returns the number of rows written.
+    """
+    snapshot_date = snapshot_date or market_date()
+    chunk_size = chunk_size or SNAPSHOT_CHUNK_USERS
+    last_user_id = 0
+    written = 0
+
+    try:
+        with db.connection() as conn, conn.cursor() as cursor:
+            while True:
+                cursor.execute("""
+                    SELECT DISTINCT user_id
+                    FROM portfolio
+                    WHERE user_id > %s
+                    ORDER BY user_id
+                    LIMIT %s;
+                """, (last_user_id, chunk_size))
+                user_ids = [row[0] for row in cursor.fetchall()]
+                if not user_ids:
+                    break
+
+                cursor.execute("""
+                    INSERT INTO portfolio_value_snapshots (user_id, stock_id, snapshot_date, total_shares, market_value)
+                    SELECT p.user_id, p.stock_id, %s, p.total_shares, ROUND(p.total_shares * s.price, 2)
+                    FROM portfolio p
+                    JOIN stocks s ON s.stock_id = p.stock_id
+                    LEFT JOIN LATERAL (
+                        SELECT v.total_shares, v.market_value
+                        FROM portfolio_value_snapshots v
+                        WHERE v.user_id = p.user_id
+                            AND v.stock_id = p.stock_id
+                            AND v.snapshot_date <= %s
+                        ORDER BY v.snapshot_date DESC
+                        LIMIT 1
+                    ) AS last ON true
+                    WHERE p.user_id = ANY(%s)
+                        AND (last.market_value IS DISTINCT FROM ROUND(p.total_shares * s.price, 2)
+                            OR last.total_shares IS DISTINCT FROM p.total_shares)
+                    ON CONFLICT (user_id, stock_id, snapshot_date) DO UPDATE
+                    SET total_shares = EXCLUDED.total_shares,
+                        market_value = EXCLUDED.market_value;
+                """, (snapshot_date, snapshot_date, user_ids))
+                written += cursor.rowcount
+                conn.commit()
+
+                last_user_id = user_ids[-1]
+
+        return written
+
+    except psycopg2.Error as e:
+        print(f"Database error in snapshot_portfolio_values: {e}")
+        raise
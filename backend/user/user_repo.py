@@ -1,488 +1,494 @@
 import psycopg2
+from decimal import Decimal
 from .. import db
+from ..stock import market_snapshot
+from ..pagination import DEFAULT_PAGE_SIZE, decode_cursor, keyset_page
+from .portfolio_snapshots import market_date
+from . import cash_ledger
 
-def get_user_transactions(user_id):
+_TRANSACTION_COLUMNS = """
+    th.transaction_id, 
+    th.stock_id, 
+    th.transaction_type, 
+    th.shares, 
+    th.price_per_share, 
+    th.executed_at, 
+    th.fee_amount, 
+    s.company_name,   -- Index 7
+    s.symbol          -- Index 8
+"""
+
+TRANSACTION_EXPORT_FIELDS = [
+    "transaction_id", "stock_id", "transaction_type", "shares", "price_per_share",
+    "transaction_date", "total_amount", "stock_name", "symbol"
+]
+
+
+def _transaction_to_dict(row):
+    return dict(zip(TRANSACTION_EXPORT_FIELDS, row))
+
+
+def get_user_transactions(user_id, limit=DEFAULT_PAGE_SIZE, after=None):
     """
-    Retrieves the transaction history for a user, including the stock name and symbol,
-    by joining the transaction_history and stocks tables.
+    Retrieves one page of a user's transaction history, newest first, including
+    the stock name and symbol. Pages are keyed on (executed_at, transaction_id);
+    pass the returned cursor as `after` to get the next page.
+    Returns (transactions, next_cursor).
     """
-    conn = None
-    cursor = None
+    params = [user_id]
+    keyset = ""
+    if after:
+        executed_at, transaction_id = decode_cursor(after)
+        keyset = "AND (th.executed_at, th.transaction_id) < (%s, %s)"
+        params += [executed_at, transaction_id]
+    params.append(limit + 1)
+
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
-        
-        query = """
-        SELECT 
-            th.transaction_id, 
-            th.stock_id, 
-            th.transaction_type, 
-            th.shares, 
-            th.price_per_share, 
-            th.executed_at, 
-            th.fee_amount, 
-            s.company_name,   -- Index 7
-            s.symbol          -- Index 8
-        FROM transaction_history th
-        INNER JOIN stocks s ON th.stock_id = s.stock_id
-        WHERE th.user_id = %s
-        ORDER BY th.executed_at DESC;
-        """
-        cursor.execute(query, (user_id,))
-        transactions = cursor.fetchall()
-        return [
-            {
-                "transaction_id": row[0],
-                "stock_id": row[1],
-                "transaction_type": row[2],
-                "shares": row[3],
-                "price_per_share": row[4],
-                "transaction_date": row[5],
-                "total_amount": row[6],
-                "stock_name": row[7],
-                "symbol": row[8]
-            }
-            for row in transactions
-        ] 
+        with db.connection() as conn, conn.cursor() as cursor:
+        
+            query = f"""
+            SELECT {_TRANSACTION_COLUMNS}
+            FROM transaction_history th
+            INNER JOIN stocks s ON th.stock_id = s.stock_id
+            WHERE th.user_id = %s {keyset}
+            ORDER BY th.executed_at DESC, th.transaction_id DESC
+            LIMIT %s;
+            """
+            cursor.execute(query, params)
+            rows, next_cursor = keyset_page(cursor.fetchall(), limit, 5, 0)
+            return [_transaction_to_dict(row) for row in rows], next_cursor
     
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+
+def iter_user_transactions(user_id, batch_size=2000):
+    """
+    Yields every transaction row for a user, newest first, through a
+    server-side cursor so only `batch_size` rows are in memory at a time.
+    The connection is held until the generator is exhausted or closed.
+    """
+    with db.connection() as conn, conn.cursor(name="transaction_export") as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(f"""
+            SELECT {_TRANSACTION_COLUMNS}
+            FROM transaction_history th
+            INNER JOIN stocks s ON th.stock_id = s.stock_id
+            WHERE th.user_id = %s
+            ORDER BY th.executed_at DESC, th.transaction_id DESC;
+        """, (user_id,))
+        yield from cursor
 
 def delete_user(user_id):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        delete_query = "DELETE FROM cloudex_users WHERE user_id = %s;"
-        cursor.execute(delete_query, (user_id,))
-        conn.commit()
+            delete_query = "DELETE FROM cloudex_users WHERE user_id = %s;"
+            cursor.execute(delete_query, (user_id,))
+            cursor.execute("DELETE FROM cash_ledger WHERE user_id = %s;", (user_id,))
+            cursor.execute("DELETE FROM portfolio_value_snapshots WHERE user_id = %s;", (user_id,))
+            conn.commit()
         
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
-
 
 def get_user_stocks(user_id):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
-        
-        query = """
-                SELECT
-                s.symbol, s.company_name, p.total_shares, p.average_cost FROM
-                portfolio p JOIN
-                stocks s ON p.stock_id = s.stock_id WHERE
-                p.user_id = %s;
-                """
-        cursor.execute(query, (user_id,))
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        stocks = [row[0] for row in cursor.fetchall()]
-        return stocks  
+            query = """
+                    SELECT
+                    s.symbol, s.company_name, p.total_shares, p.average_cost FROM
+                    portfolio p JOIN
+                    stocks s ON p.stock_id = s.stock_id WHERE
+                    p.user_id = %s;
+                    """
+            cursor.execute(query, (user_id,))
+        
+            stocks = [row[0] for row in cursor.fetchall()]
+            return stocks  
     
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 def get_user_watchlist(user_id):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        query = """
-            SELECT stock_id
-            FROM watchlist 
-            WHERE user_id = %s;
-        """
-        cursor.execute(query, (user_id,))
+            query = """
+                SELECT stock_id
+                FROM watchlist 
+                WHERE user_id = %s;
+            """
+            cursor.execute(query, (user_id,))
         
-        watchlist = [row[0] for row in cursor.fetchall()]
-        return watchlist  
+            watchlist = [row[0] for row in cursor.fetchall()]
+            return watchlist  
     
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 def get_full_watchlist(user_id):
     """
     Retrieves the full details (ID, symbol, company_name, price) 
     for all stocks associated with the given user_id in the 'watchlist' table.
     """
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
-        query = """
-        SELECT s.stock_id, s.symbol, s.company_name, s.price
-        FROM stocks s
-        INNER JOIN watchlist w ON s.stock_id = w.stock_id
-        WHERE w.user_id = %s;
-        """
-        cursor.execute(query, (user_id,))
-        
-        raw_results = cursor.fetchall()
-        
-        watchlist = []
-        for row in raw_results:
-            stock_data = {
-                'stock_id': row[0],
-                'symbol': row[1],
-                'company_name': row[2],
-                'price': row[3]
-            }
-            watchlist.append(stock_data)
+        with db.connection() as conn, conn.cursor() as cursor:
+            query = """
+            SELECT s.stock_id, s.symbol, s.company_name, s.price
+            FROM stocks s
+            INNER JOIN watchlist w ON s.stock_id = w.stock_id
+            WHERE w.user_id = %s;
+            """
+            cursor.execute(query, (user_id,))
+        
+            raw_results = cursor.fetchall()
+        
+            watchlist = []
+            for row in raw_results:
+                stock_data = {
+                    'stock_id': row[0],
+                    'symbol': row[1],
+                    'company_name': row[2],
+                    'price': row[3]
+                }
+                watchlist.append(stock_data)
             
-        return watchlist
+            return watchlist
     
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
 
 def get_user_by_id(user_id):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        query = "SELECT user_id, username, email FROM cloudex_users WHERE user_id = %s;"
-        cursor.execute(query, (user_id,))
+            query = "SELECT user_id, username, email FROM cloudex_users WHERE user_id = %s;"
+            cursor.execute(query, (user_id,))
         
-        user_record = cursor.fetchone()
-        return user_record  
+            user_record = cursor.fetchone()
+            return user_record  
     
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 def edit_user(user_id, email, username, password_hash=None):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn()
-        cursor = conn.cursor()
-        if password_hash:
-            query = """
-                UPDATE cloudex_users
-                SET email = %s,
-                    username = %s,
-                    password_hash = %s
-                WHERE user_id = %s;
-            """
-            cursor.execute(query, (email, username, password_hash, user_id))
-        else:
-            query = """
-                UPDATE cloudex_users
-                SET email = %s,
-                    username = %s
-                WHERE user_id = %s;
-            """
-            cursor.execute(query, (email, username, user_id))
-        conn.commit()
+        with db.connection() as conn, conn.cursor() as cursor:
+            if password_hash:
+                query = """
+                    UPDATE cloudex_users
+                    SET email = %s,
+                        username = %s,
+                        password_hash = %s
+                    WHERE user_id = %s;
+                """
+                cursor.execute(query, (email, username, password_hash, user_id))
+            else:
+                query = """
+                    UPDATE cloudex_users
+                    SET email = %s,
+                        username = %s
+                    WHERE user_id = %s;
+                """
+                cursor.execute(query, (email, username, user_id))
+            conn.commit()
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
         print(f"Database error in edit_user: {e}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
-            
 def add_user_transaction(user_id, stock_id, transaction_type, shares, price_per_share, fee_amount):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        insert_query = """
-            INSERT INTO transaction_history (user_id, stock_id, transaction_type, shares, price_per_share, executed_at, fee_amount)
-            VALUES (%s, %s, %s, %s, %s, NOW(), %s);
-        """
-        cursor.execute(insert_query, (user_id, stock_id, transaction_type, shares, price_per_share, fee_amount))
-        conn.commit()
+            insert_query = """
+                INSERT INTO transaction_history (user_id, stock_id, transaction_type, shares, price_per_share, executed_at, fee_amount)
+                VALUES (%s, %s, %s, %s, %s, NOW(), %s);
+            """
+            cursor.execute(insert_query, (user_id, stock_id, transaction_type, shares, price_per_share, fee_amount))
+            conn.commit()
         
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
+
 def get_user_id_by_email(email):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        query = "SELECT user_id FROM cloudex_users WHERE email = %s;"
-        cursor.execute(query, (email,))
+            query = "SELECT user_id FROM cloudex_users WHERE email = %s;"
+            cursor.execute(query, (email,))
         
-        result = cursor.fetchone()
-        if result:
-            return result
-        return None  
+            result = cursor.fetchone()
+            if result:
+                return result
+            return None  
     
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
+
 def get_user_id_by_username(username):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
-        query = "SELECT user_id FROM cloudex_users WHERE username = %s;"
-        cursor.execute(query, (username,))
-        
-        result = cursor.fetchone()
-        if result:
-            return result
-        return None  
+        with db.connection() as conn, conn.cursor() as cursor:
+            query = "SELECT user_id FROM cloudex_users WHERE username = %s;"
+            cursor.execute(query, (username,))
+        
+            result = cursor.fetchone()
+            if result:
+                return result
+            return None  
     
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
+
 def get_portfolio(user_id):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
-        
-        query = """
-            SELECT stock_id, total_shares, average_cost
-            FROM portfolio
-            WHERE user_id = %s;
-        """
-        cursor.execute(query, (user_id,))
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        portfolio = cursor.fetchall()
-        return [
-            {
-                "stock_id": row[0],
-                "total_shares": row[1],
-                "average_cost": row[2]
-            }
-            for row in portfolio
-        ]  
+            query = """
+                SELECT stock_id, total_shares, average_cost
+                FROM portfolio
+                WHERE user_id = %s;
+            """
+            cursor.execute(query, (user_id,))
+        
+            portfolio = cursor.fetchall()
+            return [
+                {
+                    "stock_id": row[0],
+                    "total_shares": row[1],
+                    "average_cost": row[2]
+                }
+                for row in portfolio
+            ]  
     
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
+
 def get_user_balance(user_id):
-    conn = None
-    cursor = None
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
-        
-        query = "SELECT balance FROM cloudex_users WHERE user_id = %s;"
-        cursor.execute(query, (user_id,))
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        result = cursor.fetchone()
-        if result:
-            return result[0]
-        return 0.0  
+            result = cash_ledger.balance(cursor, user_id)
+            if result is not None:
+                return result
+            return 0.0  
     
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
+
+def _positive_amount(amount):
+    """Converts amount to cents; raises ValueError unless it is a positive number."""
+    try:
+        amount = cash_ledger.to_cents(amount)
+    except (ArithmeticError, TypeError, ValueError):
+        raise ValueError("Invalid amount.")
+    if not amount.is_finite():
+        raise ValueError("Invalid amount.")
+    if amount <= 0:
+        raise ValueError("Amount must be greater than zero.")
+    return amount
+
 def add_funds_to_user(user_id, amount):
-    conn = None
-    cursor = None
+    amount = _positive_amount(amount)
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
-        
-        update_query = "UPDATE cloudex_users SET balance = balance + %s WHERE user_id = %s;"
-        cursor.execute(update_query, (amount, user_id))
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        select_query = "SELECT balance FROM cloudex_users WHERE user_id = %s;"
-        cursor.execute(select_query, (user_id,))
-        new_balance = cursor.fetchone()[0]
+            cash_ledger.append(cursor, user_id, [(amount, 'DEPOSIT', None)])
+            new_balance = cash_ledger.balance(cursor, user_id)
         
-        conn.commit()
+            conn.commit()
         
-        return new_balance
+            return new_balance
         
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
+
 def get_daily_portfolio_change(user_id):
-    conn = None
-    cursor = None
+    """
+    Change in the user's holdings' market value since the last snapshot
+    before today. Positions opened today are measured against their cost.
+    """
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
+        with db.connection() as conn, conn.cursor() as cursor:
         
-        query = """
-            SELECT 
-                SUM((p.total_shares * s.price) - p.previous_total_value) AS daily_change
-            FROM 
-                portfolio p
-            JOIN 
-                stocks s ON p.stock_id = s.stock_id
-            WHERE 
-                p.user_id = %s;
-        """
-        cursor.execute(query, (user_id,))
+            query = """
+                SELECT 
+                    SUM((p.total_shares * s.price) - COALESCE(base.market_value, p.total_shares * p.average_cost)) AS daily_change
+                FROM 
+                    portfolio p
+                JOIN 
+                    stocks s ON p.stock_id = s.stock_id
+                LEFT JOIN LATERAL (
+                    SELECT v.market_value
+                    FROM portfolio_value_snapshots v
+                    WHERE v.user_id = p.user_id
+                        AND v.stock_id = p.stock_id
+                        AND v.snapshot_date < %s
+                    ORDER BY v.snapshot_date DESC
+                    LIMIT 1
+                ) AS base ON true
+                WHERE 
+                    p.user_id = %s;
+            """
+            cursor.execute(query, (market_date(), user_id))
         
-        result = cursor.fetchone()
-        return result[0] if result[0] is not None else 0.0  
+            result = cursor.fetchone()
+            return result[0] if result[0] is not None else 0.0  
     
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-        
+
 def withdraw_funds(user_id, amount):
-    conn = None
-    cursor = None
+    amount = _positive_amount(amount)
     try:
-        conn = db.get_db_conn() 
-        cursor = conn.cursor()
-        
-        update_query = "UPDATE cloudex_users SET balance = balance - %s WHERE user_id = %s AND balance >= %s;"
-        cursor.execute(update_query, (amount, user_id, amount))
-        if cursor.rowcount == 0:
-            raise ValueError("Insufficient funds.")
-        conn.commit()
+        with db.connection() as conn, conn.cursor() as cursor:
+        
+            available = cash_ledger.lock_for_debit(cursor, user_id)
+            if available is None:
+                raise ValueError(f"User ID {user_id} not found.")
+            if available < amount:
+                raise ValueError("Insufficient funds.")
+            cash_ledger.append(cursor, user_id, [(-amount, 'WITHDRAWAL', None)])
+            conn.commit()
+
+            return available - amount
         
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
         print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
-def update_portfolio_previous_value():
-    conn = None
-    cursor = None
+
+# Placeholders are filled in per driver: %s for psycopg2, $n for asyncpg.
+PORTFOLIO_SUMMARY_QUERY = """
+    SELECT
+        cb.balance,
+        pos.stock_ids, pos.total_shares, pos.average_costs, pos.baselines,
+        wl.stock_ids
+    FROM cloudex_users u
+    JOIN cash_balances cb ON cb.user_id = u.user_id
+    LEFT JOIN LATERAL (
+        SELECT
+            array_agg(p.stock_id ORDER BY p.stock_id) AS stock_ids,
+            array_agg(p.total_shares ORDER BY p.stock_id) AS total_shares,
+            array_agg(p.average_cost ORDER BY p.stock_id) AS average_costs,
+            array_agg(base.market_value ORDER BY p.stock_id) AS baselines
+        FROM portfolio p
+        LEFT JOIN LATERAL (
+            SELECT v.market_value
+            FROM portfolio_value_snapshots v
+            WHERE v.user_id = p.user_id
+                AND v.stock_id = p.stock_id
+                AND v.snapshot_date < {baseline_date}
+            ORDER BY v.snapshot_date DESC
+            LIMIT 1
+        ) AS base ON true
+        WHERE p.user_id = u.user_id
+    ) AS pos ON true
+    LEFT JOIN LATERAL (
+        SELECT array_agg(w.stock_id ORDER BY w.stock_id) AS stock_ids
+        FROM watchlist w
+        WHERE w.user_id = u.user_id
+    ) AS wl ON true
+    WHERE u.user_id = {user_id};
+"""
+
+
+def get_portfolio_summary(user_id):
+    """
+    Everything the dashboard shows for a user, from one query plus the
+    in-memory market snapshot. See build_portfolio_summary for the fields.
+    """
     try:
-        conn = db.get_db_conn()
-        cursor = conn.cursor()
-
-        query = """
-        UPDATE portfolio AS p
-        SET previous_total_value = p.total_shares * s.price
-        FROM stocks AS s
-        WHERE p.stock_id = s.stock_id;
-        """
-        
-        cursor.execute(query)
-        conn.commit()
+        with db.connection() as conn, conn.cursor() as cursor:
+            query = PORTFOLIO_SUMMARY_QUERY.format(baseline_date="%s", user_id="%s")
+            cursor.execute(query, (market_date(), user_id))
+            row = cursor.fetchone()
 
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
+        print(f"Database error: {e}")
         raise
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
\ No newline at end of file
+
+    return build_portfolio_summary(user_id, row, market_snapshot.current())
+
+
+def build_portfolio_summary(user_id, row, snapshot):
+    """
+    Values a PORTFOLIO_SUMMARY_QUERY row at the snapshot's prices: holdings
+    with cost basis and unrealized P&L, cash, total equity, daily change
+    (against the same baseline as get_daily_portfolio_change) and watchlist
+    quotes.
+    """
+    if row is None:
+        raise ValueError(f"User ID {user_id} not found.")
+
+    balance, stock_ids, shares, average_costs, baselines, watchlist_ids = row
+    col = {name: i for i, name in enumerate(snapshot.columns)}
+    cents = Decimal("0.01")
+
+    holdings = []
+    total_cost = total_value = daily_change = Decimal("0")
+    for stock_id, total_shares, average_cost, baseline in zip(stock_ids or [], shares or [], average_costs or [], baselines or []):
+        stock = snapshot.by_id.get(stock_id)
+        if stock is None:
+            continue
+
+        cost_basis = total_shares * average_cost
+        market_value = total_shares * stock[col["price"]]
+        daily_change += market_value - (baseline if baseline is not None else cost_basis)
+        if not total_shares:
+            continue
+
+        total_cost += cost_basis
+        total_value += market_value
+        holdings.append({
+            "stock_id": stock_id,
+            "symbol": stock[col["symbol"]],
+            "company_name": stock[col["company_name"]],
+            "total_shares": total_shares,
+            "average_cost": average_cost,
+            "price": stock[col["price"]],
+            "previous_price": stock[col["previous_price"]],
+            "cost_basis": cost_basis.quantize(cents),
+            "market_value": market_value.quantize(cents),
+            "unrealized_pnl": (market_value - cost_basis).quantize(cents),
+            "unrealized_pnl_pct": ((market_value - cost_basis) / cost_basis * 100).quantize(cents) if cost_basis else None
+        })
+
+    watchlist = [
+        {
+            "stock_id": stock_id,
+            "symbol": snapshot.by_id[stock_id][col["symbol"]],
+            "company_name": snapshot.by_id[stock_id][col["company_name"]],
+            "price": snapshot.by_id[stock_id][col["price"]],
+            "previous_price": snapshot.by_id[stock_id][col["previous_price"]]
+        }
+        for stock_id in watchlist_ids or []
+        if stock_id in snapshot.by_id
+    ]
+
+    return {
+        "user_id": int(user_id),
+        "tick": snapshot.tick_id,
+        "cash": balance,
+        "holdings": holdings,
+        "watchlist": watchlist,
+        "totals": {
+            "cost_basis": total_cost.quantize(cents),
+            "market_value": total_value.quantize(cents),
+            "unrealized_pnl": (total_value - total_cost).quantize(cents),
+            "daily_change": daily_change.quantize(cents),
+            "equity": (balance + total_value).quantize(cents)
+        }
+    }
@@ -1,10 +1,21 @@
-import bcrypt
-from flask import Blueprint, request, jsonify
-from .user_repo import add_funds_to_user, add_user_transaction, edit_user, get_user_by_id, get_user_id_by_email, get_user_id_by_username, get_user_watchlist, get_user_stocks, delete_user, get_user_transactions, get_portfolio, get_user_balance, get_daily_portfolio_change, get_full_watchlist
+import csv
+import io
+import itertools
+import json
+from datetime import datetime
+from flask import Blueprint, Response, request, jsonify
+from .user_repo import add_funds_to_user, add_user_transaction, edit_user, get_user_by_id, get_user_id_by_email, get_user_id_by_username, get_user_watchlist, get_user_stocks, delete_user, get_user_transactions, get_portfolio, get_user_balance, get_daily_portfolio_change, get_full_watchlist, iter_user_transactions, TRANSACTION_EXPORT_FIELDS, get_portfolio_summary, withdraw_funds
+from ..pagination import parse_limit
+from ..auth.passwords import hash_password, PasswordHasherBusy, RETRY_AFTER_SECONDS
+from ..auth.session_tokens import session_required
+from ..idempotency import idempotent
+from ..conditional import conditional, user_scope
+from ..stock import market_snapshot
 
 user_bp = Blueprint('user', __name__, url_prefix='/user')
 
 @user_bp.route('/delete_user', methods=['DELETE'])
+@session_required()
 def delete_user_route():
     data = request.get_json()
     
@@ -28,6 +39,7 @@ def delete_user_route():
 
 
 @user_bp.route('/user_stocks', methods=['GET'])
+@session_required()
 def user_stocks():
     user_id = request.args.get('user_id')
     if not user_id:
@@ -46,6 +58,7 @@ def user_stocks():
         return jsonify({"error": "An unexpected error occurred."}), 500
 
 @user_bp.route('/user_watchlist', methods=['GET'])
+@session_required()
 def get_watchlist():
     user_id = request.args.get('user_id')
     if not user_id:
@@ -67,6 +80,7 @@ def get_watchlist():
 
 
 @user_bp.route('/user_profile', methods=['GET'])
+@session_required()
 def get_user_profile():
     user_id = request.args.get('user_id')
     if not user_id:
@@ -92,6 +106,7 @@ def get_user_profile():
         return jsonify({"error": "An unexpected error occurred."}), 500
 
 @user_bp.route('/edit_profile', methods=['PUT'])
+@session_required()
 def edit_profile():
     data = request.get_json()
 
@@ -104,39 +119,130 @@ def edit_profile():
     username = data['username']
     email = data['email']
     password = data.get('password_hash')
-    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()) if password else None
 
     try:
+        password_hash = hash_password(password) if password else None
         edit_user(user_id, email, username, password_hash)
         return jsonify({
             "status": "success",
             "message": "User profile updated successfully."
         }), 200
+
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(RETRY_AFTER_SECONDS)}
         
     except Exception as e:
         print(f"Edit Profile Error: {e}")
         return jsonify({"error": "An unexpected error occurred."}), 500
     
 @user_bp.route('/transactions', methods=['GET'])
+@session_required()
 def get_transactions():
     user_id = request.args.get('user_id')
     if not user_id:
         return jsonify({"error": "Missing user_id parameter."}), 400
 
     try:
-        transactions = get_user_transactions(user_id)  
+        limit = parse_limit(request.args.get('limit'))
+        transactions, next_cursor = get_user_transactions(user_id, limit, request.args.get('after'))
         
         return jsonify({
             "status": "success",
-            "transactions": transactions
+            "transactions": transactions,
+            "next_cursor": next_cursor
         }), 200
+
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
         
     except Exception as e:
         print(f"Get Transactions Error: {e}")
         return jsonify({"error": "An unexpected error occurred."}), 500
 
 
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _ndjson_rows(rows):
+    for row in rows:
+        record = {field: _export_value(value) for field, value in zip(TRANSACTION_EXPORT_FIELDS, row)}
+        yield json.dumps(record, default=str) + "\n"
+
+
+def _csv_rows(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(TRANSACTION_EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow([_export_value(value) for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+EXPORT_ERROR = "Export incomplete: an unexpected error occurred."
+
+
+def _csv_error_row():
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(["ERROR", EXPORT_ERROR])
+    return buffer.getvalue()
+
+
+def _export_stream(source, lines, error_line):
+    """
+    Streams lines made from the rows of source. The 200 is already sent when
+    a database error hits mid-stream, so the error is logged and the export
+    ends with error_line instead of looking complete. source is closed either
+    way, which releases its cursor and connection, also when the client
+    disconnects.
+    """
+    try:
+        yield from lines
+    except Exception as e:
+        print(f"Transaction Export Error: {e}")
+        yield error_line
+    finally:
+        source.close()
+
+
+@user_bp.route('/transactions/export', methods=['GET'])
+@session_required()
+def export_transactions():
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Missing user_id parameter."}), 400
+
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({"error": "format must be 'ndjson' or 'csv'."}), 400
+
+    source = iter_user_transactions(user_id)
+    try:
+        # Runs the query before the response starts, so a failure here is
+        # still an ordinary 500.
+        first = next(source, None)
+    except Exception as e:
+        print(f"Transaction Export Error: {e}")
+        return jsonify({"error": "An unexpected error occurred."}), 500
+
+    rows = itertools.chain([] if first is None else [first], source)
+    if export_format == 'csv':
+        body = _export_stream(source, _csv_rows(rows), _csv_error_row())
+        mimetype = "text/csv"
+    else:
+        body = _export_stream(source, _ndjson_rows(rows), json.dumps({"error": EXPORT_ERROR}) + "\n")
+        mimetype = "application/x-ndjson"
+
+    return Response(body, mimetype=mimetype, headers={
+        "Content-Disposition": f"attachment; filename=transactions.{export_format}"
+    })
+
+
 @user_bp.route('/add_transaction', methods=['POST'])
+@session_required()
 def add_transaction():
     data = request.get_json()
     
@@ -166,6 +272,7 @@ def add_transaction():
         return jsonify({"error": "An unexpected error occurred."}), 500
     
 @user_bp.route('/get_portfolio', methods=['GET'])
+@session_required()
 def get_portfolio_route():
     user_id = request.args.get('user_id')
     if not user_id:
@@ -184,6 +291,7 @@ def get_portfolio_route():
         return jsonify({"error": "An unexpected error occurred."}), 500
     
 @user_bp.route('/get_user_id', methods=['GET'])
+@session_required()
 def get_user_id_email():
     email = request.args.get('email')
     if not email:
@@ -205,6 +313,7 @@ def get_user_id_email():
         return jsonify({"error": "An unexpected error occurred."}), 500
     
 @user_bp.route('/get_user_by_username', methods=['GET'])
+@session_required()
 def get_user_by_username_route():
     username = request.args.get('username')
     if not username:
@@ -226,6 +335,7 @@ def get_user_by_username_route():
         return jsonify({"error": "An unexpected error occurred."}), 500
     
 @user_bp.route('/get_user_balance', methods=['GET'])
+@session_required()
 def get_user_balance_route():
     user_id = request.args.get('user_id')
     if not user_id:
@@ -244,6 +354,8 @@ def get_user_balance_route():
         return jsonify({"error": "An unexpected error occurred."}), 500
     
 @user_bp.route('/add_funds', methods=['POST'])
+@session_required()
+@idempotent
 def add_funds_route():
     data = request.get_json()
     
@@ -263,12 +375,17 @@ def add_funds_route():
             "message": "Funds added successfully.",
             "new_balance": new_balance
         }), 200
+
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
         
     except Exception as e:
         print(f"Add Funds Error: {e}")
         return jsonify({"error": "An unexpected error occurred."}), 500
     
 @user_bp.route('withdraw_funds', methods=['POST'])
+@session_required()
+@idempotent
 def withdraw_funds_route():
     data = request.get_json()
     
@@ -281,18 +398,23 @@ def withdraw_funds_route():
     amount = data['amount']
 
     try:
-        add_funds_to_user(user_id, -amount)  
+        new_balance = withdraw_funds(user_id, amount)  
         
         return jsonify({
             "status": "success",
-            "message": "Funds withdrawn successfully."
+            "message": "Funds withdrawn successfully.",
+            "new_balance": new_balance
         }), 200
+
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
         
     except Exception as e:
         print(f"Withdraw Funds Error: {e}")
         return jsonify({"error": "An unexpected error occurred."}), 500
     
 @user_bp.route('/daily_portfolio_change', methods=['GET'])
+@session_required()
 def daily_portfolio_change_route():
     user_id = request.args.get('user_id')
     if not user_id:
@@ -311,7 +433,30 @@ def daily_portfolio_change_route():
         return jsonify({"error": "An unexpected error occurred."}), 500
     
     
+@user_bp.route('/<int:user_id>/summary', methods=['GET'])
+@session_required()
+def portfolio_summary_route(user_id):
+    try:
+        summary = get_portfolio_summary(user_id)
+        return jsonify(dict(summary, status="success")), 200
+
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 404
+
+    except Exception as e:
+        print(f"Portfolio Summary Error: {e}")
+        return jsonify({"error": "An unexpected error occurred."}), 500
+
+
+def _requested_user_scope():
+    user_id = request.args.get('user_id')
+    return user_scope(user_id) if user_id else None
+
+
+# The body includes prices, so its tag also depends on the market tick.
 @user_bp.route('/full_wishlist', methods=['GET'])
+@session_required()
+@conditional(_requested_user_scope, lambda: market_snapshot.current().tick_id, private=True)
 def full_watchlist_route():
     user_id = request.args.get('user_id')
     if not user_id:
@@ -4,6 +4,17 @@ import axios from 'axios';
 // This will be updated once we deploy the backend
 const API_BASE_URL = 'https://ift401-cloudex.onrender.com/';
 
+export const SESSION_TOKEN_KEY = 'session_token';
+
+// Sends the session token from /auth/login with every request.
+axios.interceptors.request.use((config) => {
+    const token = localStorage.getItem(SESSION_TOKEN_KEY);
+    if (token) {
+        config.headers.Authorization = `Bearer ${token}`;
+    }
+    return config;
+});
+
 interface LoginCredentials {
     email?: string;
     username?: string;
@@ -65,10 +76,14 @@ export const searchStocks = async (query: string) => {
     }
 }
 
-export const buy_sellStock = async (transactionData: { user_id: string; stock_id: string; shares: number; price_per_share: number; fee_amount: number, transaction_type: 'BUY' | 'SELL'; }) => {
+// Pass the same idempotencyKey when retrying a submission so the server
+// returns the first attempt's result instead of executing it twice.
+export const buy_sellStock = async (transactionData: { user_id: string; stock_id: string; shares: number; price_per_share: number; fee_amount: number, transaction_type: 'BUY' | 'SELL'; }, idempotencyKey: string = crypto.randomUUID()) => {
     try {
         const url = `${API_BASE_URL}/stocks/buy_sell`;
-        const response = await axios.post(url, transactionData);
+        const response = await axios.post(url, transactionData, {
+            headers: { 'Idempotency-Key': idempotencyKey }
+        });
         return response.data;
     } catch (error) {
         console.error("Error processing stock transaction:", error);
@@ -138,6 +153,42 @@ export const getTopGainers = async () => {
     }
 }
 
+export const getStockCandles = async (stockId: string, interval: '1m' | '5m' | '1h' | '1d' = '1d', from?: string, to?: string) => {
+    try {
+        const url = `${API_BASE_URL}/stocks/${stockId}/candles`;
+        const response = await axios.get(url, {
+            params: { interval: interval, from: from, to: to }
+        });
+        return response.data;
+    } catch (error) {
+        console.error("Error fetching stock candles:", error);
+        throw error;
+    }
+}
+
+// Whether the market is open right now, plus the next open/close instants (ISO, UTC).
+export const getMarketStatus = async () => {
+    try {
+        const response = await axios.get(`${API_BASE_URL}/api/market_status`);
+        return response.data;
+    } catch (error) {
+        console.error("Error fetching market status:", error);
+        throw error;
+    }
+}
+
+// Opens a live price stream. Returns the EventSource so callers can close() it on unmount.
+export const subscribePriceStream = (onPrices: (prices: any[]) => void, symbols?: string[]) => {
+    const params = symbols && symbols.length > 0 ? `?symbols=${encodeURIComponent(symbols.join(','))}` : '';
+    const source = new EventSource(`${API_BASE_URL}/stocks/stream${params}`);
+    const handler = (event: MessageEvent) => onPrices(JSON.parse(event.data).prices);
+
+    source.addEventListener('snapshot', handler as EventListener);
+    source.addEventListener('prices', handler as EventListener);
+    source.onerror = (error) => console.error("Price stream error:", error);
+    return source;
+}
+
 // USER APIs //
 export const deleteUser = async (userId: string) => {
     try {
@@ -192,11 +243,12 @@ export const loginUser = async (credentials: LoginCredentials) => {
     } 
 };
 
-export const getUserTransactions = async (userId: string) => {
+// Returns one page of history; pass the previous page's next_cursor as `after` for the next one.
+export const getUserTransactions = async (userId: string, after?: string | null, limit?: number) => {
     try {
         const url = `${API_BASE_URL}/user/transactions`;
         const response = await axios.get(url, {
-            params: { user_id: userId }
+            params: { user_id: userId, after: after || undefined, limit: limit }
         });
         return response.data;
     } catch (error) {
@@ -205,6 +257,17 @@ export const getUserTransactions = async (userId: string) => {
     }
 }
 
+// Holdings, cash, equity, daily change and watchlist quotes for the dashboard in one call.
+export const getUserSummary = async (userId: string) => {
+    try {
+        const response = await axios.get(`${API_BASE_URL}/user/${userId}/summary`);
+        return response.data;
+    } catch (error) {
+        console.error("Error fetching user summary:", error);
+        throw error;
+    }
+}
+
 export const searchStocksBar = async (query: string) => {
     try {
         const url = `${API_BASE_URL}/stocks/search_bar`;
@@ -263,6 +326,8 @@ export const logoutUser = async (userId: string) => {
     } catch (error) {
         console.error("Error logging out user:", error);
         throw error;
+    } finally {
+        localStorage.removeItem(SESSION_TOKEN_KEY);
     }
 }
 
@@ -353,10 +418,12 @@ export const getDailyPortfolioChange = async (userId: string) => {
     }
 }
 
-export const addFunds = async (userId: string, amount: number) => {
+export const addFunds = async (userId: string, amount: number, idempotencyKey: string = crypto.randomUUID()) => {
     try {
         const url = `${API_BASE_URL}/user/add_funds`;
-        const response = await axios.post(url, { user_id: userId, amount: amount });
+        const response = await axios.post(url, { user_id: userId, amount: amount }, {
+            headers: { 'Idempotency-Key': idempotencyKey }
+        });
         return response.data;
     } catch (error) {
         console.error("Error adding funds:", error);
@@ -364,10 +431,12 @@ export const addFunds = async (userId: string, amount: number) => {
     }
 }
 
-export const withdrawFunds = async (userId: string, amount: number) => {
+export const withdrawFunds = async (userId: string, amount: number, idempotencyKey: string = crypto.randomUUID()) => {
     try {
         const url = `${API_BASE_URL}/user/withdraw_funds`;
-        const response = await axios.post(url, { user_id: userId, amount: amount });
+        const response = await axios.post(url, { user_id: userId, amount: amount }, {
+            headers: { 'Idempotency-Key': idempotencyKey }
+        });
         return response.data;
     } catch (error) {
         console.error("Error withdrawing funds:", error);
@@ -2,7 +2,7 @@ import { useState, useEffect } from 'react';
 import { useLocation } from 'react-router-dom';
 import RouteComponent from './RouteComponent';
 import NavigationBar from './navigation_bar/NavigationBar';
-import { checkLoginStatus } from './Api';
+import { checkLoginStatus, SESSION_TOKEN_KEY } from './Api';
 import { getUserRole } from './Api';
 import axios from 'axios';
 
@@ -61,6 +61,7 @@ function App() {
         } catch (error) {
             if (axios.isAxiosError(error) && error.response && error.response.status === 404) {
                 localStorage.removeItem('user_id');
+                localStorage.removeItem(SESSION_TOKEN_KEY);
             }
             
             setIsSignedIn(false);
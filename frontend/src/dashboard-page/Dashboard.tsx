@@ -11,7 +11,8 @@ import {
     getPortfolio,
     getUserBalance,
     // 1. Import the new API function
-    getDailyPortfolioChange
+    getDailyPortfolioChange,
+    subscribePriceStream
 } from "../Api";
 
 interface StockData {
@@ -214,6 +215,27 @@ const Dashboard = () => {
         fetchAllData();
     }, [user_id]);
 
+    // Live prices for the gainers and losers on screen, pushed by /stocks/stream
+    // instead of refetching the lists.
+    const streamedSymbols = [...topLosers, ...topGainers].map(stock => stock.symbol).join(',');
+
+    useEffect(() => {
+        if (!streamedSymbols) return;
+
+        const source = subscribePriceStream((prices) => {
+            const quotes = new Map(prices.map((quote: any) => [String(quote.stock_id), quote]));
+            const applyQuotes = (stocks: StockData[]) => stocks.map(stock => {
+                const quote = quotes.get(stock.stock_id);
+                if (!quote) return stock;
+                return { ...stock, price: Number(quote.price), previous_price: Number(quote.previous_price) };
+            });
+            setTopLosers(applyQuotes);
+            setTopGainers(applyQuotes);
+        }, streamedSymbols.split(','));
+
+        return () => source.close();
+    }, [streamedSymbols]);
+
     // 🎨 NEW LOGIC: Determine the color class based on the daily change value
     const dailyChangeColorClass = dailyChange > 0 ? 'text-success' : dailyChange < 0 ? 'text-danger' : 'text-muted';
 
@@ -1,7 +1,7 @@
 import React, { useState, useEffect, type ChangeEvent, type FormEvent } from "react";
 import { Card, Form, Button, Alert, ListGroup, Row, Col, Modal } from "react-bootstrap";
 import { useNavigate } from "react-router-dom"; 
-import { deleteUser, updateUserProfile, getFullWishlist, removeFromWishlist, logoutUser } from "../Api"; 
+import { deleteUser, updateUserProfile, getFullWishlist, removeFromWishlist, logoutUser, SESSION_TOKEN_KEY } from "../Api"; 
 
 type WishlistItem = { 
     stock_id: string; 
@@ -136,6 +136,7 @@ const ProfilePage: React.FC = () => {
             await deleteUser(userId);
             setWishlist([]);
             localStorage.removeItem("user_id");
+            localStorage.removeItem(SESSION_TOKEN_KEY);
             navigate("/Home"); 
         } catch (error) {
             setStatusMessage("Failed to delete user account.");
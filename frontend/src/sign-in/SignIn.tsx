@@ -1,7 +1,7 @@
 import { Button, Card, Container, Form, Alert, Row, Col } from "react-bootstrap";
 import { useState } from "react";
 import { Link, useNavigate } from "react-router-dom";
-import { loginUser } from "../Api"; 
+import { loginUser, SESSION_TOKEN_KEY } from "../Api"; 
 import axios from "axios";
 import "./SignIn.css";
 
@@ -76,6 +76,9 @@ const SignIn = () => {
 
             if (userId) {
                 localStorage.setItem('user_id', userId);
+                if (response.token) {
+                    localStorage.setItem(SESSION_TOKEN_KEY, response.token);
+                }
             } else {
                 throw new Error("Login successful, but user ID was missing from the response.");
             }
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import Transactions from './Transactions';
 import { getUserTransactions } from '../Api'; // Import the new API function
-import { Container, Spinner, Alert } from 'react-bootstrap'; 
+import { Container, Spinner, Alert, Button } from 'react-bootstrap'; 
 
 // Define the structure for a transaction item
 interface TransactionItem {
@@ -30,6 +30,8 @@ const TransactionsPage = () => {
     const [transactions, setTransactions] = useState<TransactionItem[]>([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState<string | null>(null);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     // Helper function to map raw API data to the component's required interface
     const mapToTransactionItem = (rawItem: RawTransaction): TransactionItem => {
@@ -72,6 +74,7 @@ const TransactionsPage = () => {
                     // Map the raw backend response to the clean frontend interface
                     const mappedTransactions = rawTransactions.map(mapToTransactionItem);
                     setTransactions(mappedTransactions);
+                    setNextCursor(data.next_cursor || null);
                 } else {
                     setTransactions([]);
                 }
@@ -87,6 +90,24 @@ const TransactionsPage = () => {
         fetchTransactions();
     }, []);
 
+    const loadMore = async () => {
+        const userId = localStorage.getItem("user_id");
+        if (!userId || !nextCursor) return;
+
+        setLoadingMore(true);
+        try {
+            const data = await getUserTransactions(userId, nextCursor);
+            const rawTransactions: RawTransaction[] = data.transactions || [];
+            setTransactions((current) => [...current, ...rawTransactions.map(mapToTransactionItem)]);
+            setNextCursor(data.next_cursor || null);
+        } catch (err) {
+            console.error("Failed to fetch more transactions:", err);
+            setError("Failed to load transaction history.");
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     if (loading) {
         return (
             <Container className="py-5 text-center">
@@ -131,6 +152,13 @@ const TransactionsPage = () => {
                     totalAmount={share.totalAmount}
                 />
             ))}
+            {nextCursor && (
+                <div className='text-center mt-3'>
+                    <Button variant='outline-secondary' onClick={loadMore} disabled={loadingMore}>
+                        {loadingMore ? 'Loading...' : 'Load more'}
+                    </Button>
+                </div>
+            )}
         </Container>
     )
 }
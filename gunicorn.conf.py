@@ -0,0 +1,24 @@
+import os
+
+# APP_SERVER picks the serving path at deploy time:
+#   wsgi (default) - the Flask app on gunicorn's threaded workers
+#   asgi           - backend/asgi.py on uvicorn workers; snapshot reads, price
+#                    streams and user summaries run on the event loop
+APP_SERVER = os.getenv("APP_SERVER", "wsgi")
+
+if APP_SERVER == "asgi":
+    wsgi_app = "backend.asgi:app"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "backend.wsgi:app"
+    # Each open /stocks/stream holds a thread for as long as the client stays
+    # connected, so a worker serves at most WEB_THREADS streams and requests
+    # together. The gthread worker heartbeats the arbiter from its own loop,
+    # so long-lived streams are not killed by the worker timeout.
+    worker_class = "gthread"
+    threads = int(os.getenv("WEB_THREADS", "64"))
+    # Accepted connections per worker, including idle keep-alives; past this
+    # a new connection waits for one to close, so keep it above threads.
+    worker_connections = threads * 2
+
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
@@ -0,0 +1,43 @@
+"""
+Makes the missing thumbnails of logos moved by migration 010.
+
+    export DATABASE_URL=postgresql://localhost/cloudex
+    python scripts/backfill_logo_thumbnails.py --batch-size 100
+
+Migration 010 moves inline logos into stock_logos without thumbnails, and
+each one is otherwise made on its first thumbnail request. Run this once
+after the migration so those requests do not decode full images. It works
+through the logos in hash order and commits after each batch, so it can be
+stopped and run again. Logos that cannot be decoded keep no thumbnail and
+are served in full, as before.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.stock.logos import fill_missing_thumbnails  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=100, help="logos per transaction")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    after, made = "", 0
+    while True:
+        last, batch_made = fill_missing_thumbnails(after, args.batch_size)
+        if last is None:
+            break
+        after = last
+        made += batch_made
+        print(f"made {made} thumbnails so far (up to {after[:12]})")
+
+    print(f"done: {made} thumbnails made in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Per-request auth overhead: session token verification against the database
+lookups it replaces (check_login_status + getUserRoleByUserId).
+
+    python scripts/benchmarks/bench_auth.py
+    python scripts/benchmarks/bench_auth.py --db --user-id 1
+
+Token timings run in-process and need no database. "cold" is the first
+verification of each token (signature check); "warm" is a repeat request
+served from the verified-token cache. --db also times the old lookups against
+the configured database.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+os.environ.setdefault("SESSION_SECRET", "benchmark-secret")
+
+from backend.auth import session_tokens  # noqa: E402
+
+
+def report(label, timings):
+    timings.sort()
+    total = sum(timings)
+    print(
+        f"{label}: {len(timings) / total:,.0f} checks/s  "
+        f"p50 {timings[len(timings) // 2] * 1e6:.1f} us  p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f} us"
+    )
+
+
+def time_each(func, args_list):
+    timings = []
+    for args in args_list:
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--db", action="store_true", help="also time the is_logged_in and role queries")
+    parser.add_argument("--user-id", type=int, default=1)
+    args = parser.parse_args()
+
+    tokens = [session_tokens.issue_token(user_id, "user") for user_id in range(args.requests)]
+    report("token, cold", time_each(session_tokens.verify_token, [(t,) for t in tokens]))
+    report("token, warm", time_each(session_tokens.verify_token, [(t,) for t in tokens]))
+
+    if args.db:
+        from backend.auth.auth_repo import check_login_status, getUserRoleByUserId
+
+        def lookup(user_id):
+            check_login_status(user_id)
+            getUserRoleByUserId(user_id)
+
+        rounds = min(args.requests, 2000)
+        report("db lookups", time_each(lookup, [(args.user_id,)] * rounds))
+
+
+if __name__ == "__main__":
+    main()
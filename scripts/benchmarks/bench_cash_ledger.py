@@ -0,0 +1,100 @@
+"""
+Contention on one account: N concurrent single-share orders for the same user.
+
+    python scripts/benchmarks/bench_cash_ledger.py --user-id 1 --stock-ids 1,2,3,4
+    python scripts/benchmarks/bench_cash_ledger.py --user-id 1 --stock-ids 1,2,3,4 --mode row-lock
+
+`ledger` (the default) runs buy_sell_stock. Each order locks only its position
+row, and buys also take the account's debit lock for their last few
+statements. `row-lock` replays the previous statements, which lock the user's
+row with FOR UPDATE for the whole transaction. Those transactions are rolled
+back so they leave the ledger untouched. Orders alternate BUY and SELL across
+the given stocks, and --sell-ratio controls the mix.
+
+Use a test account with enough cash and shares. The ledger mode commits real
+trades.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+
+def row_lock_order(db, user_id, stock_id, transaction_type, price):
+    """The pre-ledger buy_sell_stock transaction, rolled back at the end."""
+    with db.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT balance FROM cloudex_users WHERE user_id = %s FOR UPDATE;", (user_id,))
+        balance = cursor.fetchone()[0]
+        cursor.execute("SELECT total_shares, average_cost FROM portfolio WHERE user_id = %s AND stock_id = %s;", (user_id, stock_id))
+        cursor.fetchone()
+        change = -price if transaction_type == 'BUY' else price
+        cursor.execute("UPDATE cloudex_users SET balance = %s WHERE user_id = %s;", (balance + change, user_id))
+        cursor.execute("""
+            INSERT INTO transaction_history
+                (user_id, stock_id, shares, price_per_share, transaction_type, fee_amount, executed_at)
+            VALUES (%s, %s, 1, %s, %s, 0, NOW());
+        """, (user_id, stock_id, price, transaction_type))
+        conn.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--stock-ids", required=True, help="comma-separated stock ids to trade")
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--sell-ratio", type=float, default=0.5)
+    parser.add_argument("--mode", choices=("ledger", "row-lock"), default="ledger")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DB_POOL_MAX", str(args.concurrency))
+    from backend import db
+    from backend.stock.stock_repo import buy_sell_stock, get_stock_price
+
+    stock_ids = [int(s) for s in args.stock_ids.split(",") if s]
+    prices = {stock_id: Decimal(str(get_stock_price(stock_id))) for stock_id in stock_ids}
+    sell_every = round(1 / args.sell_ratio) if args.sell_ratio > 0 else 0
+    plan = [
+        (stock_ids[i % len(stock_ids)], 'SELL' if sell_every and i % sell_every == 0 else 'BUY')
+        for i in range(args.orders)
+    ]
+    # The first wave of orders is released together.
+    wave = min(args.orders, args.concurrency)
+    start = threading.Barrier(wave)
+    errors = []
+
+    def one_order(index):
+        stock_id, transaction_type = plan[index]
+        if index < wave:
+            start.wait()
+        began = time.perf_counter()
+        try:
+            if args.mode == "ledger":
+                buy_sell_stock(args.user_id, stock_id, 1, prices[stock_id], 0, transaction_type)
+            else:
+                row_lock_order(db, args.user_id, stock_id, transaction_type, prices[stock_id])
+        except Exception as e:
+            errors.append(str(e))
+        return time.perf_counter() - began
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        timings = sorted(pool.map(one_order, range(len(plan))))
+    wall = time.perf_counter() - started
+
+    print(
+        f"{args.mode:<9} orders {args.orders}  concurrency {args.concurrency}  "
+        f"orders/s {args.orders / wall:8.1f}  p50 {timings[len(timings) // 2] * 1000:.1f} ms  "
+        f"p99 {timings[int(len(timings) * 0.99)] * 1000:.1f} ms  errors {len(errors)}"
+    )
+    if errors:
+        print(f"first error: {errors[0]}")
+
+
+if __name__ == "__main__":
+    main()
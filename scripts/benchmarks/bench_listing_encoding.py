@@ -0,0 +1,84 @@
+"""
+Response size and encode time of /stocks/all payloads by shape and encoder.
+
+    python scripts/benchmarks/bench_listing_encoding.py --rows 10000
+
+Builds a market snapshot of synthetic listings, then encodes each listing
+shape (all fields or --fields, as rows or as columns) with Flask's default
+JSON provider and with the orjson provider the app uses. No database is
+needed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from backend.json_provider import OrjsonProvider  # noqa: E402
+from backend.stock.market_snapshot import LISTING_COLUMNS, MarketSnapshot  # noqa: E402
+from bench_stock_search import make_rows  # noqa: E402
+
+
+def make_snapshot(count, rng):
+    rows = []
+    for stock_id, symbol, name in make_rows(count, rng):
+        price = Decimal(f"{rng.uniform(5, 500):.2f}")
+        rows.append((
+            stock_id, name, symbol, price,
+            f"{name} trades as {symbol}. " * 4,
+            Decimal(f"{float(price) * rng.uniform(0.95, 1.05):.2f}"),
+            f"/stocks/logo/{rng.getrandbits(256):064x}",
+            True, Decimal("0.002000"), Decimal("0.000100"),
+        ))
+    return MarketSnapshot(list(LISTING_COLUMNS), rows, 1)
+
+
+def time_encode(app, payload, repeat):
+    timings = []
+    with app.app_context():
+        for _ in range(repeat):
+            began = time.perf_counter()
+            body = app.json.response(payload).get_data()
+            timings.append(time.perf_counter() - began)
+    timings.sort()
+    return len(body), timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--fields", default="stock_id,symbol,price,previous_price")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    snapshot = make_snapshot(args.rows, random.Random(401))
+    fields = tuple(args.fields.split(","))
+
+    apps = {}
+    for label, provider in (("default", DefaultJSONProvider), ("orjson", OrjsonProvider)):
+        apps[label] = Flask(label)
+        apps[label].json = provider(apps[label])
+
+    print(f"{args.rows} rows; projected fields: {args.fields}")
+    print(f"{'shape':<16} {'encoder':<8} {'bytes':>11} {'encode p50 ms':>14}")
+    for shape, shape_fields, fmt in (
+        ("all rows", None, "rows"),
+        ("all columns", None, "columns"),
+        ("fields rows", fields, "rows"),
+        ("fields columns", fields, "columns"),
+    ):
+        columns, stocks, _ = snapshot.listing(shape_fields, fmt)
+        payload = {"status": "success", "format": fmt, "columns": columns, "stocks": stocks}
+        for label, app in apps.items():
+            size, p50 = time_encode(app, payload, args.repeat)
+            print(f"{shape:<16} {label:<8} {size:>11,} {p50 * 1000:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Micro-benchmark for the in-memory limit order book.
+
+    python scripts/benchmarks/bench_order_book.py
+    python scripts/benchmarks/bench_order_book.py --orders 50000,200000 --stocks 500
+
+Rests the given number of orders across the stocks with limits spread around
+each stock's price, cancels a fraction of them, then runs random-walk price
+ticks through the books. Only the in-memory structures are timed; filling
+triggered orders against Postgres is not part of this benchmark.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from backend.stock.order_book import LimitOrder, OrderBooks  # noqa: E402
+
+
+def make_orders(count, prices, rng):
+    stock_ids = list(prices)
+    orders = []
+    for order_id in range(1, count + 1):
+        stock_id = rng.choice(stock_ids)
+        side = rng.choice(("BUY", "SELL"))
+        # Bids below the market and asks above it, so they rest until the
+        # price walks into them.
+        offset = Decimal(f"{rng.uniform(0.001, 0.05):.4f}") * prices[stock_id]
+        limit = prices[stock_id] - offset if side == "BUY" else prices[stock_id] + offset
+        orders.append(LimitOrder(order_id, rng.randint(1, 1000), stock_id, side, Decimal(1), limit.quantize(Decimal("0.01")), Decimal(0)))
+    return orders
+
+
+def walk(prices, rng, volatility):
+    for stock_id, price in prices.items():
+        prices[stock_id] = (price * Decimal(1 + rng.uniform(-volatility, volatility))).quantize(Decimal("0.01"))
+    return list(prices.items())
+
+
+def run(order_count, stock_count, cancel_ratio, ticks, volatility, rng):
+    prices = {stock_id: Decimal(f"{rng.uniform(10, 500):.2f}") for stock_id in range(1, stock_count + 1)}
+    orders = make_orders(order_count, prices, rng)
+    books = OrderBooks()
+
+    started = time.perf_counter()
+    for order in orders:
+        books.add(order)
+    insert_s = time.perf_counter() - started
+
+    cancels = rng.sample([order.order_id for order in orders], int(order_count * cancel_ratio))
+    started = time.perf_counter()
+    for order_id in cancels:
+        books.cancel(order_id)
+    cancel_s = time.perf_counter() - started
+
+    tick_timings = []
+    matched = 0
+    for _ in range(ticks):
+        batch = walk(prices, rng, volatility)
+        started = time.perf_counter()
+        matched += len(books.match(batch))
+        tick_timings.append(time.perf_counter() - started)
+
+    print(
+        f"{order_count:>8} orders / {stock_count} stocks  "
+        f"insert {order_count / insert_s:>10,.0f}/s  "
+        f"cancel {max(len(cancels), 1) / max(cancel_s, 1e-9):>10,.0f}/s  "
+        f"match per tick avg {sum(tick_timings) / ticks * 1000:6.2f} ms, max {max(tick_timings) * 1000:6.2f} ms  "
+        f"({matched} filled, {books.open_count()} resting)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", default="10000,50000,200000")
+    parser.add_argument("--stocks", type=int, default=200)
+    parser.add_argument("--cancel-ratio", type=float, default=0.2)
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--volatility", type=float, default=0.01)
+    args = parser.parse_args()
+
+    rng = random.Random(401)
+    for count in (int(s) for s in args.orders.split(",")):
+        run(count, args.stocks, args.cancel_ratio, args.ticks, args.volatility, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Login password checks per second through the bounded bcrypt pool.
+
+    python scripts/benchmarks/bench_passwords.py
+    BCRYPT_ROUNDS=10 PASSWORD_WORKERS=4 python scripts/benchmarks/bench_passwords.py --clients 64
+
+Each client thread checks a password in a loop, like a web worker handling
+logins. Checks that find the pool and its queue full are counted as rejected
+(a 503 in the app) and the client backs off briefly.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from backend.auth import passwords  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    stored_hash = passwords.hash_password("correct horse battery staple")
+    deadline = time.monotonic() + args.duration
+    checked = []
+    rejected = []
+    lock = threading.Lock()
+
+    def client():
+        ok = busy = 0
+        while time.monotonic() < deadline:
+            try:
+                passwords.check_password("correct horse battery staple", stored_hash)
+                ok += 1
+            except passwords.PasswordHasherBusy:
+                busy += 1
+                time.sleep(0.01)
+        with lock:
+            checked.append(ok)
+            rejected.append(busy)
+
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    cores = min(passwords.PASSWORD_WORKERS, os.cpu_count() or 1)
+    rate = sum(checked) / elapsed
+    print(
+        f"rounds {passwords.BCRYPT_ROUNDS}  workers {passwords.PASSWORD_WORKERS}  "
+        f"queue {passwords.PASSWORD_QUEUE_LIMIT}  clients {args.clients}  cores used {cores}"
+    )
+    print(f"{rate:,.1f} logins/s  {rate / cores:,.1f} logins/s per core  rejected {sum(rejected)}")
+
+
+if __name__ == "__main__":
+    main()
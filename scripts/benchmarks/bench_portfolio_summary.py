@@ -0,0 +1,105 @@
+"""
+Compares GET /user/<id>/summary with the five requests the dashboard used to
+make (get_portfolio, user_stocks, get_user_balance, daily_portfolio_change,
+full_wishlist) against a running server.
+
+    python scripts/benchmarks/bench_portfolio_summary.py --user-id 1
+    python scripts/benchmarks/bench_portfolio_summary.py --user-id 1 --concurrency 16 --rounds 200
+
+Each "round" is one dashboard load. The fan-out is issued sequentially, the way
+one client would, unless --parallel is given.
+"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+FAN_OUT = [
+    "/user/get_portfolio?user_id={user_id}",
+    "/user/user_stocks?user_id={user_id}",
+    "/user/get_user_balance?user_id={user_id}",
+    "/user/daily_portfolio_change?user_id={user_id}",
+    "/user/full_wishlist?user_id={user_id}",
+]
+SUMMARY = "/user/{user_id}/summary"
+
+_local = threading.local()
+
+
+def get(base, path):
+    parts = urlsplit(base)
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        conn = _local.conn = conn_cls(parts.netloc, timeout=30)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        body = response.read()
+    except (http.client.HTTPException, OSError):
+        _local.conn = None
+        raise
+    if response.status != 200:
+        raise RuntimeError(f"{path}: HTTP {response.status}")
+    return len(body)
+
+
+def load_fan_out(base, user_id, parallel, pool):
+    paths = [path.format(user_id=user_id) for path in FAN_OUT]
+    if parallel:
+        return sum(pool.map(lambda path: get(base, path), paths))
+    return sum(get(base, path) for path in paths)
+
+
+def load_summary(base, user_id, parallel, pool):
+    return get(base, SUMMARY.format(user_id=user_id))
+
+
+def run(name, load, args):
+    timings = []
+    size = 0
+    inner = ThreadPoolExecutor(max_workers=len(FAN_OUT)) if args.parallel else None
+
+    def one_round(_):
+        started = time.perf_counter()
+        body_size = load(args.url, args.user_id, args.parallel, inner)
+        return time.perf_counter() - started, body_size
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for elapsed, body_size in pool.map(one_round, range(args.rounds)):
+            timings.append(elapsed)
+            size = body_size
+    wall = time.perf_counter() - started
+
+    timings.sort()
+    print(
+        f"{name:<10} loads/s {args.rounds / wall:8.1f}  "
+        f"p50 {statistics.median(timings) * 1000:7.1f} ms  "
+        f"p95 {timings[int(len(timings) * 0.95) - 1] * 1000:7.1f} ms  "
+        f"bytes/load {size}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--parallel", action="store_true", help="issue the five fan-out requests concurrently")
+    args = parser.parse_args()
+
+    # Warm the server's pool and snapshot before timing.
+    load_summary(args.url, args.user_id, False, None)
+    load_fan_out(args.url, args.user_id, False, None)
+
+    run("fan-out", load_fan_out, args)
+    run("summary", load_summary, args)
+
+
+if __name__ == "__main__":
+    main()
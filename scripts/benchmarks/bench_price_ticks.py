@@ -0,0 +1,89 @@
+"""
+Benchmark for the price tick engine.
+
+    python scripts/benchmarks/bench_price_ticks.py            # generation only
+    python scripts/benchmarks/bench_price_ticks.py --db       # also apply against Postgres
+
+With --db the UPDATE runs against a temporary `stocks` table (temp tables
+shadow the real one inside the session) and the transaction is rolled back,
+so it is safe to point at a development database.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from backend import db  # noqa: E402
+from backend.stock.price_engine import generate_ticks, apply_ticks  # noqa: E402
+
+
+def make_stocks(count, rng):
+    return [
+        (stock_id, Decimal(f"{rng.uniform(1, 500):.2f}"), None, None)
+        for stock_id in range(1, count + 1)
+    ]
+
+
+def bench_generate(stocks, rng, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        generate_ticks(stocks, rng)
+    elapsed = (time.perf_counter() - started) / rounds
+    return elapsed
+
+
+def bench_apply(stocks, rng, rounds):
+    timings = []
+    with db.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TEMP TABLE stocks (
+                stock_id INTEGER PRIMARY KEY,
+                price NUMERIC(12, 2),
+                previous_price NUMERIC(12, 2),
+                volatility NUMERIC(8, 6),
+                drift NUMERIC(8, 6)
+            ) ON COMMIT DROP;
+        """)
+        cursor.execute("""
+            INSERT INTO stocks (stock_id, price, previous_price)
+            SELECT g, 100, 100 FROM generate_series(1, %s) AS g;
+        """, (len(stocks),))
+
+        for _ in range(rounds):
+            ticks = generate_ticks(stocks, rng)
+            started = time.perf_counter()
+            apply_ticks(cursor, ticks)
+            timings.append(time.perf_counter() - started)
+
+        conn.rollback()
+    return sum(timings) / len(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--db", action="store_true", help="also time the set-based UPDATE against Postgres")
+    args = parser.parse_args()
+
+    rng = random.Random(401)
+    for size in (int(s) for s in args.sizes.split(",")):
+        stocks = make_stocks(size, rng)
+
+        generate_s = bench_generate(stocks, rng, args.rounds)
+        line = f"{size:>8} symbols  generate {generate_s * 1000:8.1f} ms  ({size / generate_s:>12,.0f} ticks/s)"
+
+        if args.db:
+            apply_s = bench_apply(stocks, rng, args.rounds)
+            total = generate_s + apply_s
+            line += f"  apply {apply_s * 1000:8.1f} ms  total {size / total:>12,.0f} ticks/s"
+
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Queries run and caller latency for bursts of identical reads, with and
+without single-flight coalescing.
+
+    python scripts/benchmarks/bench_single_flight.py --callers 200 --query-ms 20
+
+Simulates the moment a tick lands. In each burst, --callers threads ask for
+the same listing at once. The query is a sleep of --query-ms, limited to
+--pool-size at a time as by the connection pool. No database is needed.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from backend import single_flight  # noqa: E402
+
+
+def run(callers, bursts, query_seconds, pool_size, coalesce):
+    pool = threading.BoundedSemaphore(pool_size)
+    queries = 0
+    queries_lock = threading.Lock()
+
+    def get_top_gainers():
+        nonlocal queries
+        with pool:
+            with queries_lock:
+                queries += 1
+            time.sleep(query_seconds)
+            return [(1, "ABC", "Abc Corp", 10, 9, 11.1)]
+
+    read = single_flight.single_flight(get_top_gainers) if coalesce else get_top_gainers
+    timings = []
+    timings_lock = threading.Lock()
+
+    def caller(barrier):
+        barrier.wait()
+        began = time.perf_counter()
+        read()
+        with timings_lock:
+            timings.append(time.perf_counter() - began)
+
+    for _ in range(bursts):
+        barrier = threading.Barrier(callers)
+        threads = [threading.Thread(target=caller, args=(barrier,)) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    timings.sort()
+    return queries, timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, default=200)
+    parser.add_argument("--bursts", type=int, default=10)
+    parser.add_argument("--query-ms", type=float, default=20)
+    parser.add_argument("--pool-size", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{args.bursts} bursts of {args.callers} identical calls; query {args.query_ms:g} ms, pool {args.pool_size}")
+    for label, coalesce in (("separate", False), ("coalesced", True)):
+        queries, p50, p99 = run(args.callers, args.bursts, args.query_ms / 1000, args.pool_size, coalesce)
+        print(f"{label:<10} queries {queries:>6}  p50 {p50 * 1000:8.2f} ms  p99 {p99 * 1000:8.2f} ms")
+    counts = single_flight.stats()["get_top_gainers"]
+    print(f"collapsed {counts['collapsed']} of {counts['calls']} calls; at most {counts['max_waiters']} waiters on one query")
+
+
+if __name__ == "__main__":
+    main()
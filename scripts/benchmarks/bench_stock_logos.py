@@ -0,0 +1,98 @@
+"""
+/stocks/all payload and latency with inline logos versus logo URLs.
+
+    python scripts/benchmarks/bench_stock_logos.py --stocks 1000
+
+Builds two market snapshots over the same synthetic listings. In the first,
+every row carries its logo inline as a base64 data URL in image_data, as
+rows did before logos moved to stock_logos. In the second, rows carry
+/stocks/logo/<hash> instead. The script then requests /stocks/all through the
+Flask app for each and reports body size and latency. No database is needed.
+"""
+import argparse
+import base64
+import hashlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+os.environ.setdefault("MARKET_SNAPSHOT_TTL_SECONDS", "3600")
+os.environ.setdefault("SESSION_SECRET", "benchmark-secret")
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from backend.app import app  # noqa: E402
+from backend.stock import market_snapshot  # noqa: E402
+from backend.stock.logos import make_thumbnail  # noqa: E402
+from bench_stock_search import make_rows  # noqa: E402
+
+COLUMNS = ["stock_id", "company_name", "symbol", "price", "description", "previous_price",
+           "image_data", "is_tradable", "volatility", "drift"]
+
+
+def make_logo(rng, px):
+    image = Image.new("RGB", (px, px), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        x, y = rng.randrange(px), rng.randrange(px)
+        r = rng.randrange(px // 8, px // 3)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    draw.text((px // 10, px // 2), "LOGO", fill=(255, 255, 255))
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def measure(client, requests):
+    timings = []
+    size = 0
+    for _ in range(requests):
+        began = time.perf_counter()
+        response = client.get("/stocks/all")
+        body = response.get_data()
+        timings.append(time.perf_counter() - began)
+        size = len(body)
+    timings.sort()
+    return size, timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stocks", type=int, default=1000)
+    parser.add_argument("--logo-px", type=int, default=256, help="side of the synthetic uploaded logos")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(401)
+    inline_rows, url_rows = [], []
+    thumbnail_bytes = 0
+    for stock_id, symbol, name in make_rows(args.stocks, rng):
+        logo = make_logo(rng, args.logo_px)
+        thumbnail_bytes += len(make_thumbnail(Image.open(io.BytesIO(logo))))
+        price = round(rng.uniform(5, 500), 2)
+        common = (stock_id, name, symbol, price, f"{name} ({symbol})", price)
+        inline_rows.append(common + ("data:image/png;base64," + base64.b64encode(logo).decode(), True, None, None))
+        url_rows.append(common + ("/stocks/logo/" + hashlib.sha256(logo).hexdigest(), True, None, None))
+
+    client = app.test_client()
+    results = {}
+    for label, rows, columns in (
+        ("inline", inline_rows, COLUMNS),
+        ("logo_url", url_rows, COLUMNS[:6] + ["logo_url"] + COLUMNS[7:]),
+    ):
+        market_snapshot.install(market_snapshot.MarketSnapshot(columns, rows, 1))
+        measure(client, 3)
+        results[label] = measure(client, args.requests)
+        size, p50, p95 = results[label]
+        print(f"{label:<9} stocks {args.stocks}  body {size / 1024:10.1f} KiB  p50 {p50 * 1000:8.2f} ms  p95 {p95 * 1000:8.2f} ms")
+
+    (old_size, old_p50, _), (new_size, new_p50, _) = results["inline"], results["logo_url"]
+    print(f"body {old_size / new_size:.0f}x smaller, p50 {old_p50 / new_p50:.0f}x faster; "
+          f"thumbnails average {thumbnail_bytes / args.stocks / 1024:.1f} KiB, fetched once per client")
+
+
+if __name__ == "__main__":
+    main()
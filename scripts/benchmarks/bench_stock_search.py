@@ -0,0 +1,79 @@
+"""
+Benchmark for the in-memory stock search index.
+
+Builds an index over synthetic listings and replays search-bar keystrokes
+(each prefix of a symbol or company name, plus some typos) against it.
+
+    python scripts/benchmarks/bench_stock_search.py --symbols 50000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from backend.stock.search_index import SearchIndex  # noqa: E402
+
+WORDS = [
+    "Acme", "Global", "Pacific", "Quantum", "Solar", "United", "Atlas", "Nova", "Apex", "Blue",
+    "River", "Summit", "Vertex", "Iron", "Silver", "Harbor", "Pioneer", "Northern", "Crest", "Delta",
+]
+SUFFIXES = ["Corp", "Inc", "Holdings", "Group", "Systems", "Energy", "Labs", "Capital", "Foods", "Motors"]
+
+
+def make_rows(count, rng):
+    symbols = set()
+    while len(symbols) < count:
+        symbols.add("".join(rng.choices(string.ascii_uppercase, k=rng.randint(2, 5))))
+    return [
+        (stock_id, symbol, f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(SUFFIXES)}")
+        for stock_id, symbol in enumerate(sorted(symbols), start=1)
+    ]
+
+
+def make_queries(rows, count, rng):
+    queries = []
+    while len(queries) < count:
+        _, symbol, name = rng.choice(rows)
+        target = symbol if rng.random() < 0.6 else name
+        queries.extend(target[:i] for i in range(1, len(target) + 1))
+        if rng.random() < 0.2:
+            typo = list(target)
+            typo[rng.randrange(len(typo))] = rng.choice(string.ascii_lowercase)
+            queries.append("".join(typo))
+    return queries[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(401)
+    rows = make_rows(args.symbols, rng)
+
+    started = time.perf_counter()
+    index = SearchIndex(rows)
+    print(f"built index over {len(rows)} listings in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    queries = make_queries(rows, args.queries, rng)
+    for label, limit, include_names in (("search bar (symbol + name, top 5)", 5, True), ("trade search (symbol, top 3)", 3, False)):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query, limit, include_names)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        total = sum(timings)
+        print(
+            f"{label}: {len(queries) / total:,.0f} queries/s  "
+            f"p50 {timings[len(timings) // 2] * 1e6:.0f} us  p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
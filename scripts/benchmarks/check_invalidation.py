@@ -0,0 +1,237 @@
+"""
+Checks that cache invalidations reach every worker, and how quickly.
+
+    export DATABASE_URL=postgresql://localhost/cloudex_bench
+    python scripts/benchmarks/check_invalidation.py --workers 4 --rounds 20
+
+Starts --workers processes, each running the invalidation listener as a
+gunicorn worker would. For every channel, each round sends one message
+through backend.invalidation (a logout goes through revoke_token()) and waits
+until every worker has applied it. It then checks the cache the message
+targets: the market snapshot is stale, the conditional GET version has moved,
+or the token is rejected. The report gives p50 and max delivery latency per
+channel, measured from just before the sending transaction.
+
+Next, every listener connection is killed with pg_terminate_backend. The
+script checks that each worker reconnects, drops its caches, and receives
+messages again.
+
+Any database works, because NOTIFY needs no tables. The script exits with
+status 1 if a message is missed, or if the slowest delivery takes longer
+than --max-latency-ms.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+os.environ.setdefault("SESSION_SECRET", "check-invalidation")
+# Only messages may make the caches stale during the check.
+os.environ["MARKET_SNAPSHOT_TTL_SECONDS"] = "3600"
+
+CHANNELS = ("stocks_changed", "price_tick", "calendar_changed", "user_changed", "session_revoked")
+
+
+def _wait(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def worker(index, commands, results, timeout):
+    from backend import conditional, invalidation
+    from backend.auth import session_tokens
+    from backend.stock import market_snapshot
+    from backend.stock.market_snapshot import LISTING_COLUMNS, MarketSnapshot
+
+    listener = invalidation.listener
+    invalidation.ensure_started()
+
+    def fresh_snapshot():
+        market_snapshot.install(MarketSnapshot(list(LISTING_COLUMNS), [], 0))
+
+    def state(channel, payload):
+        if channel in ("stocks_changed", "price_tick"):
+            return market_snapshot.is_stale(market_snapshot.peek())
+        if channel == "calendar_changed":
+            return conditional.version(payload)
+        if channel == "user_changed":
+            return conditional.version(conditional.user_scope(payload))
+        try:
+            session_tokens.verify_token(payload)
+            return "valid"
+        except session_tokens.InvalidSession:
+            return "revoked"
+
+    before = None
+    while True:
+        command = commands.get()
+        kind = command[0]
+        if kind == "stop":
+            return
+
+        if kind == "ready":
+            ok = _wait(lambda: listener.connected, timeout)
+            results.put((index, ok, listener.connects))
+
+        elif kind == "prepare":
+            _, channel, payload = command
+            fresh_snapshot()
+            before = state(channel, payload)
+            results.put((index, True, before))
+
+        elif kind == "expect":
+            _, channel, payload, sent_at = command
+            ok = _wait(lambda: listener.applied_at.get(channel, 0) >= sent_at, timeout)
+            latency = listener.applied_at.get(channel, 0) - sent_at
+            after = state(channel, payload)
+            changed = after is True or after == "revoked" or (isinstance(after, int) and after > before)
+            results.put((index, ok and changed, (latency, f"{before!r} -> {after!r}")))
+
+        elif kind == "reconnect":
+            _, connects = command
+            ok = _wait(lambda: listener.connected and listener.connects > connects, timeout)
+            dropped = market_snapshot.is_stale(market_snapshot.peek())
+            results.put((index, ok and dropped, (listener.connects, dropped)))
+
+
+class Workers:
+    def __init__(self, count, timeout):
+        context = multiprocessing.get_context("spawn")
+        self.results = context.Queue()
+        self.commands = [context.Queue() for _ in range(count)]
+        self.processes = [
+            context.Process(target=worker, args=(i, queue, self.results, timeout), daemon=True)
+            for i, queue in enumerate(self.commands)
+        ]
+        self.timeout = timeout
+        for process in self.processes:
+            process.start()
+
+    def ask(self, *command):
+        """Sends command to every worker; returns {worker: (ok, detail)}."""
+        for queue in self.commands:
+            queue.put(command)
+        replies = {}
+        for _ in self.commands:
+            index, ok, detail = self.results.get(timeout=self.timeout + 30)
+            replies[index] = (ok, detail)
+        return replies
+
+    def stop(self):
+        for queue in self.commands:
+            queue.put(("stop",))
+        for process in self.processes:
+            process.join(5)
+
+
+def send(channel, payload):
+    from backend import invalidation
+    from backend.auth import session_tokens
+
+    if channel == "session_revoked":
+        session_tokens.revoke_token(payload)
+    else:
+        invalidation.publish(channel, payload)
+
+
+def payload_for(channel, round_number):
+    from backend.auth import session_tokens
+
+    if channel == "calendar_changed":
+        return "holidays"
+    if channel == "user_changed":
+        return str(1000 + round_number)
+    if channel == "session_revoked":
+        return session_tokens.issue_token(1000 + round_number, "")
+    return str(round_number)
+
+
+def deliver(workers, channel, round_number, failures):
+    payload = payload_for(channel, round_number)
+    workers.ask("prepare", channel, payload)
+    sent_at = time.time()
+    send(channel, payload)
+    latencies = []
+    for index, (ok, (latency, detail)) in sorted(workers.ask("expect", channel, payload, sent_at).items()):
+        if not ok:
+            failures.append(f"{channel} round {round_number}: worker {index} did not apply it ({detail})")
+        else:
+            latencies.append(latency)
+    return latencies
+
+
+def terminate_listeners():
+    from backend import db, invalidation
+
+    with db.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT count(pg_terminate_backend(pid))
+            FROM pg_stat_activity
+            WHERE application_name = %s;
+        """, (invalidation.APPLICATION_NAME,))
+        killed = cursor.fetchone()[0]
+        conn.commit()
+    return killed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=20, help="messages per channel")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds a worker waits for a message")
+    parser.add_argument("--max-latency-ms", type=float, default=250)
+    args = parser.parse_args()
+
+    failures = []
+    workers = Workers(args.workers, args.timeout)
+    try:
+        replies = workers.ask("ready")
+        not_ready = [index for index, (ok, _) in replies.items() if not ok]
+        if not_ready:
+            print(f"workers {not_ready} never connected; is DATABASE_URL set?")
+            return 1
+        connects = max(detail for _, detail in replies.values())
+
+        print(f"{args.workers} workers, {args.rounds} rounds per channel")
+        print(f"{'channel':<18} {'delivered':>10} {'p50 ms':>8} {'max ms':>8}")
+        slowest = 0.0
+        for channel in CHANNELS:
+            latencies = []
+            for round_number in range(args.rounds):
+                latencies += deliver(workers, channel, round_number, failures)
+            latencies.sort()
+            if latencies:
+                slowest = max(slowest, latencies[-1])
+                print(f"{channel:<18} {len(latencies):>10} {latencies[len(latencies) // 2] * 1000:>8.2f} {latencies[-1] * 1000:>8.2f}")
+            else:
+                print(f"{channel:<18} {0:>10}")
+
+        workers.ask("prepare", "stocks_changed", "")
+        killed = terminate_listeners()
+        print(f"terminated {killed} listener connections")
+        for index, (ok, (count, dropped)) in sorted(workers.ask("reconnect", connects).items()):
+            if not ok:
+                failures.append(f"worker {index} did not reconnect and drop its caches (connects {count}, dropped {dropped})")
+        if not deliver(workers, "stocks_changed", args.rounds, failures):
+            failures.append("no message was applied after reconnecting")
+        else:
+            print("all workers reconnected, dropped their caches and received messages again")
+
+        if slowest * 1000 > args.max_latency_ms:
+            failures.append(f"slowest delivery took {slowest * 1000:.1f} ms (limit {args.max_latency_ms:g} ms)")
+    finally:
+        workers.stop()
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
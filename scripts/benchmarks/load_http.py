@@ -0,0 +1,98 @@
+"""
+Closed-loop HTTP load generator for comparing the WSGI and ASGI serving paths.
+
+Each client keeps one keep-alive connection and requests the given paths in
+turn for the duration of the run, then throughput and latency are reported.
+
+    APP_SERVER=wsgi gunicorn -c gunicorn.conf.py &
+    python scripts/benchmarks/load_http.py --clients 500 --duration 60
+
+    APP_SERVER=asgi gunicorn -c gunicorn.conf.py &
+    python scripts/benchmarks/load_http.py --clients 500 --duration 60
+"""
+import argparse
+import http.client
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = "/stocks/all,/stocks/top_gainers,/stocks/stock_by_id?stock_id=1,/user/1/summary"
+
+
+def client(base, paths, deadline, latencies, errors, lock, started):
+    parts = urlsplit(base)
+    conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    conn = None
+    local = []
+    local_errors = Counter()
+    started.wait()
+
+    i = 0
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        begin = time.perf_counter()
+        try:
+            if conn is None:
+                conn = conn_cls(parts.netloc, timeout=30)
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                local_errors[f"HTTP {response.status}"] += 1
+                continue
+            local.append(time.perf_counter() - begin)
+        except Exception as e:
+            local_errors[type(e).__name__] += 1
+            conn = None
+
+    with lock:
+        latencies.extend(local)
+        errors.update(local_errors)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * pct), len(sorted_values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--paths", default=DEFAULT_PATHS, help="comma-separated request paths, cycled per client")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30)
+    args = parser.parse_args()
+
+    paths = [p for p in args.paths.split(",") if p]
+    latencies = []
+    errors = Counter()
+    lock = threading.Lock()
+    started = threading.Event()
+    deadline = time.monotonic() + args.duration + 1
+
+    threads = [
+        threading.Thread(target=client, args=(args.url, paths, deadline, latencies, errors, lock, started), daemon=True)
+        for _ in range(args.clients)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(1)
+    started.set()
+    for thread in threads:
+        thread.join(args.duration + 60)
+
+    latencies.sort()
+    print(f"clients {args.clients}  duration {args.duration:.0f}s  requests {len(latencies)}  errors {sum(errors.values())} {dict(errors)}")
+    print(
+        f"throughput {len(latencies) / args.duration:,.0f} req/s  "
+        f"p50 {percentile(latencies, 0.50) * 1000:.1f} ms  "
+        f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms  "
+        f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
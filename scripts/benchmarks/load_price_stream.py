@@ -0,0 +1,89 @@
+"""
+Load test for GET /stocks/stream.
+
+Opens many concurrent SSE connections against a running server and reports
+how many stayed connected, how many price events each received and how far
+apart the first and last client saw the same tick.
+
+One worker has to be able to hold every stream open, e.g.:
+
+    gunicorn backend.wsgi:app -w 1 -k gthread --threads 1100
+    python scripts/benchmarks/load_price_stream.py --clients 1000 --duration 60
+"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+
+def stream_client(url, duration, results, arrivals, lock, started):
+    parts = urlsplit(url)
+    conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    events = 0
+    try:
+        conn = conn_cls(parts.netloc, timeout=duration + 30)
+        conn.request("GET", parts.path + (f"?{parts.query}" if parts.query else ""))
+        response = conn.getresponse()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+        started.wait()
+
+        deadline = time.monotonic() + duration
+        event_id = None
+        while time.monotonic() < deadline:
+            line = response.fp.readline()
+            if not line:
+                break
+            if line.startswith(b"id: "):
+                event_id = int(line[4:])
+            elif line.startswith(b"event: prices"):
+                events += 1
+                with lock:
+                    arrivals[event_id].append(time.monotonic())
+        conn.close()
+        with lock:
+            results["ok"] += 1
+            results["events"] += events
+    except Exception as e:
+        with lock:
+            results["failed"] += 1
+            results["errors"][type(e).__name__] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5000/stocks/stream")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=60)
+    args = parser.parse_args()
+
+    results = {"ok": 0, "failed": 0, "events": 0, "errors": defaultdict(int)}
+    arrivals = defaultdict(list)
+    lock = threading.Lock()
+    started = threading.Event()
+
+    threads = [
+        threading.Thread(target=stream_client, args=(args.url, args.duration, results, arrivals, lock, started), daemon=True)
+        for _ in range(args.clients)
+    ]
+    connect_started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    started.set()
+    print(f"Started {args.clients} clients in {time.monotonic() - connect_started:.1f}s")
+
+    for thread in threads:
+        thread.join(args.duration + 60)
+
+    spreads = [max(times) - min(times) for times in arrivals.values() if len(times) > 1]
+    print(f"connected: {results['ok']}  failed: {results['failed']}  {dict(results['errors'])}")
+    print(f"price events received: {results['events']}  ticks seen: {len(arrivals)}")
+    if spreads:
+        print(f"fan-out spread per tick: median {statistics.median(spreads) * 1000:.0f} ms, max {max(spreads) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+Mixed-workload benchmark against a database filled by seed.py.
+
+    export DATABASE_URL=postgresql://localhost/cloudex_bench SESSION_SECRET=bench
+    python scripts/benchmarks/run_suite.py --duration 60 --output results/$(git rev-parse --short HEAD).json
+
+    gunicorn -c gunicorn.conf.py &
+    python scripts/benchmarks/run_suite.py --url http://localhost:8000 --output results/http.json
+
+    python scripts/benchmarks/run_suite.py --compare results/main.json results/HEAD.json
+
+Every client logs in as a different seeded user, then picks scenarios until
+the run ends, each with its own weight:
+
+  search     types a symbol or company name into /stocks/search_bar, one
+             request per keystroke
+  dashboard  /user/<id>/summary, /stocks/all and /stocks/top_gainers
+  trade      buys one share on /stocks/buy_sell, or sells one it bought
+  history    the first page of /user/transactions
+  login      /auth/login, which costs a bcrypt check
+
+Meanwhile a separate thread calls update_all_stock_prices() every
+--tick-seconds, as the scheduler would. Without --url the requests go to the
+Flask app in this process. With --url they go over HTTP, and the ticks still
+run here, so DATABASE_URL must point at the server's database. Use
+--tick-seconds 0 if the scheduler is already running against it.
+
+The report gives throughput and p50/p95/p99 per operation. --output saves it
+as JSON with the commit it ran at. --compare BASELINE flags operations whose
+p95 rose, or whose throughput fell, by more than --threshold percent, and then
+exits with status 1. Use it after a run, or pass two saved files to compare
+them without running. Compare runs made with the same seed and arguments on
+the same machine.
+
+The suite also runs against commits older than the endpoints it uses. If
+login returns no session token, clients identify themselves by user_id
+alone. An operation whose endpoint answers 404, such as /user/<id>/summary
+before it existed, is skipped for the rest of the run and listed in the
+report, and --compare leaves it out.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+DEFAULT_MIX = "search=40,dashboard=30,trade=15,history=13,login=2"
+
+
+class HttpClient:
+    def __init__(self, base):
+        parts = urlsplit(base)
+        self.netloc = parts.netloc
+        self.conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        try:
+            if self.conn is None:
+                self.conn = self.conn_cls(self.netloc, timeout=30)
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except Exception:
+            self.conn = None
+            raise
+
+
+class FlaskClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_data()
+
+
+class Recorder:
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+        # Operations whose endpoint answered 404: commits before it existed.
+        self.unsupported = set()
+        self.recording = False
+        self._lock = threading.Lock()
+
+    def record(self, op, elapsed, error=None):
+        if not self.recording:
+            return
+        with self._lock:
+            if error is None:
+                self.timings[op].append(elapsed)
+            else:
+                self.errors[op] += 1
+                self.error_samples.setdefault(op, error)
+
+
+class VirtualUser:
+    def __init__(self, client, recorder, rng, args, stocks, username):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.args = args
+        self.stocks = stocks
+        self.username = username
+        self.user_id = None
+        self.headers = {}
+        self.bought = []
+
+    def call(self, op, method, path, body=None, headers=None, expect=(200, 201)):
+        if op in self.recorder.unsupported:
+            return None
+        merged = dict(self.headers)
+        merged.update(headers or {})
+        began = time.perf_counter()
+        try:
+            status, payload = self.client.request(method, path, body, merged)
+        except Exception as e:
+            self.recorder.record(op, 0, f"{type(e).__name__}: {e}")
+            return None
+        elapsed = time.perf_counter() - began
+        if status == 404:
+            self.recorder.unsupported.add(op)
+            return None
+        if status not in expect:
+            self.recorder.record(op, elapsed, f"HTTP {status}: {payload[:200]!r}")
+            return None
+        self.recorder.record(op, elapsed)
+        return payload
+
+    def login(self):
+        payload = self.call("login", "POST", "/auth/login", {
+            "username": self.username,
+            "password_hash": self.args.password,
+        })
+        if payload is None:
+            return False
+        data = json.loads(payload)
+        self.user_id = data["user"]["user_id"]
+        # Commits before session tokens identify the user by user_id alone,
+        # which every request below also sends.
+        if data.get("token"):
+            self.headers = {"Authorization": f"Bearer {data['token']}"}
+        return True
+
+    def search(self):
+        symbol, name = self.rng.choice(self.stocks)
+        target = symbol if self.rng.random() < 0.6 else name
+        for i in range(1, len(target) + 1):
+            self.call("search_keystroke", "GET", f"/stocks/search_bar?query={quote(target[:i])}")
+
+    def dashboard(self):
+        self.call("portfolio_summary", "GET", f"/user/{self.user_id}/summary")
+        self.call("all_stocks", "GET", "/stocks/all")
+        self.call("top_gainers", "GET", "/stocks/top_gainers")
+
+    def trade(self):
+        if self.bought and self.rng.random() < 0.5:
+            stock_id, transaction_type = self.bought.pop(), "SELL"
+        else:
+            stock_id, transaction_type = self.rng.randint(1, self.args.stocks), "BUY"
+        payload = self.call("trade", "POST", "/stocks/buy_sell", {
+            "user_id": self.user_id,
+            "stock_id": stock_id,
+            "shares": 1,
+            "transaction_type": transaction_type,
+            "fee_amount": 0,
+        }, headers={"Idempotency-Key": str(uuid.uuid4())})
+        if payload is not None and transaction_type == "BUY":
+            self.bought.append(stock_id)
+
+    def history(self):
+        self.call("transactions", "GET", f"/user/transactions?user_id={self.user_id}&limit=50")
+
+    def run(self, scenarios, weights, deadline):
+        if not self.login():
+            return
+        while time.monotonic() < deadline:
+            scenario = self.rng.choices(scenarios, weights)[0]
+            getattr(self, scenario)()
+
+
+def tick_loop(recorder, interval, deadline):
+    from backend.stock.stock_repo import update_all_stock_prices
+
+    while time.monotonic() < deadline:
+        began = time.perf_counter()
+        try:
+            update_all_stock_prices()
+            recorder.record("price_tick", time.perf_counter() - began)
+        except Exception as e:
+            recorder.record("price_tick", 0, f"{type(e).__name__}: {e}")
+        time.sleep(max(0.0, interval - (time.perf_counter() - began)))
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * pct), len(sorted_values) - 1)]
+
+
+def summarize(values, errors, duration):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "throughput": len(values) / duration,
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p95_ms": percentile(values, 0.95) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+    }
+
+
+def git_revision():
+    def git(*cmd):
+        return subprocess.run(("git",) + cmd, cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def print_report(report):
+    print(f"{'operation':<18} {'count':>8} {'errors':>7} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = sorted(report["operations"].items()) + [("overall", report["overall"])]
+    for op, s in rows:
+        print(
+            f"{op:<18} {s['count']:>8} {s['errors']:>7} {s['throughput']:>9.1f} "
+            f"{s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f}"
+        )
+
+
+def compare(baseline, current, threshold, min_count):
+    """Prints the change per operation; returns the names of regressed ones."""
+    print(f"baseline {baseline['commit'][:12]}  current {current['commit'][:12]}")
+    print(f"{'operation':<18} {'ops/s':>18} {'change':>8} {'p95 ms':>20} {'change':>8}")
+    regressed = []
+    for op, new in sorted(current["operations"].items()):
+        old = baseline["operations"].get(op)
+        if old is None or min(old["count"], new["count"]) < min_count:
+            continue
+        throughput_change = (new["throughput"] / old["throughput"] - 1) * 100 if old["throughput"] else 0.0
+        p95_change = (new["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else 0.0
+        flag = ""
+        if p95_change > threshold or throughput_change < -threshold:
+            regressed.append(op)
+            flag = "  REGRESSION"
+        print(
+            f"{op:<18} {old['throughput']:>8.1f} -> {new['throughput']:<7.1f} {throughput_change:>+7.1f}% "
+            f"{old['p95_ms']:>9.2f} -> {new['p95_ms']:<8.2f} {p95_change:>+7.1f}%{flag}"
+        )
+    return regressed
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("search", "dashboard", "trade", "history", "login"):
+            raise argparse.ArgumentTypeError(f"unknown scenario: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def load_stocks(client):
+    status, payload = client.request("GET", "/stocks/all")
+    if status != 200:
+        sys.exit(f"/stocks/all returned {status}; is the database seeded?")
+    data = json.loads(payload)
+    # Rows are positional. Commits before fields= send no column names, but
+    # the table's own column order puts company_name and symbol first.
+    columns = data.get("columns") or ["stock_id", "company_name", "symbol"]
+    symbol, name = columns.index("symbol"), columns.index("company_name")
+    return [(row[symbol], row[name]) for row in data["stocks"]]
+
+
+def run(args):
+    if args.url:
+        def make_client():
+            return HttpClient(args.url)
+    else:
+        os.environ.setdefault("DB_POOL_MAX", str(args.clients + 2))
+        os.environ.setdefault("SESSION_SECRET", "run-suite")
+        from backend.app import app
+
+        def make_client():
+            return FlaskClient(app)
+
+    stocks = load_stocks(make_client())
+    recorder = Recorder()
+    scenarios, weights = zip(*args.mix.items())
+    rng = random.Random(args.seed)
+    # Distinct non-admin users, so clients do not trade on each other's accounts.
+    user_numbers = rng.sample(range(2, args.users + 1), args.clients)
+    users = [
+        VirtualUser(make_client(), recorder, random.Random(rng.random()), args, stocks, f"user{number}")
+        for number in user_numbers
+    ]
+
+    deadline = time.monotonic() + args.warmup + args.duration
+    threads = [threading.Thread(target=user.run, args=(scenarios, weights, deadline), daemon=True) for user in users]
+    if args.tick_seconds > 0:
+        threads.append(threading.Thread(target=tick_loop, args=(recorder, args.tick_seconds, deadline), daemon=True))
+    for thread in threads:
+        thread.start()
+
+    time.sleep(args.warmup)
+    recorder.recording = True
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+    recorder.recording = False
+
+    operations = {
+        op: summarize(recorder.timings.get(op, ()), recorder.errors.get(op, 0), duration)
+        for op in set(recorder.timings) | set(recorder.errors)
+    }
+    request_ops = [op for op in operations if op != "price_tick"]
+    overall = summarize(
+        [t for op in request_ops for t in recorder.timings.get(op, ())],
+        sum(recorder.errors.get(op, 0) for op in request_ops),
+        duration,
+    )
+    report = dict(git_revision(), **{
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "target": args.url or "in-process",
+        "config": {
+            key: getattr(args, key)
+            for key in ("clients", "duration", "warmup", "tick_seconds", "users", "stocks", "seed", "mix")
+        },
+        "operations": operations,
+        "overall": overall,
+        "unsupported": sorted(recorder.unsupported),
+    })
+    print_report(report)
+    if recorder.unsupported:
+        print(f"skipped (404 at this commit): {', '.join(sorted(recorder.unsupported))}")
+    for op, sample in sorted(recorder.error_samples.items()):
+        print(f"first {op} error: {sample}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="server to load; default: the Flask app in this process")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=60, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=10, help="seconds run before measuring")
+    parser.add_argument("--tick-seconds", type=float, default=1.0, help="price tick interval; 0 disables")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument("--users", type=int, default=10000, help="users seeded; clients log in as user1..userN")
+    parser.add_argument("--stocks", type=int, default=2000, help="stocks seeded")
+    parser.add_argument("--password", default="benchmark")
+    parser.add_argument("--seed", type=int, default=401)
+    parser.add_argument("--output", help="save the report as JSON")
+    parser.add_argument("--compare", nargs="+", metavar="REPORT",
+                        help="baseline report; with two reports, compare them without running")
+    parser.add_argument("--threshold", type=float, default=10, help="allowed regression, in percent")
+    parser.add_argument("--min-count", type=int, default=100, help="skip operations with fewer samples in --compare")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes one or two reports")
+
+    if args.compare and len(args.compare) == 2:
+        reports = []
+        for path in args.compare:
+            with open(path, encoding="utf-8") as f:
+                reports.append(json.load(f))
+        baseline, current = reports
+    else:
+        current = run(args)
+        if args.output:
+            os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=2)
+            print(f"saved {args.output}")
+        if not args.compare:
+            return
+        with open(args.compare[0], encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    regressed = compare(baseline, current, args.threshold, args.min_count)
+    if regressed:
+        print(f"regressed beyond {args.threshold:g}%: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
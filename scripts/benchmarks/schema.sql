@@ -0,0 +1,67 @@
+-- Base tables for a throwaway benchmark database, as the application code
+-- reads and writes them. scripts/benchmarks/seed.py runs this file, then
+-- every scripts/migrations/*.sql in order, then loads the data.
+CREATE TABLE IF NOT EXISTS roles (
+    role_id INTEGER PRIMARY KEY,
+    role_name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS cloudex_users (
+    user_id SERIAL PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL,
+    is_logged_in BOOLEAN NOT NULL DEFAULT FALSE,
+    last_login_at TIMESTAMPTZ,
+    user_role_id INTEGER NOT NULL DEFAULT 0 REFERENCES roles (role_id),
+    balance NUMERIC(18, 2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS stocks (
+    stock_id SERIAL PRIMARY KEY,
+    company_name TEXT NOT NULL,
+    symbol TEXT NOT NULL UNIQUE,
+    price NUMERIC(12, 2) NOT NULL,
+    description TEXT,
+    previous_price NUMERIC(12, 2),
+    image_data TEXT,
+    is_tradable BOOLEAN NOT NULL DEFAULT TRUE
+);
+
+CREATE TABLE IF NOT EXISTS portfolio (
+    user_id INTEGER NOT NULL REFERENCES cloudex_users (user_id) ON DELETE CASCADE,
+    stock_id INTEGER NOT NULL REFERENCES stocks (stock_id) ON DELETE CASCADE,
+    total_shares NUMERIC(18, 4) NOT NULL DEFAULT 0,
+    average_cost NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    previous_total_value NUMERIC(18, 2),
+    PRIMARY KEY (user_id, stock_id)
+);
+
+CREATE TABLE IF NOT EXISTS transaction_history (
+    transaction_id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES cloudex_users (user_id) ON DELETE CASCADE,
+    stock_id INTEGER NOT NULL REFERENCES stocks (stock_id),
+    transaction_type TEXT NOT NULL CHECK (transaction_type IN ('BUY', 'SELL')),
+    shares NUMERIC(18, 4) NOT NULL,
+    price_per_share NUMERIC(12, 2) NOT NULL,
+    fee_amount NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    executed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS watchlist (
+    user_id INTEGER NOT NULL REFERENCES cloudex_users (user_id) ON DELETE CASCADE,
+    stock_id INTEGER NOT NULL REFERENCES stocks (stock_id) ON DELETE CASCADE,
+    PRIMARY KEY (user_id, stock_id)
+);
+
+CREATE TABLE IF NOT EXISTS market_hours (
+    id INTEGER PRIMARY KEY,
+    open_time TIME NOT NULL,
+    close_time TIME NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS market_holidays (
+    id SERIAL PRIMARY KEY,
+    holiday_date DATE NOT NULL UNIQUE,
+    name TEXT NOT NULL
+);
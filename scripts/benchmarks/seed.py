@@ -0,0 +1,159 @@
+"""
+Creates and fills a benchmark database for run_suite.py.
+
+    createdb cloudex_bench
+    python scripts/benchmarks/seed.py --dsn postgresql://localhost/cloudex_bench \\
+        --users 10000 --stocks 2000 --transactions 1000000
+
+Applies schema.sql and then every scripts/migrations/*.sql in order, so the
+database matches the current commit. It then loads N users, M stocks and K
+transactions. Every user's password is --password, and user 1 is an admin.
+Each user holds --positions stocks and watches three. The market is open
+around the clock. The same arguments always produce the same rows, so
+results from different commits are comparable.
+
+Refuses to touch a database that already has tables unless --reset is given.
+--reset drops the public schema.
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+import bcrypt
+import psycopg2
+from psycopg2.extras import execute_values
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from bench_stock_search import make_rows  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS = os.path.join(HERE, "..", "migrations")
+STARTING_BALANCE = 100000
+
+
+def apply_schema(cursor):
+    paths = [os.path.join(HERE, "schema.sql")] + sorted(glob.glob(os.path.join(MIGRATIONS, "*.sql")))
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            cursor.execute(f.read())
+        print(f"applied {os.path.relpath(path, os.path.join(HERE, '..', '..'))}")
+
+
+def seed(cursor, args, rng):
+    password_hash = bcrypt.hashpw(args.password.encode("utf-8"), bcrypt.gensalt(rounds=args.bcrypt_rounds)).decode("utf-8")
+
+    cursor.execute("INSERT INTO roles (role_id, role_name) VALUES (0, 'user'), (1, 'admin');")
+    cursor.execute("INSERT INTO market_hours (id, open_time, close_time) VALUES (1, '00:00', '23:59:59');")
+
+    cursor.execute("""
+        INSERT INTO cloudex_users (username, email, password_hash, user_role_id, balance)
+        SELECT 'user' || i, 'user' || i || '@bench.test', %s, CASE WHEN i = 1 THEN 1 ELSE 0 END, %s
+        FROM generate_series(1, %s) AS i;
+    """, (password_hash, STARTING_BALANCE, args.users))
+
+    stocks = [
+        (symbol, name, round(rng.uniform(5, 500), 2), f"{name} ({symbol})")
+        for _, symbol, name in make_rows(args.stocks, rng)
+    ]
+    execute_values(cursor, """
+        INSERT INTO stocks (symbol, company_name, price, description)
+        VALUES %s;
+    """, stocks, page_size=1000)
+    # A previous price a little off the current one, so gainers and losers exist.
+    cursor.execute("""
+        UPDATE stocks
+        SET previous_price = ROUND(price * (1 + ((stock_id * 7919) % 200 - 100) / 2000.0), 2);
+    """)
+
+    # Positions and watchlists are spread over the stocks by multiplicative
+    # hashing, so every run places them identically.
+    cursor.execute("""
+        INSERT INTO portfolio (user_id, stock_id, total_shares, average_cost, previous_total_value)
+        SELECT p.user_id, s.stock_id, 1 + (p.user_id + p.k) %% 50, s.price, (1 + (p.user_id + p.k) %% 50) * s.previous_price
+        FROM (
+            SELECT u.user_id, k, 1 + (u.user_id * 2654435761 + k * 40503) %% %s AS stock_id
+            FROM cloudex_users u, generate_series(1, %s) AS k
+        ) AS p
+        JOIN stocks s ON s.stock_id = p.stock_id
+        ON CONFLICT DO NOTHING;
+    """, (args.stocks, args.positions))
+    cursor.execute("""
+        INSERT INTO watchlist (user_id, stock_id)
+        SELECT u.user_id, 1 + (u.user_id * 40503 + k * 2654435761) %% %s
+        FROM cloudex_users u, generate_series(1, 3) AS k
+        ON CONFLICT DO NOTHING;
+    """, (args.stocks,))
+
+    # History is spread over the last year, oldest first.
+    cursor.execute("""
+        INSERT INTO transaction_history
+            (user_id, stock_id, transaction_type, shares, price_per_share, fee_amount, executed_at)
+        SELECT
+            1 + i %% %s,
+            1 + (i * 2654435761) %% %s,
+            CASE WHEN i %% 3 = 0 THEN 'SELL' ELSE 'BUY' END,
+            1 + i %% 20,
+            10 + (i::BIGINT * 40503) %% 49000 / 100.0,
+            0,
+            NOW() - make_interval(secs => (%s - i) * 31536000.0 / %s)
+        FROM generate_series(1, %s) AS i;
+    """, (args.users, args.stocks, args.transactions, max(args.transactions, 1), args.transactions))
+
+    # What migrations 006 and 008 would have seeded from existing rows.
+    cursor.execute("""
+        INSERT INTO portfolio_value_snapshots (user_id, stock_id, snapshot_date, total_shares, market_value)
+        SELECT user_id, stock_id, CURRENT_DATE - 1, total_shares, previous_total_value
+        FROM portfolio
+        ON CONFLICT DO NOTHING;
+    """)
+    cursor.execute("""
+        INSERT INTO cash_checkpoints (user_id, balance)
+        SELECT user_id, balance FROM cloudex_users
+        ON CONFLICT DO NOTHING;
+    """)
+    cursor.execute("SELECT nextval('market_tick_seq');")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", required=True, help="database to fill, e.g. postgresql://localhost/cloudex_bench")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--stocks", type=int, default=2000)
+    parser.add_argument("--transactions", type=int, default=1000000)
+    parser.add_argument("--positions", type=int, default=8, help="stocks held per user")
+    parser.add_argument("--password", default="benchmark")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="match BCRYPT_ROUNDS of the server under test")
+    parser.add_argument("--seed", type=int, default=401)
+    parser.add_argument("--reset", action="store_true", help="drop everything in the public schema first")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        with conn.cursor() as cursor:
+            if args.reset:
+                cursor.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+            else:
+                cursor.execute("SELECT COUNT(*) FROM pg_tables WHERE schemaname = 'public';")
+                if cursor.fetchone()[0]:
+                    sys.exit("Database already has tables; pass --reset to replace them.")
+
+            started = time.perf_counter()
+            apply_schema(cursor)
+            seed(cursor, args, random.Random(args.seed))
+            conn.commit()
+            cursor.execute("ANALYZE;")
+            conn.commit()
+            print(
+                f"seeded {args.users} users, {args.stocks} stocks, {args.transactions} transactions "
+                f"in {time.perf_counter() - started:.1f} s"
+            )
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
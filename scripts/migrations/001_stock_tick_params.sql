@@ -0,0 +1,4 @@
+-- Per-symbol parameters for the simulated price walk.
+-- NULL means "use the defaults from PRICE_TICK_VOLATILITY / PRICE_TICK_DRIFT".
+ALTER TABLE stocks ADD COLUMN IF NOT EXISTS volatility NUMERIC(8, 6);
+ALTER TABLE stocks ADD COLUMN IF NOT EXISTS drift NUMERIC(8, 6);
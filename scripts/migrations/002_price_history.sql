@@ -0,0 +1,23 @@
+-- Raw price ticks, one row per stock per scheduler tick.
+-- Daily partitions are created (and expired) by backend/stock/price_history.py.
+CREATE TABLE IF NOT EXISTS price_ticks (
+    stock_id INTEGER NOT NULL,
+    ts TIMESTAMPTZ NOT NULL,
+    price NUMERIC(12, 2) NOT NULL
+) PARTITION BY RANGE (ts);
+
+CREATE INDEX IF NOT EXISTS price_ticks_stock_ts_idx ON price_ticks (stock_id, ts);
+
+-- OHLCV candles, maintained incrementally on every tick and trade.
+CREATE TABLE IF NOT EXISTS price_candles (
+    stock_id INTEGER NOT NULL REFERENCES stocks (stock_id) ON DELETE CASCADE,
+    resolution TEXT NOT NULL,
+    bucket_start TIMESTAMPTZ NOT NULL,
+    open NUMERIC(12, 2) NOT NULL,
+    high NUMERIC(12, 2) NOT NULL,
+    low NUMERIC(12, 2) NOT NULL,
+    close NUMERIC(12, 2) NOT NULL,
+    volume NUMERIC(18, 4) NOT NULL DEFAULT 0,
+    tick_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (stock_id, resolution, bucket_start)
+);
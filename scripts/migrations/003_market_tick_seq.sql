@@ -0,0 +1,2 @@
+-- Incremented once per price tick; read by the market snapshot as its tick id.
+CREATE SEQUENCE IF NOT EXISTS market_tick_seq;
@@ -0,0 +1,5 @@
+-- Trigram indexes for the Postgres search path (STOCK_SEARCH_BACKEND=postgres).
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS stocks_symbol_trgm_idx ON stocks USING gin (symbol gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS stocks_company_name_trgm_idx ON stocks USING gin (company_name gin_trgm_ops);
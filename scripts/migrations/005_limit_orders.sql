@@ -0,0 +1,19 @@
+-- Resting limit orders. Open orders are loaded into the in-memory order book
+-- of the process that runs the price tick (backend/stock/order_book.py).
+CREATE TABLE IF NOT EXISTS limit_orders (
+    order_id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES cloudex_users (user_id) ON DELETE CASCADE,
+    stock_id INTEGER NOT NULL REFERENCES stocks (stock_id) ON DELETE CASCADE,
+    side TEXT NOT NULL CHECK (side IN ('BUY', 'SELL')),
+    shares NUMERIC(18, 4) NOT NULL CHECK (shares > 0),
+    limit_price NUMERIC(12, 2) NOT NULL CHECK (limit_price > 0),
+    fee_amount NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'OPEN' CHECK (status IN ('OPEN', 'FILLED', 'CANCELLED', 'REJECTED')),
+    transaction_id INTEGER,
+    reject_reason TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS limit_orders_open_idx ON limit_orders (order_id) WHERE status = 'OPEN';
+CREATE INDEX IF NOT EXISTS limit_orders_user_idx ON limit_orders (user_id, order_id DESC);
@@ -0,0 +1,17 @@
+-- Per-position market value by trading day, written by
+-- backend/user/portfolio_snapshots.py only when a value changes. The latest
+-- row before today is the baseline for the daily portfolio change.
+CREATE TABLE IF NOT EXISTS portfolio_value_snapshots (
+    user_id INTEGER NOT NULL,
+    stock_id INTEGER NOT NULL REFERENCES stocks (stock_id) ON DELETE CASCADE,
+    snapshot_date DATE NOT NULL,
+    total_shares NUMERIC(18, 4) NOT NULL,
+    market_value NUMERIC(18, 2) NOT NULL,
+    PRIMARY KEY (user_id, stock_id, snapshot_date)
+);
+
+-- Seed today's baseline from the value the old job kept on portfolio rows.
+INSERT INTO portfolio_value_snapshots (user_id, stock_id, snapshot_date, total_shares, market_value)
+SELECT user_id, stock_id, CURRENT_DATE - 1, total_shares, COALESCE(previous_total_value, 0)
+FROM portfolio
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,3 @@
+-- Serves keyset-paginated history pages (newest first) straight off the index.
+CREATE INDEX IF NOT EXISTS transaction_history_user_executed_idx
+    ON transaction_history (user_id, executed_at DESC, transaction_id DESC);
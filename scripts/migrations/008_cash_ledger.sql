@@ -0,0 +1,42 @@
+-- Append-only cash movements (backend/user/cash_ledger.py). A balance is the
+-- user's checkpoint plus the entries after it; see the cash_balances view.
+-- There is no foreign key to cloudex_users: checking one would share-lock the
+-- user's row on every insert, the hot row this table avoids.
+CREATE TABLE IF NOT EXISTS cash_ledger (
+    entry_id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    amount NUMERIC(18, 2) NOT NULL,
+    reason TEXT NOT NULL CHECK (reason IN ('DEPOSIT', 'WITHDRAWAL', 'BUY', 'SELL')),
+    transaction_id INTEGER,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS cash_ledger_user_idx ON cash_ledger (user_id, entry_id) INCLUDE (amount);
+
+CREATE TABLE IF NOT EXISTS cash_checkpoints (
+    user_id INTEGER PRIMARY KEY REFERENCES cloudex_users (user_id) ON DELETE CASCADE,
+    balance NUMERIC(18, 2) NOT NULL,
+    last_entry_id BIGINT NOT NULL DEFAULT 0,
+    checkpointed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Users without a checkpoint yet (created since the last compaction) start
+-- from cloudex_users.balance, which compaction keeps equal to the checkpoint.
+CREATE OR REPLACE VIEW cash_balances AS
+SELECT
+    u.user_id,
+    COALESCE(c.balance, u.balance) + COALESCE(recent.amount, 0) AS balance
+FROM cloudex_users u
+LEFT JOIN cash_checkpoints c ON c.user_id = u.user_id
+LEFT JOIN LATERAL (
+    SELECT SUM(l.amount) AS amount
+    FROM cash_ledger l
+    WHERE l.user_id = u.user_id
+        AND l.entry_id > COALESCE(c.last_entry_id, 0)
+) AS recent ON true;
+
+-- Existing balances become the first checkpoints.
+INSERT INTO cash_checkpoints (user_id, balance)
+SELECT user_id, balance
+FROM cloudex_users
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,15 @@
+-- Responses to requests sent with an Idempotency-Key header
+-- (backend/idempotency.py). A row with no status_code is a request still
+-- being processed. Rows older than IDEMPOTENCY_TTL_SECONDS are purged by the
+-- scheduler.
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    scope_key TEXT PRIMARY KEY,
+    request_hash TEXT NOT NULL,
+    status_code INTEGER,
+    response_body TEXT,
+    content_type TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    completed_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idempotency_keys_created_idx ON idempotency_keys (created_at);
@@ -0,0 +1,49 @@
+-- Company logos, stored once per distinct image under the SHA-256 of its bytes
+-- (backend/stock/logos.py). Stock rows reference them by hash; listings carry
+-- only the /stocks/logo/<hash> URL.
+CREATE TABLE IF NOT EXISTS stock_logos (
+    logo_hash TEXT PRIMARY KEY,
+    content_type TEXT NOT NULL,
+    original BYTEA NOT NULL,
+    -- NULL until the first thumbnail request for logos moved by this migration.
+    thumbnail BYTEA,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE stocks ADD COLUMN IF NOT EXISTS logo_hash TEXT REFERENCES stock_logos (logo_hash);
+
+-- Move inline base64 logos (data: URLs or bare base64) out of the stocks rows.
+-- Values that do not decode are left in image_data, which nothing reads any more.
+DO $$
+DECLARE
+    stock RECORD;
+    bytes BYTEA;
+    mime TEXT;
+    digest TEXT;
+BEGIN
+    FOR stock IN
+        SELECT stock_id, image_data FROM stocks
+        WHERE logo_hash IS NULL AND image_data IS NOT NULL AND image_data <> ''
+    LOOP
+        BEGIN
+            bytes := decode(regexp_replace(regexp_replace(stock.image_data, '^data:[^,]*,', ''), '\s', '', 'g'), 'base64');
+        EXCEPTION WHEN OTHERS THEN
+            CONTINUE;
+        END;
+        CONTINUE WHEN length(bytes) = 0;
+
+        mime := CASE
+            WHEN substring(bytes FROM 1 FOR 4) = '\x89504e47'::bytea THEN 'image/png'
+            WHEN substring(bytes FROM 1 FOR 3) = '\xffd8ff'::bytea THEN 'image/jpeg'
+            WHEN substring(bytes FROM 1 FOR 4) = '\x47494638'::bytea THEN 'image/gif'
+            WHEN substring(bytes FROM 9 FOR 4) = '\x57454250'::bytea THEN 'image/webp'
+        END;
+        CONTINUE WHEN mime IS NULL;
+
+        digest := encode(sha256(bytes), 'hex');
+        INSERT INTO stock_logos (logo_hash, content_type, original)
+        VALUES (digest, mime, bytes)
+        ON CONFLICT DO NOTHING;
+        UPDATE stocks SET logo_hash = digest, image_data = NULL WHERE stock_id = stock.stock_id;
+    END LOOP;
+END $$;
@@ -0,0 +1,9 @@
+-- Traded volume waiting to be added to price_candles. Trades only append here,
+-- so they never lock candle rows; the price tick deletes the pending rows and
+-- adds them to the candles in one statement (backend/stock/price_history.py).
+CREATE TABLE IF NOT EXISTS trade_volume_queue (
+    stock_id INTEGER NOT NULL REFERENCES stocks (stock_id) ON DELETE CASCADE,
+    shares NUMERIC(18, 4) NOT NULL,
+    price NUMERIC(12, 2) NOT NULL,
+    executed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);